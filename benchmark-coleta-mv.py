@@ -0,0 +1,250 @@
+"""
+benchmark-coleta-mv.py
+======================
+Mede a vazão (usuários/hora) do coletor por escalas
+(coletar-produtividade-escalas-AWS.py) totalmente offline: o relatório MV é
+servido pelo replay local (replay_mv.py) e a gravação no Supabase é descartada.
+
+Para cada combinação de concorrência (navegadores em paralelo) e fator de
+pausa (multiplicador de todos os time.sleep do coletor), executa os mesmos
+usuários e reporta usuários/hora, erros e percentis por etapa.
+
+Os usuários vêm das páginas gravadas em --dir (MV_GRAVAR_PAGINAS_DIR) ou,
+sem gravações, de códigos sintéticos.
+
+Requer Firefox + geckodriver locais (os mesmos do coletor).
+
+Uso:
+    python benchmark-coleta-mv.py --usuarios 20 --concorrencia 1,2,4 --fator-pausa 1,0.5,0.25
+    python benchmark-coleta-mv.py --dir paginas_mv --latencia-min 1 --latencia-max 4 --taxa-erro 0.05
+"""
+
+import os
+import json
+import time
+import queue
+import argparse
+import threading
+import importlib.util
+import logging
+from datetime import datetime, timedelta
+
+from metricas_coleta import MetricasEtapas
+from replay_mv import ConfigReplay, ServidorReplay
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] [%(threadName)s] %(message)s",
+    datefmt="%H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+COLETOR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "coletar-produtividade-escalas-AWS.py")
+MARIONETTE_PORTA_BASE = 2900
+
+
+# ============================================================
+# ADAPTADORES DO COLETOR
+# ============================================================
+
+class TempoEscalado:
+    """Substitui o módulo time do coletor multiplicando as pausas (sleep) por um fator."""
+
+    def __init__(self, fator: float):
+        self.fator = fator
+
+    def sleep(self, segundos: float):
+        time.sleep(segundos * self.fator)
+
+    def __getattr__(self, nome):
+        return getattr(time, nome)
+
+
+class GravadorNulo:
+    """Descarta os registros no lugar do GravadorProdutividade (sem Supabase)."""
+
+    def __init__(self):
+        self.registros = 0
+        self._lock = threading.Lock()
+
+    def enfileirar(self, registro, contexto=None):
+        with self._lock:
+            self.registros += 1
+
+    def pendentes(self) -> int:
+        return 0
+
+
+def carregar_coletor(indice: int, url_relatorio: str, fator_pausa: float):
+    """
+    Carrega uma instância isolada do módulo do coletor para um worker,
+    apontando para o replay e com porta marionette própria.
+    """
+    spec = importlib.util.spec_from_file_location(f"coletor_benchmark_{indice}", COLETOR_PATH)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+
+    modulo.MV_REPORT_URL = url_relatorio
+    modulo.MARIONETTE_PORT = MARIONETTE_PORTA_BASE + indice
+    modulo.time = TempoEscalado(fator_pausa)
+    # Com vários navegadores em paralelo, a limpeza global mataria os outros workers
+    modulo.kill_zombie_processes = lambda: None
+    modulo.cleanup_temp_files = lambda: None
+    return modulo
+
+
+# ============================================================
+# CARGA DE TRABALHO
+# ============================================================
+
+def montar_jobs(diretorio: str, quantidade: int) -> list:
+    """Retorna [(usuario, data)] a partir das gravações (buscas D→D) ou sintéticos."""
+    jobs = []
+
+    if diretorio and os.path.isdir(diretorio):
+        for nome in sorted(os.listdir(diretorio)):
+            partes = nome[:-len(".html")].split("_") if nome.endswith(".html") else []
+            if len(partes) != 3 or partes[1] != partes[2]:
+                continue
+            codigo, data_mv, _ = partes
+            data = datetime.strptime(data_mv, "%m.%d.%Y")
+            jobs.append(({"codigomv": codigo, "nome": f"Gravado {codigo}", "especialidade": ""}, data))
+
+    if not jobs:
+        ontem = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+        jobs = [
+            ({"codigomv": str(900000 + i), "nome": f"Sintético {i}", "especialidade": ""}, ontem)
+            for i in range(1, quantidade + 1)
+        ]
+
+    return jobs[:quantidade]
+
+
+# ============================================================
+# EXECUÇÃO
+# ============================================================
+
+def executar_cenario(jobs: list, concorrencia: int, fator_pausa: float, url_relatorio: str) -> dict:
+    """Processa todos os jobs com N navegadores e retorna as métricas do cenário."""
+    fila = queue.Queue()
+    for job in jobs:
+        fila.put(job)
+
+    metricas = MetricasEtapas(prefixo="benchmark_coleta_mv")
+    resultado = {"sucesso": 0, "erros": 0}
+    lock = threading.Lock()
+
+    def worker(indice: int):
+        modulo = carregar_coletor(indice, url_relatorio, fator_pausa)
+        coletor = modulo.ProdutividadeEscalasCollector()
+        coletor.gravador = GravadorNulo()
+        coletor.metricas = metricas
+
+        try:
+            coletor.setup_driver()
+            while True:
+                try:
+                    usuario, data = fila.get_nowait()
+                except queue.Empty:
+                    return
+
+                try:
+                    coletor.processar_usuario(usuario, data, len(jobs) - fila.qsize(), len(jobs))
+                    with lock:
+                        resultado["sucesso"] += 1
+                except Exception as e:
+                    logger.warning(f"Falha no usuário {usuario['codigomv']}: {str(e)[:120]}")
+                    with lock:
+                        resultado["erros"] += 1
+        finally:
+            if coletor.driver:
+                try:
+                    coletor.driver.quit()
+                except Exception:
+                    pass
+
+    inicio = time.perf_counter()
+    threads = [
+        threading.Thread(target=worker, args=(i,), name=f"worker-{i}")
+        for i in range(concorrencia)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    duracao = time.perf_counter() - inicio
+
+    etapas = metricas.resumo()
+    return {
+        "concorrencia": concorrencia,
+        "fator_pausa": fator_pausa,
+        "usuarios": len(jobs),
+        "sucesso": resultado["sucesso"],
+        "erros": resultado["erros"],
+        "duracao_s": round(duracao, 1),
+        "usuarios_hora": round(resultado["sucesso"] / (duracao / 3600), 1) if duracao > 0 else 0,
+        "etapas": etapas,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline do coletor MV por escalas")
+    parser.add_argument("--dir", help="Diretório com páginas gravadas (MV_GRAVAR_PAGINAS_DIR)")
+    parser.add_argument("--usuarios", type=int, default=10, help="Usuários por cenário")
+    parser.add_argument("--concorrencia", default="1", help="Lista de navegadores em paralelo (ex. 1,2,4)")
+    parser.add_argument("--fator-pausa", default="1", help="Lista de multiplicadores das pausas (ex. 1,0.5)")
+    parser.add_argument("--latencia-min", type=float, default=0.5)
+    parser.add_argument("--latencia-max", type=float, default=2.0)
+    parser.add_argument("--taxa-erro", type=float, default=0.0)
+    parser.add_argument("--taxa-lentidao", type=float, default=0.0)
+    parser.add_argument("--lentidao", type=float, default=60.0)
+    parser.add_argument("--saida", help="Arquivo JSON com o resultado de todos os cenários")
+    args = parser.parse_args()
+
+    concorrencias = [int(c) for c in args.concorrencia.split(",")]
+    fatores = [float(f) for f in args.fator_pausa.split(",")]
+
+    config = ConfigReplay(
+        diretorio=args.dir,
+        latencia_min=args.latencia_min,
+        latencia_max=args.latencia_max,
+        taxa_erro=args.taxa_erro,
+        taxa_lentidao=args.taxa_lentidao,
+        lentidao=args.lentidao,
+    )
+    servidor = ServidorReplay(config)
+    servidor.iniciar()
+
+    jobs = montar_jobs(args.dir, args.usuarios)
+    logger.info(f"{len(jobs)} usuários por cenário | replay em {servidor.url_relatorio}")
+
+    resultados = []
+    try:
+        for concorrencia in concorrencias:
+            for fator in fatores:
+                logger.info("=" * 60)
+                logger.info(f"  Cenário: concorrência={concorrencia}  fator_pausa={fator}")
+                logger.info("=" * 60)
+                resultados.append(executar_cenario(jobs, concorrencia, fator, servidor.url_relatorio))
+    finally:
+        servidor.parar()
+
+    logger.info("=" * 60)
+    logger.info(f"  {'conc':>4} {'pausa':>6} {'ok':>5} {'erro':>5} {'tempo(s)':>9} {'usuários/h':>11} {'p50 usuário':>12}")
+    for r in resultados:
+        p50 = r["etapas"].get("usuario", {}).get("p50", 0)
+        logger.info(
+            f"  {r['concorrencia']:>4} {r['fator_pausa']:>6} {r['sucesso']:>5} {r['erros']:>5} "
+            f"{r['duracao_s']:>9} {r['usuarios_hora']:>11} {p50:>12}"
+        )
+    logger.info(f"  Replay: {config.stats}")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump({"cenarios": resultados, "replay": config.stats}, f, ensure_ascii=False, indent=2)
+        logger.info(f"  Resultado salvo em: {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
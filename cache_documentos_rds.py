@@ -0,0 +1,155 @@
+"""
+Cache local (SQLite) das contagens diárias de documentos clínicos do RDS.
+
+As mesmas contagens (dia, banco, unidade, prestador, tipo) eram buscadas no RDS
+pelo job diário, de novo pela revisão retroativa de 7 dias e de novo pelos
+backfills. O cache guarda o resultado da agregação e quando cada (dia, prestador)
+foi consultado:
+
+- enquanto o dia está na janela mutável (pw_documento_clinico_completo ainda
+  pode mudar, até JANELA_MUTAVEL_DIAS após a data), ele é reconsultado a cada
+  execução (respeitando uma validade curta, para execuções seguidas)
+- a primeira consulta feita depois da janela é definitiva: o dia não volta ao RDS
+- prestadores novos entram sem invalidar o resto: só os (dia, prestador) sem
+  cobertura são consultados
+
+Uso:
+    cache = CacheDocumentosRDS()
+    faltantes = cache.pendentes('2026-02-01', cd_prestadores)
+    if faltantes:
+        cache.gravar('2026-02-01', faltantes, linhas_do_rds)
+    linhas = cache.contagens('2026-02-01', cd_prestadores)
+
+As linhas têm o formato da agregação do RDS:
+    {cd_prestador, cd_tipo_documento, nm_unidade, nm_banco, total}
+"""
+import os
+import sqlite3
+import threading
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CAMINHO_PADRAO = os.getenv('RDS_CACHE_DB', 'documentos-rds.cache.sqlite')
+JANELA_MUTAVEL_DIAS = 7   # o RDS corrige documentos por até 7 dias após a data
+VALIDADE_HORAS = 1.0      # dia mutável consultado há menos que isso não é reconsultado
+
+SEM_VALOR = 'N/D'         # unidade/banco nulos (mesmo rótulo da consulta ao RDS)
+
+
+class CacheDocumentosRDS:
+    """Contagens por (dia, banco, unidade, prestador, tipo) e cobertura por (dia, prestador)."""
+
+    def __init__(self, caminho: str = CAMINHO_PADRAO,
+                 janela_mutavel_dias: int = JANELA_MUTAVEL_DIAS,
+                 validade_horas: float = VALIDADE_HORAS):
+        self.caminho = caminho
+        self.janela_mutavel_dias = janela_mutavel_dias
+        self.validade = timedelta(hours=validade_horas)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS contagens (
+                dia TEXT NOT NULL,
+                nm_banco TEXT NOT NULL,
+                nm_unidade TEXT NOT NULL,
+                cd_prestador INTEGER NOT NULL,
+                cd_tipo_documento INTEGER NOT NULL,
+                total INTEGER NOT NULL,
+                PRIMARY KEY (dia, nm_banco, nm_unidade, cd_prestador, cd_tipo_documento)
+            );
+            CREATE INDEX IF NOT EXISTS idx_contagens_dia_prestador ON contagens (dia, cd_prestador);
+
+            CREATE TABLE IF NOT EXISTS cobertura (
+                dia TEXT NOT NULL,
+                cd_prestador INTEGER NOT NULL,
+                consultado_em TEXT NOT NULL,
+                PRIMARY KEY (dia, cd_prestador)
+            );
+        """)
+        self._conn.commit()
+
+    def definitivo(self, dia: str, consultado_em: datetime) -> bool:
+        """A consulta foi feita depois da janela mutável do dia?"""
+        return consultado_em.date() > date.fromisoformat(dia) + timedelta(days=self.janela_mutavel_dias)
+
+    def pendentes(self, dia: str, cd_prestadores: Iterable[int], agora: Optional[datetime] = None) -> List[int]:
+        """Prestadores cujo `dia` precisa ser (re)consultado no RDS."""
+        agora = agora or datetime.now()
+        with self._lock:
+            cobertura = {
+                cd: datetime.fromisoformat(quando)
+                for cd, quando in self._conn.execute(
+                    'SELECT cd_prestador, consultado_em FROM cobertura WHERE dia = ?', (dia,)
+                )
+            }
+
+        faltantes = []
+        for cd in sorted({int(c) for c in cd_prestadores}):
+            quando = cobertura.get(cd)
+            if quando is None:
+                faltantes.append(cd)
+            elif not self.definitivo(dia, quando) and agora - quando >= self.validade:
+                faltantes.append(cd)
+        return faltantes
+
+    def gravar(self, dia: str, cd_prestadores: Iterable[int], linhas: Iterable[Dict],
+               consultado_em: Optional[datetime] = None):
+        """
+        Substitui as contagens de `dia` dos prestadores consultados pelas `linhas`
+        do RDS (prestadores sem documentos ficam cobertos com zero linhas).
+        """
+        consultado_em = (consultado_em or datetime.now()).isoformat(timespec='seconds')
+        prestadores = [(dia, int(cd)) for cd in set(cd_prestadores)]
+        valores = [
+            (dia, r.get('nm_banco') or SEM_VALOR, r.get('nm_unidade') or SEM_VALOR,
+             int(r['cd_prestador']), int(r['cd_tipo_documento']), int(r['total']))
+            for r in linhas
+        ]
+
+        with self._lock, self._conn:
+            self._conn.executemany('DELETE FROM contagens WHERE dia = ? AND cd_prestador = ?', prestadores)
+            self._conn.executemany(
+                'INSERT INTO contagens (dia, nm_banco, nm_unidade, cd_prestador, cd_tipo_documento, total) '
+                'VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (dia, nm_banco, nm_unidade, cd_prestador, cd_tipo_documento) '
+                'DO UPDATE SET total = total + excluded.total',
+                valores
+            )
+            self._conn.executemany(
+                'INSERT INTO cobertura (dia, cd_prestador, consultado_em) VALUES (?, ?, ?) '
+                'ON CONFLICT (dia, cd_prestador) DO UPDATE SET consultado_em = excluded.consultado_em',
+                [(d, cd, consultado_em) for d, cd in prestadores]
+            )
+
+    def contagens(self, dia: str, cd_prestadores: Optional[Iterable[int]] = None) -> List[Dict]:
+        """Linhas de `dia` (só dos prestadores informados, se houver), no formato da consulta ao RDS."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT cd_prestador, cd_tipo_documento, nm_unidade, nm_banco, total FROM contagens '
+                'WHERE dia = ? ORDER BY cd_prestador, nm_unidade, cd_tipo_documento',
+                (dia,)
+            ).fetchall()
+
+        filtro = None if cd_prestadores is None else {int(c) for c in cd_prestadores}
+        return [
+            {'cd_prestador': cd, 'cd_tipo_documento': tipo, 'nm_unidade': unidade, 'nm_banco': banco, 'total': total}
+            for cd, tipo, unidade, banco, total in rows
+            if filtro is None or cd in filtro
+        ]
+
+    def resumo(self) -> Dict[str, int]:
+        """Dias, (dia, prestador) cobertos e linhas de contagem no cache."""
+        with self._lock:
+            dias, cobertos = self._conn.execute('SELECT COUNT(DISTINCT dia), COUNT(*) FROM cobertura').fetchone()
+            linhas = self._conn.execute('SELECT COUNT(*) FROM contagens').fetchone()[0]
+        return {'dias': dias, 'cobertos': cobertos, 'linhas': linhas}
+
+    def fechar(self):
+        """Fecha a conexão com o cache."""
+        with self._lock:
+            self._conn.close()
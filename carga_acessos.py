@@ -0,0 +1,118 @@
+"""
+Carga em massa de acessos direto no PostgreSQL do Supabase (COPY).
+
+Os importadores enviam os acessos pela API (PostgREST), um a um e com uma
+consulta de duplicata antes de cada insert. Para cargas de centenas de milhares
+de linhas, `carregar_acessos()`:
+
+  1. Abre uma tabela temporária de staging (não gera WAL, some no fim da transação)
+  2. Envia todas as linhas já normalizadas por `COPY ... FROM STDIN`, em streaming
+  3. Faz o merge com um único INSERT ... ON CONFLICT (cpf, data_acesso, sentido)
+     DO NOTHING, que depende do índice único da migration 035
+
+e devolve os acessos realmente inseridos (para enfileirar o recálculo de escalas)
+e quantos já existiam.
+
+Credenciais: as mesmas do executar-migration.py (DB_HOST, DB_PORT, DB_NAME,
+DB_USER, DB_PASSWORD no ambiente ou no .env).
+"""
+import os
+import logging
+from typing import Iterable, Iterator, List, Tuple
+
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+COLUNAS = ('tipo', 'matricula', 'nome', 'cpf', 'data_acesso', 'sentido', 'planta', 'codin')
+
+_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def conectar_postgres():
+    """Conexão direta com o PostgreSQL do Supabase (credenciais DB_* do ambiente)."""
+    senha = os.getenv("DB_PASSWORD", "")
+    if not senha:
+        raise ValueError("DB_PASSWORD não definido — necessário para a carga via COPY")
+
+    return psycopg2.connect(
+        host=os.getenv("DB_HOST", "parceria.daherlab.org.br"),
+        port=os.getenv("DB_PORT", "5432"),
+        dbname=os.getenv("DB_NAME", "postgres"),
+        user=os.getenv("DB_USER", "postgres"),
+        password=senha,
+        connect_timeout=10,
+    )
+
+
+def _campo_copy(valor) -> str:
+    """Formata um valor no formato texto do COPY (\\N para NULL)."""
+    if valor is None:
+        return '\\N'
+    return str(valor).translate(_ESCAPES)
+
+
+class _StreamCopy:
+    """Objeto tipo arquivo que gera as linhas do COPY sob demanda (sem montar tudo em memória)."""
+
+    def __init__(self, acessos: Iterable[dict]):
+        self._linhas: Iterator[str] = (
+            '\t'.join(_campo_copy(a.get(c)) for c in COLUNAS) + '\n' for a in acessos
+        )
+        self._buffer = ''
+        self.enviadas = 0
+
+    def read(self, tamanho: int = -1) -> str:
+        while tamanho < 0 or len(self._buffer) < tamanho:
+            linha = next(self._linhas, None)
+            if linha is None:
+                break
+            self._buffer += linha
+            self.enviadas += 1
+        if tamanho < 0:
+            tamanho = len(self._buffer)
+        pedaco, self._buffer = self._buffer[:tamanho], self._buffer[tamanho:]
+        return pedaco
+
+
+def carregar_acessos(acessos: Iterable[dict], conn=None) -> Tuple[List[dict], int]:
+    """
+    Carrega acessos normalizados (chaves de COLUNAS) via COPY + merge.
+    Retorna (acessos inseridos, quantidade de duplicados ignorados).
+
+    Se `conn` não for informada, abre e fecha uma conexão própria.
+    Tudo ocorre em uma transação: em caso de erro nada é gravado.
+    """
+    propria = conn is None
+    if propria:
+        conn = conectar_postgres()
+
+    colunas = ', '.join(COLUNAS)
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    CREATE TEMP TABLE acessos_staging
+                        (LIKE acessos INCLUDING DEFAULTS) ON COMMIT DROP
+                """)
+
+                stream = _StreamCopy(acessos)
+                cur.copy_expert(f"COPY acessos_staging ({colunas}) FROM STDIN", stream, size=1 << 16)
+                logger.info(f"  COPY: {stream.enviadas} linha(s) no staging")
+
+                cur.execute(f"""
+                    INSERT INTO acessos ({colunas})
+                    SELECT {colunas} FROM acessos_staging
+                    ON CONFLICT (cpf, data_acesso, sentido) DO NOTHING
+                    RETURNING {colunas}
+                """)
+                inseridos = [dict(zip(COLUNAS, linha)) for linha in cur.fetchall()]
+                for acesso in inseridos:
+                    acesso['data_acesso'] = acesso['data_acesso'].isoformat()
+    finally:
+        if propria:
+            conn.close()
+
+    duplicados = stream.enviadas - len(inseridos)
+    logger.info(f"  Merge: {len(inseridos)} inserido(s) | {duplicados} duplicado(s)")
+    return inseridos, duplicados
@@ -13,6 +13,16 @@ MELHORIAS:
 - ESPERA INTELIGENTE: Aguarda código aparecer ao invés de delays fixos
 - EXTRAÇÃO VIA XPATH: Usa XPaths específicos ao invés de buscar em tabelas
 - BUSCA POR ESCALAS: Usa tabela escalas_medicas para identificar médicos
+- PLANEJAMENTO ÚNICO: Escalas, usuários e produtividade já coletada do período
+  inteiro são carregados em poucas consultas paginadas antes da coleta
+- JOURNAL LOCAL: Estado de cada (dia, codigo_mv) em SQLite para retomar
+  execuções interrompidas e retentar falhas ao final da passada
+- GRAVAÇÃO WRITE-BEHIND: Resultados são gravados em lote por uma thread em
+  segundo plano, sem deixar o navegador ocioso esperando o Supabase
+- MÉTRICAS POR ETAPA: Duração de cada etapa (driver, página, formulário,
+  espera do código, extração, gravação) com percentis em JSON/Prometheus
+- GRAVAÇÃO DE PÁGINAS: Com MV_GRAVAR_PAGINAS_DIR, salva os relatórios
+  renderizados para replay offline (ver replay_mv.py e benchmark-coleta-mv.py)
 """
 import os
 import sys
@@ -20,6 +30,7 @@ import time
 import random
 import glob
 import signal
+import threading
 import psutil
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Tuple
@@ -41,6 +52,10 @@ from supabase import create_client, Client
 from dotenv import load_dotenv
 import logging
 from functools import wraps
+from diario_coleta import DiarioColeta
+from gravador_produtividade import GravadorProdutividade
+from metricas_coleta import MetricasEtapas
+from replay_mv import salvar_pagina
 
 # ============================================================================
 # AJUSTE 1: Salvando o log no diretório atual para evitar erro de permissão
@@ -59,10 +74,15 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 # Configurações
-MV_REPORT_URL = "http://mvpepprd.saude.go.gov.br/report-executor/report-viewer?id=7076"
+MV_REPORT_URL = os.getenv('MV_REPORT_URL', "http://mvpepprd.saude.go.gov.br/report-executor/report-viewer?id=7076")
 SUPABASE_URL = os.getenv('VITE_SUPABASE_URL')
 SUPABASE_SERVICE_KEY = os.getenv('VITE_SUPABASE_SERVICE_ROLE_KEY')
 GECKODRIVER_PATH = '/usr/local/bin/geckodriver'
+FIREFOX_BINARY = os.getenv('FIREFOX_BINARY', '/usr/bin/firefox-esr')
+MARIONETTE_PORT = 2828
+
+# Diretório para gravar os relatórios renderizados (replay offline); vazio = desligado
+GRAVAR_PAGINAS_DIR = os.getenv('MV_GRAVAR_PAGINAS_DIR')
 
 # ============================================================================
 # CONFIGURAÇÕES APRIMORADAS DE RESILIÊNCIA
@@ -85,6 +105,22 @@ TIMEOUT_TABELA = 90
 TIMEOUT_SUBMIT = 45
 TIMEOUT_CODIGO_APARECER = 45  # Tempo máximo para aguardar código aparecer
 
+# Paginação das consultas de planejamento (máximo por requisição no Supabase)
+PAGE_SIZE = 1000
+
+# Journal local de jobs (retomada após queda e retentativa de falhas)
+JOURNAL_PATH = 'produtividade-mv-escalas.journal.sqlite'
+JOURNAL_MAX_TENTATIVAS = 3
+
+# Gravação write-behind (thread com fila limitada e upserts em lote)
+GRAVADOR_TAMANHO_FILA = 200
+GRAVADOR_TAMANHO_LOTE = 25
+GRAVADOR_INTERVALO_FLUSH = 10  # segundos
+
+# Métricas por etapa (JSON sempre; Prometheus textfile se METRICAS_PROM_PATH estiver definido)
+METRICAS_JSON_PATH = 'produtividade-mv-escalas.metricas.json'
+METRICAS_PROM_PATH = os.getenv('METRICAS_PROM_PATH')
+
 # Health check do driver
 DRIVER_HEALTH_CHECK_INTERVAL = 5
 MAX_DRIVER_AGE_MINUTES = 30
@@ -170,6 +206,10 @@ def timeout_handler(signum, frame):
     """Handler para timeout de operações."""
     raise TimeoutError("Operação excedeu o tempo limite")
 
+def sigterm_handler(signum, frame):
+    """Converte SIGTERM em KeyboardInterrupt para gravar os resultados pendentes antes de sair."""
+    raise KeyboardInterrupt("SIGTERM recebido")
+
 def cleanup_old_screenshots(retention_days: int = SCREENSHOT_RETENTION_DAYS):
     """Remove screenshots antigos para evitar acúmulo de arquivos."""
     try:
@@ -400,6 +440,22 @@ class ProdutividadeEscalasCollector:
         self.driver_start_time = None
         self.last_health_check = 0
 
+        # Último formulário submetido (codigo_mv, data_inicial, data_final), usado na gravação de páginas
+        self.ultimo_formulario = None
+
+        # Journal de jobs, gravador em segundo plano e coletas concluídas nesta execução
+        self.diario = None
+        self.gravador = None
+        self.coletas_sessao = 0
+
+        # Desfecho de cada job (data_iso, codigo_mv): True só depois de gravado.
+        # Atualizado também pelos callbacks da thread do gravador.
+        self.resultados = {}
+        self._lock_resultados = threading.Lock()
+
+        # Durações por etapa e por usuário
+        self.metricas = MetricasEtapas(prefixo='coleta_mv_escalas')
+
         # Estatísticas por dia
         self.stats_por_dia = {}
 
@@ -458,6 +514,8 @@ class ProdutividadeEscalasCollector:
 
     def setup_driver(self, restart: bool = False):
         """Configura o driver do Selenium com Firefox headless."""
+        inicio_etapa = time.perf_counter()
+
         if restart and self.driver:
             logger.info("Reiniciando driver - fechando instância anterior...")
             try:
@@ -500,7 +558,7 @@ class ProdutividadeEscalasCollector:
 
         # Preferências otimizadas
         options.set_preference('general.useragent.override', self.current_user_agent)
-        options.set_preference('marionette.port', 2828)
+        options.set_preference('marionette.port', MARIONETTE_PORT)
         options.set_preference('browser.cache.disk.enable', False)
         options.set_preference('browser.cache.memory.enable', True)
         options.set_preference('network.http.connection-timeout', 120)
@@ -511,7 +569,7 @@ class ProdutividadeEscalasCollector:
         # ============================================================================
         # AJUSTE 2: Forçando o caminho do binário para o Debian (firefox-esr)
         # ============================================================================
-        options.binary_location = '/usr/bin/firefox-esr'
+        options.binary_location = FIREFOX_BINARY
 
         logger.info("Limpando processos Firefox/Geckodriver travados...")
         kill_zombie_processes()
@@ -527,6 +585,7 @@ class ProdutividadeEscalasCollector:
             self.driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
             self.driver.implicitly_wait(IMPLICIT_WAIT)
             self.driver_start_time = datetime.now()
+            self.metricas.registrar('inicio_driver', time.perf_counter() - inicio_etapa)
             logger.info(f"Firefox driver configurado com sucesso às {self.driver_start_time.strftime('%H:%M:%S')}")
         except Exception as e:
             logger.error(f"Erro ao configurar Firefox driver: {e}")
@@ -597,20 +656,39 @@ class ProdutividadeEscalasCollector:
             self.consecutive_failures = 0
             logger.info("Circuit breaker: Sistema reiniciado")
 
+    def _buscar_paginado(self, montar_query) -> List[Dict]:
+        """
+        Executa uma consulta paginada no Supabase e retorna todas as linhas.
+        `montar_query` deve devolver uma query nova (com ordenação estável) a cada chamada.
+        """
+        linhas = []
+        offset = 0
+
+        while True:
+            response = montar_query().range(offset, offset + PAGE_SIZE - 1).execute()
+            lote = response.data or []
+            linhas.extend(lote)
+
+            if len(lote) < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+
+        return linhas
+
     def buscar_usuarios_terceiros(self, cpfs_filtro: Optional[List[str]] = None) -> List[Dict]:
-        """Busca usuários do tipo 'terceiro' com codigomv."""
+        """Busca usuários do tipo 'terceiro' com codigomv (paginado)."""
         logger.info("Buscando usuários terceiros...")
         try:
-            query = self.supabase.table('usuarios').select(
-                'id, nome, cpf, codigomv, especialidade'
-            ).eq('tipo', 'terceiro').not_.is_('codigomv', 'null')
+            usuarios = self._buscar_paginado(
+                lambda: self.supabase.table('usuarios').select(
+                    'id, nome, cpf, codigomv, especialidade'
+                ).eq('tipo', 'terceiro').not_.is_('codigomv', 'null').order('id')
+            )
 
-            if cpfs_filtro:
+            if cpfs_filtro is not None:
                 logger.info(f"Filtrando por {len(cpfs_filtro)} CPFs específicos")
-                query = query.in_('cpf', cpfs_filtro)
-
-            response = query.execute()
-            usuarios = response.data
+                cpfs = set(cpfs_filtro)
+                usuarios = [u for u in usuarios if u.get('cpf') in cpfs]
 
             logger.info(f"Encontrados {len(usuarios)} usuários terceiros")
             return usuarios
@@ -627,67 +705,150 @@ class ProdutividadeEscalasCollector:
         """Retorna a data no formato ISO (YYYY-MM-DD)."""
         return data.strftime('%Y-%m-%d')
 
-    def buscar_cpfs_escalas_dia(self, data: datetime) -> List[str]:
+    def buscar_cpfs_escalas_periodo(self, data_inicio: datetime, data_fim: datetime) -> Dict[str, set]:
         """
-        Busca CPFs únicos de médicos que têm escalas em um dia específico.
-        Extrai CPFs do campo JSONB 'medicos' da tabela escalas_medicas.
+        Busca os CPFs de médicos escalados em cada dia do período.
+        Lê a tabela indexada escalas_medicos (migration 034); os dias sem linhas
+        nela (ou o período inteiro, se ela não estiver disponível) são completados
+        pelo JSONB 'medicos' da tabela escalas_medicas.
+        Retorna {data_iso: set(cpfs)}.
         """
-        logger.info(f"Buscando CPFs de escalas para {data.strftime('%d/%m/%Y')}...")
+        logger.info(
+            f"Buscando escalas de {data_inicio.strftime('%d/%m/%Y')} "
+            f"até {data_fim.strftime('%d/%m/%Y')}..."
+        )
+        inicio_iso = self.obter_data_iso(data_inicio)
+        fim_iso = self.obter_data_iso(data_fim)
+        dias = {
+            self.obter_data_iso(data_inicio + timedelta(days=n))
+            for n in range((data_fim - data_inicio).days + 1)
+        }
+
+        cpfs_por_dia: Dict[str, set] = {}
+        tabela_lida = False
         try:
-            data_iso = self.obter_data_iso(data)
+            linhas = self._buscar_paginado(
+                lambda: self.supabase.table('escalas_medicos').select(
+                    'escala_id, cpf, data_inicio'
+                ).gte('data_inicio', inicio_iso).lte(
+                    'data_inicio', fim_iso
+                ).eq('ativo', True).order('escala_id').order('cpf')
+            )
+            for linha in linhas:
+                cpfs_por_dia.setdefault(linha['data_inicio'], set()).add(linha['cpf'])
+            logger.info(f"escalas_medicos: {len(linhas)} linhas em {len(cpfs_por_dia)} dias")
+            tabela_lida = True
+        except Exception as e:
+            logger.warning(f"escalas_medicos indisponível ({e}), lendo o JSONB das escalas")
 
-            # Buscar escalas do dia (apenas escalas ativas)
-            response = self.supabase.table('escalas_medicas').select(
-                'id, medicos'
-            ).eq('data_inicio', data_iso).eq('ativo', True).execute()
+        # Dias sem linhas na tabela: podem não ter sido carregados ainda — confere o JSONB
+        faltantes = dias - set(cpfs_por_dia)
+        if not faltantes:
+            return cpfs_por_dia
 
-            if not response.data:
-                logger.warning(f"Nenhuma escala encontrada para {data.strftime('%d/%m/%Y')}")
-                return []
+        try:
+            escalas = self._buscar_paginado(
+                lambda: self.supabase.table('escalas_medicas').select(
+                    'id, data_inicio, medicos'
+                ).in_('data_inicio', sorted(faltantes)).eq('ativo', True).order('id')
+            )
 
-            # Extrair CPFs do campo JSONB 'medicos'
             # O campo medicos é um array de objetos: [{nome: "...", cpf: "..."}]
-            cpfs = set()
-            for escala in response.data:
+            completados = set()
+            for escala in escalas:
                 medicos = escala.get('medicos', [])
                 if isinstance(medicos, list):
                     for medico in medicos:
-                        if isinstance(medico, dict) and medico.get('cpf'):
-                            cpfs.add(medico['cpf'])
-
-            cpfs_list = list(cpfs)
-            logger.info(f"Encontradas {len(response.data)} escalas com {len(cpfs_list)} CPFs únicos")
-
-            return cpfs_list
+                        # Mesma normalização do trigger de escalas_medicos (btrim)
+                        cpf = (medico.get('cpf') or '').strip() if isinstance(medico, dict) else ''
+                        if cpf:
+                            cpfs_por_dia.setdefault(escala['data_inicio'], set()).add(cpf)
+                            completados.add(escala['data_inicio'])
+
+            logger.info(f"JSONB: {len(escalas)} escalas para {len(faltantes)} dias sem linhas em escalas_medicos")
+            if tabela_lida and completados:
+                logger.warning(
+                    f"escalas_medicos está incompleta em {len(completados)} dia(s) "
+                    f"— rode sincronizar-escalas-medicos.py"
+                )
+            return cpfs_por_dia
         except Exception as e:
             logger.error(f"Erro ao buscar CPFs de escalas: {e}")
             raise
 
-    def buscar_codigos_mv_ja_processados(self, data: datetime) -> set:
+    def buscar_codigos_mv_ja_processados_periodo(self, data_inicio: datetime,
+                                                 data_fim: datetime) -> Dict[str, set]:
         """
-        Busca os codigo_mv que já têm produtividade salva para uma data específica.
-        Retorna um set de codigo_mv para lookup rápido.
+        Busca os codigo_mv que já têm produtividade salva em cada dia do período.
+        Retorna {data_iso: set(codigo_mv)} para lookup rápido.
         """
-        logger.info(f"Verificando produtividade já coletada para {data.strftime('%d/%m/%Y')}...")
+        logger.info("Verificando produtividade já coletada no período...")
         try:
-            data_iso = self.obter_data_iso(data)
-
-            response = self.supabase.table('produtividade').select(
-                'codigo_mv'
-            ).eq('data', data_iso).execute()
-
-            if not response.data:
-                logger.info("Nenhuma produtividade encontrada para esta data")
-                return set()
+            registros = self._buscar_paginado(
+                lambda: self.supabase.table('produtividade').select(
+                    'id, codigo_mv, data'
+                ).gte('data', self.obter_data_iso(data_inicio)).lte(
+                    'data', self.obter_data_iso(data_fim)
+                ).order('id')
+            )
 
-            codigos_processados = {str(item['codigo_mv']) for item in response.data if item.get('codigo_mv')}
-            logger.info(f"Encontrados {len(codigos_processados)} médicos já processados")
+            processados: Dict[str, set] = {}
+            for item in registros:
+                if item.get('codigo_mv') and item.get('data'):
+                    processados.setdefault(item['data'], set()).add(str(item['codigo_mv']))
 
-            return codigos_processados
+            logger.info(f"Encontrados {len(registros)} registros de produtividade já coletados")
+            return processados
         except Exception as e:
             logger.error(f"Erro ao buscar produtividade existente: {e}")
-            # Em caso de erro, retorna set vazio para não bloquear o processamento
-            return set()
+            # Em caso de erro, retorna vazio para não bloquear o processamento
+            return {}
+
+    def planejar_coleta(self, data_inicio: datetime, data_fim: datetime) -> Dict[str, Dict]:
+        """
+        Monta o plano de trabalho do período inteiro em memória.
+
+        Faz três consultas paginadas (escalas, usuários e produtividade existente)
+        e devolve {data_iso: {'usuarios': [...], 'pulados': n}} para todos os dias
+        do range, de modo que a coleta não precise consultar metadados por dia.
+        """
+        logger.info("Planejando coleta do período...")
+
+        cpfs_por_dia = self.buscar_cpfs_escalas_periodo(data_inicio, data_fim)
+        usuarios = self.buscar_usuarios_terceiros()
+        processados = self.buscar_codigos_mv_ja_processados_periodo(data_inicio, data_fim)
+
+        usuarios_por_cpf: Dict[str, List[Dict]] = {}
+        for usuario in usuarios:
+            usuarios_por_cpf.setdefault(usuario.get('cpf'), []).append(usuario)
+
+        plano = {}
+        total_jobs = 0
+        data_atual = data_inicio
+
+        while data_atual <= data_fim:
+            data_iso = self.obter_data_iso(data_atual)
+            ja_processados = processados.get(data_iso, set())
+
+            usuarios_dia = []
+            pulados = 0
+            for cpf in sorted(cpfs_por_dia.get(data_iso, set())):
+                for usuario in usuarios_por_cpf.get(cpf, []):
+                    if str(usuario.get('codigomv', '')) in ja_processados:
+                        pulados += 1
+                    else:
+                        usuarios_dia.append(usuario)
+
+            plano[data_iso] = {
+                'escalados': len(cpfs_por_dia.get(data_iso, set())),
+                'usuarios': usuarios_dia,
+                'pulados': pulados
+            }
+            total_jobs += len(usuarios_dia)
+            data_atual += timedelta(days=1)
+
+        logger.info(f"Plano montado: {len(plano)} dias, {total_jobs} coletas pendentes")
+        return plano
 
     @retry_with_exponential_backoff(
         max_retries=MAX_RETRIES,
@@ -698,6 +859,9 @@ class ProdutividadeEscalasCollector:
     def preencher_formulario(self, codigo_mv: str, data_inicial: str, data_final: str):
         """Preenche o formulário do relatório MV com retry automático e espera inteligente."""
         wait = WebDriverWait(self.driver, ELEMENT_WAIT_TIMEOUT)
+        inicio_etapa = time.perf_counter()
+        submetido = False
+        self.ultimo_formulario = (codigo_mv, data_inicial, data_final)
 
         try:
             logger.info(f"Preenchendo formulário...")
@@ -785,12 +949,15 @@ class ProdutividadeEscalasCollector:
 
             logger.info("Clicando no botão Submit...")
             botao_submit.click()
+            submetido = True
+            self.metricas.registrar('preenchimento_formulario', time.perf_counter() - inicio_etapa, codigo_mv)
 
             # ========================================================================
             # OTIMIZAÇÃO: Aguardar até o código aparecer no relatório
             # ========================================================================
             logger.info(f"Aguardando código {codigo_mv} aparecer no relatório...")
             codigo_apareceu = False
+            inicio_espera = time.perf_counter()
             tempo_inicio = time.time()
             max_wait = TIMEOUT_CODIGO_APARECER
 
@@ -843,6 +1010,7 @@ class ProdutividadeEscalasCollector:
 
             # Pequena pausa adicional para garantir que todos os dados carregaram
             time.sleep(2)
+            self.metricas.registrar('espera_codigo', time.perf_counter() - inicio_espera, codigo_mv)
 
             logger.info("Formulário preenchido e submetido com sucesso")
 
@@ -882,6 +1050,11 @@ class ProdutividadeEscalasCollector:
             logger.error(f"Erro inesperado ao preencher formulário: {e}")
             raise e
 
+        finally:
+            # Tentativas que falharam antes do Submit também entram na etapa
+            if not submetido:
+                self.metricas.registrar('preenchimento_formulario', time.perf_counter() - inicio_etapa, codigo_mv)
+
     def extrair_dados_tabela(self, codigo_mv: str, campos_extrair: List[str]) -> Optional[Dict]:
         """Extrai os dados usando XPaths específicos dos divs (OTIMIZADO)."""
 
@@ -923,6 +1096,14 @@ class ProdutividadeEscalasCollector:
                     logger.debug("Nenhum iframe encontrado")
                     self.driver.switch_to.default_content()
 
+            # Gravar o relatório renderizado para replay offline
+            if GRAVAR_PAGINAS_DIR and self.ultimo_formulario:
+                try:
+                    caminho = salvar_pagina(GRAVAR_PAGINAS_DIR, *self.ultimo_formulario, self.driver.page_source)
+                    logger.debug(f"Página gravada em: {caminho}")
+                except Exception as e:
+                    logger.warning(f"Erro ao gravar página: {e}")
+
             # Verificar se o código encontrado corresponde ao esperado
             if codigo_encontrado != str(codigo_mv):
                 logger.warning(f"Código encontrado ({codigo_encontrado}) != código esperado ({codigo_mv})")
@@ -995,18 +1176,17 @@ class ProdutividadeEscalasCollector:
         except ValueError:
             return 0
 
-    def inserir_produtividade(self, dados: Dict, data: datetime):
-        """Insere os dados de produtividade no Supabase."""
+    def inserir_produtividade(self, dados: Dict, data: datetime, job: Optional[Tuple[str, str]] = None):
+        """
+        Salva os dados de produtividade no Supabase.
+        Com o gravador ativo, apenas enfileira o registro (gravação em lote em segundo plano);
+        `job` é a chave (data_iso, codigo_mv) do journal, marcada como concluída após a gravação.
+        """
         try:
             logger.debug(f"Salvando produtividade para {dados['nome']}...")
 
             data_iso = self.obter_data_iso(data)
 
-            # Verificar existente
-            existing = self.supabase.table('produtividade').select('id').eq(
-                'codigo_mv', dados['codigo_mv']
-            ).eq('data', data_iso).execute()
-
             # Preparar payload
             data_payload = {
                 'nome': dados['nome'],
@@ -1027,6 +1207,19 @@ class ProdutividadeEscalasCollector:
                 'evolucao_noturna_cti': dados.get('evolucao_noturna_cti', 0),
             }
 
+            if self.gravador:
+                self.gravador.enfileirar(
+                    {**data_payload, 'codigo_mv': dados['codigo_mv'], 'data': data_iso},
+                    contexto=job
+                )
+                logger.debug(f"Registro enfileirado ({self.gravador.pendentes()} na fila)")
+                return
+
+            # Verificar existente
+            existing = self.supabase.table('produtividade').select('id').eq(
+                'codigo_mv', dados['codigo_mv']
+            ).eq('data', data_iso).execute()
+
             if existing.data and len(existing.data) > 0:
                 self.supabase.table('produtividade').update(data_payload).eq(
                     'id', existing.data[0]['id']
@@ -1042,6 +1235,32 @@ class ProdutividadeEscalasCollector:
             logger.error(f"Erro ao inserir produtividade: {e}")
             raise
 
+    def _registrar_resultado(self, job: Tuple[str, str], sucesso: bool):
+        """Registra o desfecho de um job; só conta como coleta o que já foi gravado."""
+        with self._lock_resultados:
+            if sucesso and not self.resultados.get(job):
+                self.coletas_sessao += 1
+            self.resultados[job] = sucesso
+
+    def _contagem_dia(self, data_iso: str) -> Tuple[int, int]:
+        """Retorna (gravados, falhos) de um dia segundo o desfecho dos jobs."""
+        with self._lock_resultados:
+            desfechos = [ok for (data, _), ok in self.resultados.items() if data == data_iso]
+        gravados = sum(desfechos)
+        return gravados, len(desfechos) - gravados
+
+    def _job_gravado(self, registro: Dict, job: Optional[Tuple[str, str]]):
+        """Callback do gravador: registro persistido, job concluído no journal."""
+        if job:
+            self.diario.marcar_concluido(*job)
+            self._registrar_resultado(job, True)
+
+    def _job_nao_gravado(self, registro: Dict, job: Optional[Tuple[str, str]], erro: Exception):
+        """Callback do gravador: gravação falhou em definitivo, job volta como falho."""
+        if job:
+            self.diario.marcar_falha(*job, f"Gravação: {erro}")
+            self._registrar_resultado(job, False)
+
     def processar_usuario(self, usuario: Dict, data: datetime, index: int, total: int):
         """Processa um único usuário fazendo DUAS buscas."""
         codigo_mv = usuario['codigomv']
@@ -1051,6 +1270,8 @@ class ProdutividadeEscalasCollector:
         logger.info(f"[{index}/{total}] {nome} (MV: {codigo_mv})")
         logger.info(f"{'='*70}")
 
+        inicio_usuario = time.perf_counter()
+
         try:
             # Health check periódico
             self.periodic_health_check()
@@ -1081,11 +1302,13 @@ class ProdutividadeEscalasCollector:
 
             logger.info(f"   {data_anterior.strftime('%d/%m/%Y')} -> {data.strftime('%d/%m/%Y')}")
 
-            self.driver.get(MV_REPORT_URL)
+            with self.metricas.medir('carregamento_pagina', codigo_mv):
+                self.driver.get(MV_REPORT_URL)
             time.sleep(random.uniform(5, 8))
 
             self.preencher_formulario(codigo_mv, data_inicial_str, data_final_str)
-            dados_periodo = self.extrair_dados_tabela(codigo_mv, CAMPOS_PERIODO_ANTERIOR)
+            with self.metricas.medir('extracao', codigo_mv):
+                dados_periodo = self.extrair_dados_tabela(codigo_mv, CAMPOS_PERIODO_ANTERIOR)
 
             if not dados_periodo:
                 logger.warning(f"Sem dados na busca 1")
@@ -1110,11 +1333,13 @@ class ProdutividadeEscalasCollector:
             data_str = self.formatar_data_mv(data)
             logger.info(f"   {data.strftime('%d/%m/%Y')} -> {data.strftime('%d/%m/%Y')}")
 
-            self.driver.get(MV_REPORT_URL)
+            with self.metricas.medir('carregamento_pagina', codigo_mv):
+                self.driver.get(MV_REPORT_URL)
             time.sleep(random.uniform(5, 8))
 
             self.preencher_formulario(codigo_mv, data_str, data_str)
-            dados_mesmo_dia = self.extrair_dados_tabela(codigo_mv, CAMPOS_MESMO_DIA)
+            with self.metricas.medir('extracao', codigo_mv):
+                dados_mesmo_dia = self.extrair_dados_tabela(codigo_mv, CAMPOS_MESMO_DIA)
 
             if not dados_mesmo_dia:
                 logger.warning(f"Sem dados na busca 2")
@@ -1143,23 +1368,71 @@ class ProdutividadeEscalasCollector:
             logger.info(f"   Período D-1->D: {sum([dados_completos[c] for c in CAMPOS_PERIODO_ANTERIOR])} atividades")
             logger.info(f"   Mesmo dia D: {sum([dados_completos[c] for c in CAMPOS_MESMO_DIA])} atividades")
 
-            # Salvar
-            self.inserir_produtividade(dados_completos, data)
+            # Salvar (enfileirado para o gravador em segundo plano)
+            with self.metricas.medir('gravacao', codigo_mv):
+                self.inserir_produtividade(
+                    dados_completos, data, job=(self.obter_data_iso(data), str(codigo_mv))
+                )
 
             self.consecutive_failures = 0
             self.processed_count += 1
+            self.metricas.registrar('usuario', time.perf_counter() - inicio_usuario, codigo_mv)
 
             logger.info(f"Usuário processado com sucesso")
 
-            random_delay()
+            with self.metricas.medir('pausa', codigo_mv):
+                random_delay()
 
         except Exception as e:
             self.consecutive_failures += 1
             logger.error(f"Erro (falha #{self.consecutive_failures}): {str(e)[:200]}")
             raise e
 
-    def processar_dia(self, data: datetime):
-        """Processa todos os usuários para um dia específico baseado em escalas."""
+    def processar_job(self, usuario: Dict, data: datetime, index: int, total: int) -> bool:
+        """Processa um usuário registrando o estado do job no journal."""
+        data_iso = self.obter_data_iso(data)
+        codigo_mv = usuario['codigomv']
+
+        self.diario.marcar_em_andamento(data_iso, codigo_mv)
+        try:
+            self.processar_usuario(usuario, data, index, total)
+        except Exception as e:
+            logger.error(f"Falha no usuário: {e}")
+            self.diario.marcar_falha(data_iso, codigo_mv, str(e))
+            self._registrar_resultado((data_iso, str(codigo_mv)), False)
+            return False
+
+        # Com o gravador ativo, o job só é concluído (e contado) quando o registro for gravado
+        if not self.gravador:
+            self.diario.marcar_concluido(data_iso, codigo_mv)
+            self._registrar_resultado((data_iso, str(codigo_mv)), True)
+        return True
+
+    def reprocessar_falhas(self):
+        """Retenta, com backoff exponencial, os jobs que falharam durante a passada."""
+        for rodada in range(1, JOURNAL_MAX_TENTATIVAS + 1):
+            # Garantir que falhas de gravação ainda na fila já estejam no journal
+            if self.gravador:
+                self.gravador.esvaziar()
+
+            falhas = self.diario.falhas_para_retentar(JOURNAL_MAX_TENTATIVAS)
+            if not falhas:
+                return
+
+            espera = min(INITIAL_RETRY_DELAY * (2 ** rodada), MAX_RETRY_DELAY)
+            logger.info(f"\n{'#'*70}")
+            logger.info(f"RETENTATIVA {rodada}: {len(falhas)} jobs falhos (aguardando {espera}s)")
+            logger.info(f"{'#'*70}")
+            time.sleep(espera)
+
+            for index, job in enumerate(falhas, 1):
+                usuario = job['usuario'] or {'codigomv': job['codigo_mv'], 'nome': job['codigo_mv']}
+                data = datetime.strptime(job['data'], '%Y-%m-%d')
+
+                self.processar_job(usuario, data, index, len(falhas))
+
+    def processar_dia(self, data: datetime, tarefa: Dict):
+        """Processa os usuários planejados para um dia específico baseado em escalas."""
         data_str = data.strftime('%d/%m/%Y')
 
         logger.info(f"\n{'#'*70}")
@@ -1172,40 +1445,29 @@ class ProdutividadeEscalasCollector:
             'total': 0,
             'sucesso': 0,
             'erros': 0,
-            'pulados': 0,
+            'pulados': tarefa['pulados'],
             'duracao': None
         }
 
         try:
-            # Buscar CPFs das escalas do dia
-            cpfs_dia = self.buscar_cpfs_escalas_dia(data)
-
-            if not cpfs_dia:
+            if not tarefa['escalados']:
                 logger.warning(f"Sem escalas em {data_str}")
                 return
 
-            # Buscar usuários
-            usuarios = self.buscar_usuarios_terceiros(cpfs_filtro=cpfs_dia)
-
-            if not usuarios:
-                logger.warning(f"Sem usuários terceiros com escalas em {data_str}")
-                return
+            # Pular jobs já concluídos segundo o journal (execução anterior interrompida)
+            concluidos = self.diario.concluidos(self.obter_data_iso(data))
+            usuarios = [u for u in tarefa['usuarios'] if str(u['codigomv']) not in concluidos]
+            pulados = tarefa['pulados'] + len(tarefa['usuarios']) - len(usuarios)
+            self.stats_por_dia[data_str]['pulados'] = pulados
 
-            # Filtrar usuários que já têm produtividade salva para esta data
-            codigos_ja_processados = self.buscar_codigos_mv_ja_processados(data)
-            usuarios_pulados = 0
-
-            if codigos_ja_processados:
-                usuarios_originais = len(usuarios)
-                usuarios = [u for u in usuarios if str(u.get('codigomv', '')) not in codigos_ja_processados]
-                usuarios_pulados = usuarios_originais - len(usuarios)
-
-                if usuarios_pulados > 0:
-                    logger.info(f"Pulando {usuarios_pulados} médicos já processados anteriormente")
-                    self.stats_por_dia[data_str]['pulados'] = usuarios_pulados
+            if pulados > 0:
+                logger.info(f"Pulando {pulados} médicos já processados anteriormente")
 
             if not usuarios:
-                logger.info(f"Todos os médicos já foram processados para {data_str}")
+                if pulados > 0:
+                    logger.info(f"Todos os médicos já foram processados para {data_str}")
+                else:
+                    logger.warning(f"Sem usuários terceiros com escalas em {data_str}")
                 return
 
             total = len(usuarios)
@@ -1217,13 +1479,10 @@ class ProdutividadeEscalasCollector:
 
             # Processar cada usuário
             for index, usuario in enumerate(usuarios, 1):
-                try:
-                    self.processar_usuario(usuario, data, index, total)
+                if self.processar_job(usuario, data, index, total):
                     sucesso += 1
-                except Exception as e:
-                    logger.error(f"Falha no usuário: {e}")
+                else:
                     erros += 1
-                    continue
 
             # Estatísticas
             fim = datetime.now()
@@ -1240,7 +1499,8 @@ class ProdutividadeEscalasCollector:
             logger.info(f"\n{'='*70}")
             logger.info(f"RESUMO: {data_str}")
             logger.info(f"{'='*70}")
-            logger.info(f"Total: {total} | Sucesso: {sucesso} ({taxa:.1f}%) | Erros: {erros} | Pulados: {pulados}")
+            # Sucesso aqui = coletado e enfileirado; a gravação é confirmada no resumo final
+            logger.info(f"Total: {total} | Coletados: {sucesso} ({taxa:.1f}%) | Erros: {erros} | Pulados: {pulados}")
             logger.info(f"Duração: {duracao}")
             logger.info(f"{'='*70}\n")
 
@@ -1258,7 +1518,8 @@ class ProdutividadeEscalasCollector:
         logger.info(f"Período: {DATA_INICIO.strftime('%d/%m/%Y')} até {DATA_FIM.strftime('%d/%m/%Y')}")
         logger.info(f"Início: {inicio.strftime('%Y-%m-%d %H:%M:%S')}")
         logger.info(f"OTIMIZAÇÕES ATIVAS:")
-        logger.info(f"   - Busca por ESCALAS MÉDICAS (tabela escalas_medicas)")
+        logger.info(f"   - Busca por ESCALAS MÉDICAS (tabela escalas_medicos, com fallback no JSONB)")
+        logger.info(f"   - Planejamento único do período (sem consultas por dia)")
         logger.info(f"   - Pula médicos já coletados (tabela produtividade)")
         logger.info(f"   - Espera inteligente por código (ao invés de delays fixos)")
         logger.info(f"   - Extração via XPaths específicos")
@@ -1269,6 +1530,27 @@ class ProdutividadeEscalasCollector:
             cleanup_old_screenshots()
             cleanup_temp_files()
             self.connect_supabase()
+            plano = self.planejar_coleta(DATA_INICIO, DATA_FIM)
+
+            self.diario = DiarioColeta(JOURNAL_PATH)
+            novos = self.diario.registrar_pendentes(
+                (data_iso, usuario['codigomv'], usuario)
+                for data_iso, tarefa in plano.items()
+                for usuario in tarefa['usuarios']
+            )
+            logger.info(f"Journal: {novos} jobs novos registrados em {JOURNAL_PATH}")
+
+            self.gravador = GravadorProdutividade(
+                self.supabase,
+                tamanho_fila=GRAVADOR_TAMANHO_FILA,
+                tamanho_lote=GRAVADOR_TAMANHO_LOTE,
+                intervalo_flush=GRAVADOR_INTERVALO_FLUSH,
+                ao_gravar=self._job_gravado,
+                ao_falhar=self._job_nao_gravado,
+                metricas=self.metricas
+            )
+            self.gravador.iniciar()
+
             self.setup_driver()
 
             # Processar dias
@@ -1277,7 +1559,7 @@ class ProdutividadeEscalasCollector:
 
             while data_atual <= DATA_FIM:
                 try:
-                    self.processar_dia(data_atual)
+                    self.processar_dia(data_atual, plano[self.obter_data_iso(data_atual)])
                     dias += 1
                 except Exception as e:
                     logger.error(f"Erro no dia {data_atual.strftime('%d/%m/%Y')}: {e}")
@@ -1287,6 +1569,10 @@ class ProdutividadeEscalasCollector:
                 if data_atual <= DATA_FIM:
                     time.sleep(random.uniform(8, 15))
 
+            # Retentar falhas da passada e gravar o que restou na fila
+            self.reprocessar_falhas()
+            self.gravador.esvaziar()
+
             # Resumo final
             fim = datetime.now()
             duracao = fim - inicio
@@ -1307,6 +1593,10 @@ class ProdutividadeEscalasCollector:
             total_pulados = 0
 
             for dia, stats in self.stats_por_dia.items():
+                # Sucesso/erro pelo desfecho da gravação (inclui retentativas e falhas do gravador)
+                stats['sucesso'], stats['erros'] = self._contagem_dia(
+                    datetime.strptime(dia, '%d/%m/%Y').strftime('%Y-%m-%d')
+                )
                 total_usuarios += stats['total']
                 total_sucesso += stats['sucesso']
                 total_erros += stats['erros']
@@ -1330,6 +1620,17 @@ class ProdutividadeEscalasCollector:
             logger.info(f"  Pulados (já coletados): {total_pulados}")
             logger.info(f"  Buscas realizadas: {total_sucesso * 2}")
 
+            horas = duracao.total_seconds() / 3600
+            if horas > 0:
+                logger.info(f"  Throughput: {self.coletas_sessao / horas:.1f} coletas/hora")
+
+            resumo_journal = self.diario.resumo()
+            logger.info(
+                f"  Journal (esta execução): {resumo_journal['concluido']} concluídos | "
+                f"{resumo_journal['pendente']} pendentes | "
+                f"{resumo_journal['falhou']} falhos"
+            )
+
             if total_usuarios > 0:
                 taxa_geral = (total_sucesso / total_usuarios * 100)
                 logger.info(f"  Taxa de sucesso: {taxa_geral:.1f}%")
@@ -1353,9 +1654,27 @@ class ProdutividadeEscalasCollector:
                 except:
                     pass
                 kill_zombie_processes()
+            if self.gravador:
+                self.gravador.parar()
+            if self.diario:
+                self.diario.fechar()
+            self.salvar_metricas()
+
+    def salvar_metricas(self):
+        """Exporta as durações por etapa (JSON e, se configurado, Prometheus textfile)."""
+        try:
+            logger.info("TEMPO POR ETAPA:")
+            self.metricas.log_resumo()
+            self.metricas.salvar_json(METRICAS_JSON_PATH)
+            if METRICAS_PROM_PATH:
+                self.metricas.salvar_prometheus(METRICAS_PROM_PATH)
+        except Exception as e:
+            logger.warning(f"Erro ao salvar métricas: {e}")
 
 def main():
     """Função principal."""
+    signal.signal(signal.SIGTERM, sigterm_handler)
+
     collector = ProdutividadeEscalasCollector()
     try:
         collector.executar()
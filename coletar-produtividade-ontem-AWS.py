@@ -620,11 +620,38 @@ class ProdutividadeOntemCollector:
             return set()
 
     def buscar_cpfs_escalas_dia(self, data: datetime) -> Set[str]:
-        """Busca CPFs de médicos com escalas em um dia específico."""
+        """
+        Busca CPFs de médicos com escalas em um dia específico.
+        Lê a tabela indexada escalas_medicos (migration 034); se ela não estiver
+        disponível ou não tiver linhas no dia, percorre o JSONB 'medicos' das escalas do dia.
+        """
         logger.info(f"Buscando CPFs de ESCALAS para {data.strftime('%d/%m/%Y')}...")
+        data_iso = self.obter_data_iso(data)
+        tabela_vazia = False
+
         try:
-            data_iso = self.obter_data_iso(data)
+            cpfs = set()
+            offset = 0
+            while True:
+                response = self.supabase.table('escalas_medicos').select('cpf').eq(
+                    'data_inicio', data_iso
+                ).eq('ativo', True).order('cpf').range(offset, offset + 999).execute()
+                lote = response.data or []
+                cpfs.update(linha['cpf'] for linha in lote)
+                if len(lote) < 1000:
+                    break
+                offset += 1000
+
+            if cpfs:
+                logger.info(f"Encontrados {len(cpfs)} CPFs únicos em escalas (escalas_medicos)")
+                return cpfs
+            # Tabela vazia no dia: pode não ter sido carregada ainda — confere o JSONB
+            tabela_vazia = True
+            logger.info("escalas_medicos sem linhas para o dia, conferindo o JSONB das escalas")
+        except Exception as e:
+            logger.warning(f"escalas_medicos indisponível ({e}), lendo o JSONB das escalas")
 
+        try:
             response = self.supabase.table('escalas_medicas').select(
                 'id, medicos'
             ).eq('data_inicio', data_iso).eq('ativo', True).execute()
@@ -638,10 +665,14 @@ class ProdutividadeOntemCollector:
                 medicos = escala.get('medicos', [])
                 if isinstance(medicos, list):
                     for medico in medicos:
-                        if isinstance(medico, dict) and medico.get('cpf'):
-                            cpfs.add(medico['cpf'])
+                        # Mesma normalização do trigger de escalas_medicos (btrim)
+                        cpf = (medico.get('cpf') or '').strip() if isinstance(medico, dict) else ''
+                        if cpf:
+                            cpfs.add(cpf)
 
             logger.info(f"Encontradas {len(response.data)} escalas com {len(cpfs)} CPFs únicos")
+            if tabela_vazia and cpfs:
+                logger.warning("escalas_medicos está incompleta para o dia — rode sincronizar-escalas-medicos.py")
 
             return cpfs
         except Exception as e:
@@ -630,12 +630,37 @@ class ProdutividadeEscalasCollector:
     def buscar_cpfs_escalas_dia(self, data: datetime) -> List[str]:
         """
         Busca CPFs únicos de médicos que têm escalas em um dia específico.
-        Extrai CPFs do campo JSONB 'medicos' da tabela escalas_medicas.
+        Lê a tabela indexada escalas_medicos (migration 034); se ela não estiver
+        disponível ou não tiver linhas no dia, extrai os CPFs do campo JSONB 'medicos'
+        da tabela escalas_medicas.
         """
         logger.info(f"Buscando CPFs de escalas para {data.strftime('%d/%m/%Y')}...")
+        data_iso = self.obter_data_iso(data)
+        tabela_vazia = False
+
         try:
-            data_iso = self.obter_data_iso(data)
+            cpfs = set()
+            offset = 0
+            while True:
+                response = self.supabase.table('escalas_medicos').select('cpf').eq(
+                    'data_inicio', data_iso
+                ).eq('ativo', True).order('cpf').range(offset, offset + 999).execute()
+                lote = response.data or []
+                cpfs.update(linha['cpf'] for linha in lote)
+                if len(lote) < 1000:
+                    break
+                offset += 1000
+
+            if cpfs:
+                logger.info(f"Encontrados {len(cpfs)} CPFs únicos em escalas (escalas_medicos)")
+                return list(cpfs)
+            # Tabela vazia no dia: pode não ter sido carregada ainda — confere o JSONB
+            tabela_vazia = True
+            logger.info("escalas_medicos sem linhas para o dia, conferindo o JSONB das escalas")
+        except Exception as e:
+            logger.warning(f"escalas_medicos indisponível ({e}), lendo o JSONB das escalas")
 
+        try:
             # Buscar escalas do dia (apenas escalas ativas)
             response = self.supabase.table('escalas_medicas').select(
                 'id, medicos'
@@ -652,11 +677,15 @@ class ProdutividadeEscalasCollector:
                 medicos = escala.get('medicos', [])
                 if isinstance(medicos, list):
                     for medico in medicos:
-                        if isinstance(medico, dict) and medico.get('cpf'):
-                            cpfs.add(medico['cpf'])
+                        # Mesma normalização do trigger de escalas_medicos (btrim)
+                        cpf = (medico.get('cpf') or '').strip() if isinstance(medico, dict) else ''
+                        if cpf:
+                            cpfs.add(cpf)
 
             cpfs_list = list(cpfs)
             logger.info(f"Encontradas {len(response.data)} escalas com {len(cpfs_list)} CPFs únicos")
+            if tabela_vazia and cpfs_list:
+                logger.warning("escalas_medicos está incompleta para o dia — rode sincronizar-escalas-medicos.py")
 
             return cpfs_list
         except Exception as e:
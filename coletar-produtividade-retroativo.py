@@ -7,6 +7,10 @@ Este script:
 2. Para cada dia do período, coleta a produtividade de todos os médicos
 3. Aguarda 15 segundos entre cada dia para não sobrecarregar o servidor
 4. Insere os dados na tabela produtividade do Supabase
+5. Registra o estado de cada (dia, médico) em um journal SQLite local, para
+   retomar de onde parou e retentar falhas ao final da passada
+6. Mede o tempo de cada etapa (metricas_coleta) e exporta em
+   produtividade-mv-retroativo.metricas.json ao final
 
 ⚠️ ATENÇÃO: Este script deve ser executado APENAS UMA VEZ manualmente!
 """
@@ -27,6 +31,8 @@ from selenium.common.exceptions import TimeoutException, NoSuchElementException
 from supabase import create_client, Client
 from dotenv import load_dotenv
 import logging
+from diario_coleta import DiarioColeta
+from metricas_coleta import MetricasEtapas
 
 # Configurar logging
 logging.basicConfig(
@@ -46,6 +52,12 @@ load_dotenv()
 DATA_INICIO = datetime(2026, 2, 1)  # 01 de fevereiro de 2026
 DATA_FIM = datetime.now() - timedelta(days=1)  # Ontem
 INTERVALO_ENTRE_DIAS = 15  # segundos
+JOURNAL_PATH = 'produtividade-mv-retroativo.journal.sqlite'
+JOURNAL_MAX_TENTATIVAS = 3
+JOURNAL_BACKOFF_INICIAL = 30  # segundos (dobra a cada rodada de retentativa)
+# Métricas por etapa (JSON sempre; Prometheus textfile se METRICAS_PROM_PATH estiver definido)
+METRICAS_JSON_PATH = 'produtividade-mv-retroativo.metricas.json'
+METRICAS_PROM_PATH = os.getenv('METRICAS_PROM_PATH')
 # ======================================================
 
 MV_REPORT_URL = "http://mvpepprd.saude.go.gov.br/report-executor/report-viewer?id=7076"
@@ -71,10 +83,16 @@ class ProdutividadeRetroativoCollector:
         self.total_dias = 0
         self.dias_processados = 0
         self.total_registros_inseridos = 0
+        self.diario = None
+        self.coletas_sessao = 0
+
+        # Durações por etapa e por usuário
+        self.metricas = MetricasEtapas(prefixo='coleta_mv_retroativo')
 
     def setup_driver(self):
         """Configura o driver do Selenium com Firefox headless."""
         logger.info("Configurando Firefox driver...")
+        inicio_etapa = time.perf_counter()
 
         import os
         import shutil
@@ -104,6 +122,7 @@ class ProdutividadeRetroativoCollector:
             # Timeouts aumentados
             self.driver.set_page_load_timeout(300)
             self.driver.set_script_timeout(300)
+            self.metricas.registrar('inicio_driver', time.perf_counter() - inicio_etapa)
             logger.info("Firefox iniciado com sucesso!")
         except Exception as e:
             logger.error(f"Erro ao configurar Firefox driver: {e}")
@@ -145,40 +164,44 @@ class ProdutividadeRetroativoCollector:
         try:
             # Acessar o relatório
             if self.driver.current_url != MV_REPORT_URL:
-                self.driver.get(MV_REPORT_URL)
-                time.sleep(2)
-
-            # Preencher código do prestador
-            campo_codigo = WebDriverWait(self.driver, 20).until(
-                EC.presence_of_element_located((By.XPATH, XPATH_CODIGO_PRESTADOR))
-            )
-            campo_codigo.clear()
-            campo_codigo.send_keys(codigo_mv)
-
-            # Preencher data inicial
-            campo_data_inicial = self.driver.find_element(By.XPATH, XPATH_DATA_INICIAL)
-            campo_data_inicial.clear()
-            campo_data_inicial.send_keys(data_str)
-
-            # Preencher data final (mesmo dia)
-            campo_data_final = self.driver.find_element(By.XPATH, XPATH_DATA_FINAL)
-            campo_data_final.clear()
-            campo_data_final.send_keys(data_str)
-
-            # Clicar no botão Submit
-            submit_button = self.driver.find_element(By.XPATH, XPATH_SUBMIT_BUTTON)
-            submit_button.click()
+                with self.metricas.medir('carregamento_pagina', codigo_mv):
+                    self.driver.get(MV_REPORT_URL)
+                    time.sleep(2)
+
+            with self.metricas.medir('preenchimento_formulario', codigo_mv):
+                # Preencher código do prestador
+                campo_codigo = WebDriverWait(self.driver, 20).until(
+                    EC.presence_of_element_located((By.XPATH, XPATH_CODIGO_PRESTADOR))
+                )
+                campo_codigo.clear()
+                campo_codigo.send_keys(codigo_mv)
+
+                # Preencher data inicial
+                campo_data_inicial = self.driver.find_element(By.XPATH, XPATH_DATA_INICIAL)
+                campo_data_inicial.clear()
+                campo_data_inicial.send_keys(data_str)
+
+                # Preencher data final (mesmo dia)
+                campo_data_final = self.driver.find_element(By.XPATH, XPATH_DATA_FINAL)
+                campo_data_final.clear()
+                campo_data_final.send_keys(data_str)
+
+                # Clicar no botão Submit
+                submit_button = self.driver.find_element(By.XPATH, XPATH_SUBMIT_BUTTON)
+                submit_button.click()
 
             # Aguardar tabela carregar
-            time.sleep(5)
+            with self.metricas.medir('carregamento_pagina', codigo_mv):
+                time.sleep(5)
 
             # Extrair dados da tabela
-            dados = self._extrair_dados_tabela(data, codigo_mv, nome_medico)
+            with self.metricas.medir('extracao', codigo_mv):
+                dados = self._extrair_dados_tabela(data, codigo_mv, nome_medico)
             return dados
 
         except Exception as e:
             logger.warning(f"Erro ao coletar dados de {nome_medico} ({codigo_mv}) em {data_str}: {e}")
-            return []
+            raise
 
     def _extrair_dados_tabela(self, data: datetime, codigo_mv: str, nome_medico: str) -> List[Dict]:
         """Extrai dados da tabela de produtividade."""
@@ -252,17 +275,67 @@ class ProdutividadeRetroativoCollector:
             return 0
 
     def inserir_dados_supabase(self, dados: List[Dict]) -> int:
-        """Insere dados no Supabase."""
+        """Insere dados no Supabase. Retorna quantas linhas o banco confirmou."""
         if not dados:
             return 0
 
         try:
             response = self.supabase.table('produtividade').insert(dados).execute()
-            return len(dados)
+            return len(response.data or [])
         except Exception as e:
             logger.error(f"Erro ao inserir dados no Supabase: {e}")
             return 0
 
+    def processar_job(self, data: datetime, codigo_mv: str, nome: str) -> int:
+        """Coleta e insere um (dia, médico) registrando o estado no journal."""
+        data_iso = data.strftime("%Y-%m-%d")
+        self.diario.marcar_em_andamento(data_iso, codigo_mv)
+        inicio_usuario = time.perf_counter()
+
+        try:
+            dados = self.coletar_produtividade_dia(data, codigo_mv, nome)
+
+            inseridos = 0
+            if dados:
+                with self.metricas.medir('gravacao', codigo_mv):
+                    inseridos = self.inserir_dados_supabase(dados)
+                if inseridos == 0:
+                    raise RuntimeError("Falha ao inserir dados no Supabase")
+                logger.info(f"  ✓ {inseridos} registros inseridos")
+            else:
+                logger.info(f"  - Sem dados para este dia")
+
+        except Exception as e:
+            logger.error(f"  ✗ Erro: {e}")
+            self.diario.marcar_falha(data_iso, codigo_mv, str(e))
+            return 0
+
+        self.diario.marcar_concluido(data_iso, codigo_mv)
+        self.coletas_sessao += 1
+        self.metricas.registrar('usuario', time.perf_counter() - inicio_usuario, codigo_mv)
+        return inseridos
+
+    def reprocessar_falhas(self):
+        """Retenta, com backoff exponencial, os jobs que falharam durante a passada."""
+        espera = JOURNAL_BACKOFF_INICIAL
+
+        for rodada in range(1, JOURNAL_MAX_TENTATIVAS + 1):
+            falhas = self.diario.falhas_para_retentar(JOURNAL_MAX_TENTATIVAS)
+            if not falhas:
+                return
+
+            logger.info(f"\nRetentativa {rodada}: {len(falhas)} jobs falhos (aguardando {espera}s)...")
+            time.sleep(espera)
+            espera *= 2
+
+            for idx, job in enumerate(falhas, 1):
+                usuario = job['usuario'] or {}
+                nome = usuario.get('nome', job['codigo_mv'])
+                logger.info(f"[{idx}/{len(falhas)}] {job['data']} - {nome} ({job['codigo_mv']})...")
+
+                data = datetime.strptime(job['data'], "%Y-%m-%d")
+                self.total_registros_inseridos += self.processar_job(data, job['codigo_mv'], nome)
+
     def executar(self):
         """Executa a coleta retroativa."""
         logger.info("\n" + "="*70)
@@ -280,8 +353,24 @@ class ProdutividadeRetroativoCollector:
                 logger.error("Nenhum usuário terceiro encontrado")
                 return
 
+            # Registrar jobs no journal (jobs já conhecidos mantêm o estado)
+            self.diario = DiarioColeta(JOURNAL_PATH)
+            jobs = []
+            data_atual = DATA_INICIO
+            while data_atual <= DATA_FIM:
+                for usuario in self.usuarios_terceiros:
+                    jobs.append((
+                        data_atual.strftime("%Y-%m-%d"),
+                        usuario.get('codigomv'),
+                        {'nome': usuario.get('nome'), 'codigomv': usuario.get('codigomv')}
+                    ))
+                data_atual += timedelta(days=1)
+            novos = self.diario.registrar_pendentes(jobs)
+            logger.info(f"Journal: {novos} jobs novos registrados em {JOURNAL_PATH}")
+
             # Configurar driver
             self.setup_driver()
+            inicio = datetime.now()
 
             # Calcular total de dias
             self.total_dias = (DATA_FIM - DATA_INICIO).days + 1
@@ -300,28 +389,20 @@ class ProdutividadeRetroativoCollector:
                 logger.info(f"{'='*70}")
 
                 registros_dia = 0
+                concluidos = self.diario.concluidos(data_atual.strftime("%Y-%m-%d"))
 
                 # Coletar dados de todos os médicos neste dia
                 for idx, usuario in enumerate(self.usuarios_terceiros, 1):
                     codigo_mv = usuario.get('codigomv')
                     nome = usuario.get('nome')
 
-                    logger.info(f"[{idx}/{len(self.usuarios_terceiros)}] Processando {nome} ({codigo_mv})...")
-
-                    try:
-                        dados = self.coletar_produtividade_dia(data_atual, codigo_mv, nome)
-
-                        if dados:
-                            inseridos = self.inserir_dados_supabase(dados)
-                            registros_dia += inseridos
-                            logger.info(f"  ✓ {inseridos} registros inseridos")
-                        else:
-                            logger.info(f"  - Sem dados para este dia")
-
-                    except Exception as e:
-                        logger.error(f"  ✗ Erro: {e}")
+                    if str(codigo_mv) in concluidos:
+                        logger.info(f"[{idx}/{len(self.usuarios_terceiros)}] {nome} ({codigo_mv}) já concluído, pulando")
                         continue
 
+                    logger.info(f"[{idx}/{len(self.usuarios_terceiros)}] Processando {nome} ({codigo_mv})...")
+                    registros_dia += self.processar_job(data_atual, codigo_mv, nome)
+
                 self.total_registros_inseridos += registros_dia
                 logger.info(f"\nResumo do dia: {registros_dia} registros inseridos")
                 logger.info(f"Total acumulado: {self.total_registros_inseridos} registros")
@@ -334,11 +415,24 @@ class ProdutividadeRetroativoCollector:
                     logger.info(f"\nAguardando {INTERVALO_ENTRE_DIAS} segundos antes do próximo dia...\n")
                     time.sleep(INTERVALO_ENTRE_DIAS)
 
+            # Retentar falhas da passada
+            self.reprocessar_falhas()
+
             # Resumo final
+            horas = (datetime.now() - inicio).total_seconds() / 3600
+            resumo_journal = self.diario.resumo()
+
             logger.info("\n" + "="*70)
             logger.info("COLETA RETROATIVA CONCLUÍDA!")
             logger.info(f"Dias processados: {self.dias_processados}")
             logger.info(f"Total de registros inseridos: {self.total_registros_inseridos}")
+            if horas > 0:
+                logger.info(f"Throughput: {self.coletas_sessao / horas:.1f} coletas/hora")
+            logger.info(
+                f"Journal (esta execução): {resumo_journal['concluido']} concluídos | "
+                f"{resumo_journal['pendente']} pendentes | "
+                f"{resumo_journal['falhou']} falhos"
+            )
             logger.info("="*70 + "\n")
 
         except Exception as e:
@@ -348,6 +442,20 @@ class ProdutividadeRetroativoCollector:
             if self.driver:
                 self.driver.quit()
                 logger.info("Firefox fechado")
+            if self.diario:
+                self.diario.fechar()
+            self.salvar_metricas()
+
+    def salvar_metricas(self):
+        """Exporta as durações por etapa (JSON e, se configurado, Prometheus textfile)."""
+        try:
+            logger.info("TEMPO POR ETAPA:")
+            self.metricas.log_resumo()
+            self.metricas.salvar_json(METRICAS_JSON_PATH)
+            if METRICAS_PROM_PATH:
+                self.metricas.salvar_prometheus(METRICAS_PROM_PATH)
+        except Exception as e:
+            logger.warning(f"Erro ao salvar métricas: {e}")
 
 def main():
     """Função principal."""
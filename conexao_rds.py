@@ -0,0 +1,182 @@
+"""
+Acesso compartilhado ao banco RDS do MV (somente leitura).
+
+Usado por mv-produtividade-rds*.py e consulta-db-felipe.py, que antes abriam
+uma conexão nova a cada consulta, sem timeouts nem keepalives:
+
+    with conexao_rds.cursor() as cur:                     # conexão do pool
+        conexao_rds.executar(cur, sql, params, rotulo="colunas")
+        conexao_rds.executar_preparada(cur, "agregacao", sql_com_$n, params)
+
+- Pool pequeno (ThreadedConnectionPool): a conexão TLS com o RDS é aberta uma
+  vez e reaproveitada pelas consultas seguintes da mesma execução
+- Keepalives TCP e connect_timeout, para não ficar pendurado em rede instável
+- statement_timeout por sessão (RDS_STATEMENT_TIMEOUT_S, padrão 600s) e por consulta (timeout_s=)
+- Prepared statements do servidor (PREPARE/EXECUTE) por conexão, para a
+  consulta de agregação repetida a cada dia processado: o plano é feito uma vez
+- Tempo de cada consulta no log
+
+Credenciais: RDS_HOST, RDS_PORT, RDS_DATABASE, RDS_USER, RDS_PASSWORD no
+ambiente ou no .env (RDS_PASSWORD é obrigatória; host, banco e usuário têm
+como padrão os valores que os scripts usavam fixos); tamanho máximo do pool
+em RDS_POOL_MAX (padrão 4).
+"""
+import os
+import time
+import zlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional, Sequence
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+import psycopg2.pool
+
+logger = logging.getLogger(__name__)
+
+
+def _statement_timeout_s() -> int:
+    return int(os.getenv("RDS_STATEMENT_TIMEOUT_S", "600"))   # 0 = sem limite
+
+
+def parametros_conexao() -> dict:
+    """Credenciais e opções de conexão, lidas do ambiente na hora de conectar (depois do load_dotenv)."""
+    senha = os.getenv("RDS_PASSWORD", "")
+    if not senha:
+        raise ValueError("RDS_PASSWORD não definido — necessário para consultar o RDS do MV")
+
+    return dict(
+        host=os.getenv("RDS_HOST", "db-rds-postgres.cx4bovrfmkbp.sa-east-1.rds.amazonaws.com"),
+        database=os.getenv("RDS_DATABASE", "db_rds_01"),
+        user=os.getenv("RDS_USER", "gest_contratos"),
+        password=senha,
+        port=os.getenv("RDS_PORT", "5432"),
+        connect_timeout=15,
+        keepalives=1,
+        keepalives_idle=60,       # s sem tráfego até o primeiro probe
+        keepalives_interval=15,   # s entre probes
+        keepalives_count=4,       # probes sem resposta até derrubar a conexão
+        application_name="parceria-mv-produtividade",
+        options=f"-c statement_timeout={_statement_timeout_s() * 1000}",
+    )
+
+
+class ConexaoRDS(psycopg2.extensions.connection):
+    """Conexão que lembra os prepared statements já criados nela."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.preparadas = set()
+
+
+_pool: Optional[psycopg2.pool.ThreadedConnectionPool] = None
+_lock_pool = threading.Lock()
+
+
+def _configurar(conn: ConexaoRDS) -> ConexaoRDS:
+    conn.set_session(readonly=True, autocommit=True)
+    return conn
+
+
+def conectar() -> ConexaoRDS:
+    """Conexão avulsa (fora do pool), já somente leitura e em autocommit."""
+    return _configurar(psycopg2.connect(**parametros_conexao(), connection_factory=ConexaoRDS))
+
+
+def _obter_pool() -> psycopg2.pool.ThreadedConnectionPool:
+    global _pool
+    with _lock_pool:
+        if _pool is None:
+            inicio = time.perf_counter()
+            parametros = parametros_conexao()
+            _pool = psycopg2.pool.ThreadedConnectionPool(
+                1, int(os.getenv("RDS_POOL_MAX", "4")), **parametros, connection_factory=ConexaoRDS,
+            )
+            logger.info(f"  RDS: pool aberto em {time.perf_counter() - inicio:.2f}s ({parametros['host']})")
+        return _pool
+
+
+@contextmanager
+def conexao():
+    """Empresta uma conexão do pool; conexões quebradas são descartadas, não devolvidas."""
+    pool = _obter_pool()
+    conn = pool.getconn()
+    if conn.closed:
+        pool.putconn(conn, close=True)
+        conn = pool.getconn()
+    if not conn.autocommit:
+        _configurar(conn)
+
+    quebrada = False
+    try:
+        yield conn
+    except psycopg2.extensions.QueryCanceledError:
+        raise                     # statement_timeout: a conexão continua boa
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        quebrada = True
+        raise
+    finally:
+        pool.putconn(conn, close=quebrada or bool(conn.closed))
+
+
+@contextmanager
+def cursor(dicionario: bool = True):
+    """Cursor (RealDictCursor por padrão) sobre uma conexão do pool."""
+    with conexao() as conn:
+        factory = psycopg2.extras.RealDictCursor if dicionario else None
+        with conn.cursor(cursor_factory=factory) as cur:
+            yield cur
+
+
+def fechar():
+    """Fecha todas as conexões do pool (fim do script)."""
+    global _pool
+    with _lock_pool:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+@contextmanager
+def _timeout(cur, timeout_s: Optional[int]):
+    if timeout_s is None:
+        yield
+        return
+    cur.execute("SET statement_timeout = %s", (int(timeout_s * 1000),))
+    try:
+        yield
+    finally:
+        if not cur.connection.closed:
+            cur.execute("SET statement_timeout = %s", (_statement_timeout_s() * 1000,))
+
+
+def executar(cur, sql: str, params: Optional[Sequence] = None, rotulo: str = "consulta",
+             timeout_s: Optional[int] = None):
+    """cur.execute com o tempo no log e, se informado, um statement_timeout só para esta consulta."""
+    inicio = time.perf_counter()
+    with _timeout(cur, timeout_s):
+        cur.execute(sql, params)
+    logger.info(f"  RDS [{rotulo}]: {time.perf_counter() - inicio:.2f}s"
+                f"{f' | {cur.rowcount} linha(s)' if cur.rowcount >= 0 else ''}")
+
+
+def executar_preparada(cur, nome: str, sql: str, params: Sequence, timeout_s: Optional[int] = None):
+    """
+    Executa `sql` (com parâmetros $1..$n) como prepared statement do servidor.
+    O PREPARE acontece uma vez por conexão; o nome leva um hash do SQL, então
+    variações do texto (ex.: colunas detectadas diferentes) viram statements distintos.
+    """
+    nome = f"{nome}_{zlib.crc32(sql.encode()):08x}"
+    conn = cur.connection
+
+    if nome not in conn.preparadas:
+        inicio = time.perf_counter()
+        cur.execute(f"PREPARE {nome} AS {sql}")
+        conn.preparadas.add(nome)
+        logger.info(f"  RDS [{nome}]: preparado em {time.perf_counter() - inicio:.2f}s")
+
+    marcadores = ", ".join(["%s"] * len(params))
+    executar(cur, f"EXECUTE {nome} ({marcadores})" if params else f"EXECUTE {nome}",
+             params, rotulo=nome, timeout_s=timeout_s)
@@ -0,0 +1,384 @@
+"""
+construir-sessoes-presenca.py
+=============================
+Constrói, de forma incremental, sessões de presença (cpf, planta, entrada, saída)
+a partir dos eventos brutos de catraca da tabela acessos.
+
+Os jobs de status hoje varrem o fluxo de eventos de cada médico a cada escala.
+Este script mantém a tabela presenca_sessoes (migration 033) compacta e atual:
+
+  1. Lê os acessos ingeridos desde a última marca d'água (acessos.created_at —
+     os importadores inserem eventos atrasados com data_acesso antiga, então a
+     marca é pela ingestão e não pelo horário do evento)
+  2. Para cada (cpf, planta) tocado, recua o ponto de reconstrução até o início
+     da sessão que o evento novo pode completar (entrada aberta ou órfã dentro
+     de DURACAO_MAXIMA_HORAS)
+  3. Recarrega os eventos da chave a partir desse ponto e refaz o pareamento
+     em uma linha do tempo contínua — turnos que atravessam a meia-noite
+     (ex.: 19:00→07:00) viram uma única sessão
+  4. Grava as sessões (upsert) e apaga as antigas da chave que não foram
+     regeradas; só então avança a marca d'água
+
+Regras de pareamento (eventos ordenados por horário):
+  - E seguida de S em até DURACAO_MAXIMA_HORAS  → sessão 'fechada'
+  - E/S repetida em até JUNCAO_MINUTOS           → mesma passagem (duplo registro na catraca)
+  - E sem S: 'aberta' enquanto recente; 'orfa_entrada' depois do limite
+  - S sem E anterior                             → 'orfa_saida'
+
+Uso:
+    python construir-sessoes-presenca.py                     # incremental
+    python construir-sessoes-presenca.py --desde 2026-01-01  # carga inicial / reconstrução
+"""
+
+import os
+import argparse
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from supabase import create_client, Client
+
+# ============================================================
+# CONFIGURAÇÕES
+# ============================================================
+
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env'))
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+SUPABASE_URL = os.getenv('SUPABASE_URL') or os.getenv('VITE_SUPABASE_URL')
+SUPABASE_KEY = os.getenv('SUPABASE_SERVICE_KEY') or os.getenv('VITE_SUPABASE_SERVICE_ROLE_KEY')
+
+PAGE_SIZE = 1000      # máximo por requisição no Supabase
+LOTE_IN = 100         # CPFs por filtro in_ (mantém a URL curta)
+LOTE_UPSERT = 500     # sessões por upsert
+
+NOME_CONTROLE = 'presenca_sessoes'
+
+# Maior intervalo aceito entre uma entrada e sua saída (turnos de até 24h + folga)
+DURACAO_MAXIMA_HORAS = float(os.getenv('SESSOES_DURACAO_MAXIMA_HORAS', '26'))
+# Registros repetidos no mesmo sentido dentro deste intervalo são a mesma passagem
+JUNCAO_MINUTOS = float(os.getenv('SESSOES_JUNCAO_MINUTOS', '10'))
+# Releitura antes da marca d'água: cobre inserções em transações que terminaram
+# depois de outras com created_at maior
+MARGEM_WATERMARK = timedelta(minutes=5)
+
+Chave = Tuple[str, str]   # (cpf, planta)
+
+
+def separador(titulo: str = ""):
+    logger.info("=" * 60)
+    if titulo:
+        logger.info(f"  {titulo}")
+        logger.info("=" * 60)
+
+
+def _parse_ts(valor: str) -> datetime:
+    """Converte um timestamp ISO do Supabase para datetime em UTC."""
+    dt = datetime.fromisoformat(valor.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def _chave(acesso: dict) -> Optional[Chave]:
+    cpf = (acesso.get('cpf') or '').strip()
+    if not cpf:
+        return None
+    return cpf, (acesso.get('planta') or '').strip()
+
+
+def buscar_paginado(montar_query) -> list:
+    """Executa uma consulta paginada; `montar_query` devolve uma query nova com ordenação estável."""
+    linhas = []
+    offset = 0
+
+    while True:
+        resp = montar_query().range(offset, offset + PAGE_SIZE - 1).execute()
+        lote = resp.data or []
+        linhas.extend(lote)
+
+        if len(lote) < PAGE_SIZE:
+            break
+        offset += PAGE_SIZE
+
+    return linhas
+
+
+# ============================================================
+# PAREAMENTO
+# ============================================================
+
+def montar_sessoes(eventos: List[Tuple[datetime, str]], agora: datetime) -> List[dict]:
+    """
+    Pareia os eventos (horário UTC, sentido) de um (cpf, planta), já ordenados.
+    Retorna dicts com inicio, fim, entrada, saida, qtd_eventos e situacao.
+    """
+    limite = timedelta(hours=DURACAO_MAXIMA_HORAS)
+    juncao = timedelta(minutes=JUNCAO_MINUTOS)
+    sessoes: List[dict] = []
+    aberta: Optional[dict] = None
+
+    def fechar_como_orfa(sessao: dict):
+        sessao['situacao'] = 'orfa_entrada'
+        sessoes.append(sessao)
+
+    for ts, sentido in eventos:
+        if sentido == 'E':
+            if aberta is not None:
+                if ts - aberta['entrada'] <= juncao:
+                    aberta['qtd_eventos'] += 1
+                    continue
+                fechar_como_orfa(aberta)
+            aberta = {'inicio': ts, 'fim': ts, 'entrada': ts, 'saida': None, 'qtd_eventos': 1}
+
+        elif sentido == 'S':
+            if aberta is not None:
+                if ts - aberta['entrada'] <= limite:
+                    aberta.update(fim=ts, saida=ts, situacao='fechada')
+                    aberta['qtd_eventos'] += 1
+                    sessoes.append(aberta)
+                    aberta = None
+                    continue
+                fechar_como_orfa(aberta)
+                aberta = None
+
+            anterior = sessoes[-1] if sessoes else None
+            if anterior is not None and anterior['saida'] is not None and ts - anterior['saida'] <= juncao:
+                anterior.update(fim=ts, saida=ts)
+                anterior['qtd_eventos'] += 1
+                continue
+            sessoes.append({'inicio': ts, 'fim': ts, 'entrada': None, 'saida': ts,
+                            'qtd_eventos': 1, 'situacao': 'orfa_saida'})
+
+    if aberta is not None:
+        aberta['situacao'] = 'orfa_entrada' if agora - aberta['entrada'] > limite else 'aberta'
+        sessoes.append(aberta)
+
+    return sessoes
+
+
+# ============================================================
+# MARCA D'ÁGUA E EVENTOS NOVOS
+# ============================================================
+
+def ler_watermark(sb: Client) -> Optional[datetime]:
+    resp = sb.table('presenca_sessoes_controle').select('watermark') \
+        .eq('nome', NOME_CONTROLE).execute()
+    if not resp.data:
+        return None
+    return _parse_ts(resp.data[0]['watermark'])
+
+
+def gravar_watermark(sb: Client, watermark: datetime):
+    sb.table('presenca_sessoes_controle').upsert({
+        'nome': NOME_CONTROLE,
+        'watermark': watermark.isoformat(),
+        'atualizado_em': datetime.now(timezone.utc).isoformat(),
+    }, on_conflict='nome').execute()
+
+
+def carregar_eventos_novos(sb: Client, watermark: Optional[datetime],
+                           desde: Optional[str]) -> Tuple[Dict[Chave, datetime], Optional[datetime]]:
+    """
+    Lê os acessos novos (created_at após a marca, ou data_acesso desde --desde).
+    Retorna ({(cpf, planta): horário do evento novo mais antigo}, maior created_at lido).
+    """
+    colunas = 'cpf, planta, data_acesso, sentido, created_at'
+    if desde:
+        linhas = buscar_paginado(
+            lambda: sb.table('acessos').select(colunas)
+            .gte('data_acesso', f"{desde}T00:00:00+00:00")
+            .order('data_acesso').order('id')
+        )
+    else:
+        a_partir = (watermark - MARGEM_WATERMARK).isoformat()
+        linhas = buscar_paginado(
+            lambda: sb.table('acessos').select(colunas)
+            .gt('created_at', a_partir)
+            .order('created_at').order('id')
+        )
+
+    mais_antigo: Dict[Chave, datetime] = {}
+    maior_created_at = None
+
+    for acesso in linhas:
+        if acesso.get('created_at'):
+            created_at = _parse_ts(acesso['created_at'])
+            if maior_created_at is None or created_at > maior_created_at:
+                maior_created_at = created_at
+
+        chave = _chave(acesso)
+        if chave is None or acesso.get('sentido') not in ('E', 'S') or not acesso.get('data_acesso'):
+            continue
+        ts = _parse_ts(acesso['data_acesso'])
+        if chave not in mais_antigo or ts < mais_antigo[chave]:
+            mais_antigo[chave] = ts
+
+    logger.info(f"  {len(linhas)} acesso(s) novo(s) | {len(mais_antigo)} (cpf, planta) afetado(s)")
+    return mais_antigo, maior_created_at
+
+
+# ============================================================
+# RECONSTRUÇÃO
+# ============================================================
+
+def calcular_pontos_reconstrucao(sb: Client, cpfs: List[str],
+                                 mais_antigo: Dict[Chave, datetime]) -> Dict[Chave, datetime]:
+    """
+    Recua o início da reconstrução de cada chave até a sessão existente mais antiga
+    que o evento novo ainda pode completar ou estender (fim dentro do limite).
+    """
+    limite = timedelta(hours=DURACAO_MAXIMA_HORAS)
+    pontos = {chave: ts for chave, ts in mais_antigo.items() if chave[0] in cpfs}
+    corte = min(pontos.values()) - limite
+
+    existentes = buscar_paginado(
+        lambda: sb.table('presenca_sessoes').select('cpf, planta, inicio, fim')
+        .in_('cpf', cpfs).gte('fim', corte.isoformat())
+        .order('id')
+    )
+
+    for sessao in existentes:
+        chave = (sessao['cpf'], sessao['planta'] or '')
+        if chave not in pontos:
+            continue
+        if _parse_ts(sessao['fim']) >= pontos[chave] - limite:
+            inicio = _parse_ts(sessao['inicio'])
+            if inicio < pontos[chave]:
+                pontos[chave] = inicio
+
+    return pontos
+
+
+def carregar_eventos_chaves(sb: Client, cpfs: List[str],
+                            pontos: Dict[Chave, datetime]) -> Dict[Chave, List[Tuple[datetime, str]]]:
+    """Eventos E/S de cada chave a partir do seu ponto de reconstrução, ordenados."""
+    desde = min(pontos.values())
+    linhas = buscar_paginado(
+        lambda: sb.table('acessos').select('cpf, planta, data_acesso, sentido')
+        .in_('cpf', cpfs).gte('data_acesso', desde.isoformat())
+        .order('data_acesso').order('id')
+    )
+
+    eventos: Dict[Chave, List[Tuple[datetime, str]]] = defaultdict(list)
+    for acesso in linhas:
+        chave = _chave(acesso)
+        if chave not in pontos or acesso.get('sentido') not in ('E', 'S'):
+            continue
+        ts = _parse_ts(acesso['data_acesso'])
+        if ts >= pontos[chave]:
+            eventos[chave].append((ts, acesso['sentido']))
+
+    for lista in eventos.values():
+        lista.sort()
+    return eventos
+
+
+def gravar_sessoes(sb: Client, pontos: Dict[Chave, datetime],
+                   eventos: Dict[Chave, List[Tuple[datetime, str]]], agora: datetime) -> int:
+    """
+    Upsert das sessões regeradas e remoção das antigas de cada chave a partir do
+    ponto de reconstrução que não foram regeradas nesta execução.
+    """
+    execucao = agora.isoformat()
+    linhas = []
+
+    for (cpf, planta), lista in eventos.items():
+        for sessao in montar_sessoes(lista, agora):
+            linhas.append({
+                'cpf': cpf,
+                'planta': planta,
+                'inicio': sessao['inicio'].isoformat(),
+                'fim': sessao['fim'].isoformat(),
+                'entrada': sessao['entrada'].isoformat() if sessao['entrada'] else None,
+                'saida': sessao['saida'].isoformat() if sessao['saida'] else None,
+                'qtd_eventos': sessao['qtd_eventos'],
+                'situacao': sessao['situacao'],
+                'atualizado_em': execucao,
+            })
+
+    # Um upsert não pode tocar a mesma chave duas vezes
+    linhas = list({(l['cpf'], l['planta'], l['inicio']): l for l in linhas}.values())
+
+    for i in range(0, len(linhas), LOTE_UPSERT):
+        sb.table('presenca_sessoes').upsert(
+            linhas[i:i + LOTE_UPSERT], on_conflict='cpf,planta,inicio'
+        ).execute()
+
+    for (cpf, planta), ponto in pontos.items():
+        sb.table('presenca_sessoes').delete() \
+            .eq('cpf', cpf).eq('planta', planta) \
+            .gte('inicio', ponto.isoformat()).lt('atualizado_em', execucao) \
+            .execute()
+
+    return len(linhas)
+
+
+# ============================================================
+# MAIN
+# ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Construção incremental de sessões de presença")
+    parser.add_argument("--desde", help="Reconstrói a partir de data_acesso YYYY-MM-DD (carga inicial)")
+    args = parser.parse_args()
+
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise ValueError("VITE_SUPABASE_URL ou VITE_SUPABASE_SERVICE_ROLE_KEY não encontrados no .env")
+
+    separador("construir-sessoes-presenca.py")
+    sb: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+    watermark = ler_watermark(sb)
+    if watermark is None and not args.desde:
+        raise ValueError("Sem marca d'água gravada — rode a carga inicial com --desde YYYY-MM-DD")
+
+    logger.info(f"  Modo      : {'reconstrução desde ' + args.desde if args.desde else 'incremental'}")
+    logger.info(f"  Watermark : {watermark.isoformat() if watermark else '—'}")
+    logger.info(f"  Regras    : sessão até {DURACAO_MAXIMA_HORAS}h | junção {JUNCAO_MINUTOS}min")
+
+    agora = datetime.now(timezone.utc)
+    mais_antigo, maior_created_at = carregar_eventos_novos(sb, watermark, args.desde)
+
+    cpfs = sorted({cpf for cpf, _ in mais_antigo})
+    total_sessoes = 0
+    erros = 0
+
+    for i in range(0, len(cpfs), LOTE_IN):
+        lote = cpfs[i:i + LOTE_IN]
+        try:
+            pontos = calcular_pontos_reconstrucao(sb, lote, mais_antigo)
+            eventos = carregar_eventos_chaves(sb, lote, pontos)
+            total_sessoes += gravar_sessoes(sb, pontos, eventos, agora)
+        except Exception as e:
+            erros += 1
+            logger.error(f"  Erro no lote de CPFs {i // LOTE_IN + 1}: {e}")
+
+    logger.info(f"  {total_sessoes} sessão(ões) gravada(s) para {len(mais_antigo)} (cpf, planta)")
+
+    # Entradas abertas que nenhum evento novo completou e já passaram do limite
+    expiradas = sb.table('presenca_sessoes').update({'situacao': 'orfa_entrada', 'atualizado_em': agora.isoformat()}) \
+        .eq('situacao', 'aberta').lt('entrada', (agora - timedelta(hours=DURACAO_MAXIMA_HORAS)).isoformat()) \
+        .execute()
+    if expiradas.data:
+        logger.info(f"  {len(expiradas.data)} sessão(ões) aberta(s) expirada(s) → orfa_entrada")
+
+    if erros:
+        logger.warning(f"  {erros} lote(s) com erro — marca d'água mantida para reprocessar")
+    elif maior_created_at is not None and (watermark is None or maior_created_at > watermark):
+        gravar_watermark(sb, maior_created_at)
+        logger.info(f"  Watermark avançada para {maior_created_at.isoformat()}")
+
+    separador("CONCLUÍDO")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,23 +17,16 @@ Configurações de filtro (ajustar conforme necessidade):
   DATA_INICIO / DATA_FIM : período de análise
 """
 
-import psycopg2
 import csv
 import os
 from datetime import date
 
+import conexao_rds
+
 # ============================================================
 # CONFIGURAÇÕES
 # ============================================================
 
-DB_CONFIG = dict(
-    host="db-rds-postgres.cx4bovrfmkbp.sa-east-1.rds.amazonaws.com",
-    database="db_rds_01",
-    user="gest_contratos",
-    password="asdgRTFG98",
-    port="5432",
-)
-
 FILTRO_CD_PRESTADOR = 3729          # HELPMED
 FILTRO_NM_UNIDADE   = "HUGOL"
 FILTRO_NM_BANCO     = "producao_ses_go"   # GO = HUGOL / HECAD / CRER
@@ -74,8 +67,7 @@ def separador(titulo=""):
 # ============================================================
 
 print("Conectando ao RDS...")
-conn = psycopg2.connect(**DB_CONFIG)
-conn.set_session(readonly=True, autocommit=True)
+conn = conexao_rds.conectar()   # keepalives + statement_timeout (RDS_STATEMENT_TIMEOUT_S)
 cur = conn.cursor()
 print("Conectado.\n")
 
@@ -1,5 +1,7 @@
 -- Script para deletar os primeiros 61000 registros mais antigos da tabela acessos
 -- Execute este script no Supabase SQL Editor
+-- Com acessos particionada (migration 036), prefira o manter-particoes-acessos.py --arquivar,
+-- que exporta os meses antigos para Parquet e desanexa as partições inteiras
 
 -- ATENÇÃO: Esta operação é IRREVERSÍVEL!
 -- Certifique-se de fazer um backup antes de executar
@@ -0,0 +1,189 @@
+"""
+Diário (journal) local de jobs de coleta de produtividade.
+
+Guarda em SQLite o estado de cada job (data, codigo_mv) das coletas longas
+(retroativa e por escalas), para que uma execução interrompida possa ser
+retomada sem refazer nem perder trabalho.
+
+Estados:
+- pendente:     job planejado, ainda não executado
+- em_andamento: job sendo coletado (se o processo cair, volta para pendente)
+- concluido:    dados coletados e gravados no Supabase
+- falhou:       última tentativa falhou (com contador de tentativas)
+
+Cada instância tem um `execucao_id`; os jobs planejados ou tocados por ela
+recebem esse id, e `resumo()` conta só os da execução atual.
+
+Uso:
+    diario = DiarioColeta('produtividade-mv-escalas.journal.sqlite')
+    diario.registrar_pendentes([('2026-02-01', '1234', {'nome': ...})])
+    diario.marcar_em_andamento('2026-02-01', '1234')
+    diario.marcar_concluido('2026-02-01', '1234')
+"""
+import json
+import uuid
+import sqlite3
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+PENDENTE = 'pendente'
+EM_ANDAMENTO = 'em_andamento'
+CONCLUIDO = 'concluido'
+FALHOU = 'falhou'
+
+
+class DiarioColeta:
+    """Journal SQLite com o estado de cada job (data, codigo_mv)."""
+
+    def __init__(self, caminho: str):
+        """Abre (ou cria) o journal e devolve jobs interrompidos para pendente."""
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                data TEXT NOT NULL,
+                codigo_mv TEXT NOT NULL,
+                estado TEXT NOT NULL,
+                tentativas INTEGER NOT NULL DEFAULT 0,
+                ultimo_erro TEXT,
+                usuario TEXT,
+                atualizado_em TEXT NOT NULL,
+                execucao_id TEXT,
+                PRIMARY KEY (data, codigo_mv)
+            )
+        """)
+        # Journals criados antes da coluna execucao_id
+        colunas = {row[1] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+        if 'execucao_id' not in colunas:
+            self._conn.execute('ALTER TABLE jobs ADD COLUMN execucao_id TEXT')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_estado ON jobs (estado)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_execucao ON jobs (execucao_id)')
+        self._conn.commit()
+
+        self.execucao_id = f"{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+        recuperados = self._executar(
+            'UPDATE jobs SET estado = ?, atualizado_em = ? WHERE estado = ?',
+            (PENDENTE, self._agora(), EM_ANDAMENTO)
+        )
+        if recuperados:
+            logger.warning(f"Journal: {recuperados} jobs interrompidos voltaram para pendente")
+
+    @staticmethod
+    def _agora() -> str:
+        return datetime.now().isoformat(timespec='seconds')
+
+    def _executar(self, sql: str, params: Tuple = ()) -> int:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor.rowcount
+
+    def registrar_pendentes(self, jobs: Iterable[Tuple[str, str, Dict]]) -> int:
+        """
+        Registra jobs (data_iso, codigo_mv, usuario) como pendentes.
+        Jobs já conhecidos mantêm o estado atual; os ainda não concluídos passam
+        a contar para esta execução. Retorna quantos eram novos.
+        """
+        agora = self._agora()
+        linhas = [
+            (data, str(codigo_mv), PENDENTE, json.dumps(usuario, ensure_ascii=False), agora, self.execucao_id)
+            for data, codigo_mv, usuario in jobs
+        ]
+        with self._lock:
+            antes = self._conn.total_changes
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO jobs (data, codigo_mv, estado, usuario, atualizado_em, execucao_id) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                linhas
+            )
+            novos = self._conn.total_changes - antes
+            self._conn.executemany(
+                'UPDATE jobs SET execucao_id = ? WHERE data = ? AND codigo_mv = ? AND estado != ?',
+                [(self.execucao_id, data, codigo_mv, CONCLUIDO) for data, codigo_mv, *_ in linhas]
+            )
+            self._conn.commit()
+            return novos
+
+    def concluidos(self, data: str) -> set:
+        """Retorna o set de codigo_mv já concluídos em uma data."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT codigo_mv FROM jobs WHERE data = ? AND estado = ?',
+                (data, CONCLUIDO)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def marcar_em_andamento(self, data: str, codigo_mv: str):
+        """Marca o job como em andamento (cria a entrada se ainda não existir)."""
+        self._executar(
+            'INSERT INTO jobs (data, codigo_mv, estado, atualizado_em, execucao_id) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (data, codigo_mv) DO UPDATE SET estado = excluded.estado, '
+            'atualizado_em = excluded.atualizado_em, execucao_id = excluded.execucao_id',
+            (data, str(codigo_mv), EM_ANDAMENTO, self._agora(), self.execucao_id)
+        )
+
+    def marcar_concluido(self, data: str, codigo_mv: str):
+        """Marca o job como concluído."""
+        self._executar(
+            'UPDATE jobs SET estado = ?, ultimo_erro = NULL, atualizado_em = ?, execucao_id = ? '
+            'WHERE data = ? AND codigo_mv = ?',
+            (CONCLUIDO, self._agora(), self.execucao_id, data, str(codigo_mv))
+        )
+
+    def marcar_falha(self, data: str, codigo_mv: str, erro: str):
+        """Marca o job como falho e incrementa o contador de tentativas."""
+        self._executar(
+            'UPDATE jobs SET estado = ?, tentativas = tentativas + 1, ultimo_erro = ?, '
+            'atualizado_em = ?, execucao_id = ? WHERE data = ? AND codigo_mv = ?',
+            (FALHOU, str(erro)[:500], self._agora(), self.execucao_id, data, str(codigo_mv))
+        )
+
+    def falhas_para_retentar(self, max_tentativas: int) -> List[Dict]:
+        """Retorna os jobs falhos com menos de `max_tentativas`, em ordem de data."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT data, codigo_mv, tentativas, usuario FROM jobs '
+                'WHERE estado = ? AND tentativas < ? ORDER BY data, codigo_mv',
+                (FALHOU, max_tentativas)
+            ).fetchall()
+        return [
+            {
+                'data': data,
+                'codigo_mv': codigo_mv,
+                'tentativas': tentativas,
+                'usuario': json.loads(usuario) if usuario else None
+            }
+            for data, codigo_mv, tentativas, usuario in rows
+        ]
+
+    def resumo(self, todas_execucoes: bool = False) -> Dict[str, int]:
+        """
+        Retorna a contagem de jobs por estado da execução atual
+        (ou de todo o histórico do journal, com `todas_execucoes`).
+        """
+        with self._lock:
+            if todas_execucoes:
+                rows = self._conn.execute(
+                    'SELECT estado, COUNT(*) FROM jobs GROUP BY estado'
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    'SELECT estado, COUNT(*) FROM jobs WHERE execucao_id = ? GROUP BY estado',
+                    (self.execucao_id,)
+                ).fetchall()
+        contagem = {PENDENTE: 0, EM_ANDAMENTO: 0, CONCLUIDO: 0, FALHOU: 0}
+        contagem.update(dict(rows))
+        return contagem
+
+    def fechar(self):
+        """Fecha a conexão com o journal."""
+        with self._lock:
+            self._conn.close()
@@ -1,47 +1,192 @@
+"""
+dividir-sql.py
+==============
+Executa um arquivo .sql grande de INSERTs (ex.: importar-acessos.sql) direto no
+PostgreSQL do Supabase, sem dividir manualmente para o SQL Editor.
+
+- Lê o arquivo em streaming, linha a linha (uma instrução INSERT por linha)
+- Agrupa INSERTs consecutivos na mesma tabela/colunas em INSERTs multi-linha
+- Executa em transações de --lote registros sobre uma única conexão reaproveitada
+- Grava o progresso (<arquivo>.progresso) após cada commit; rodar de novo retoma
+  de onde parou (--do-zero ignora o progresso)
+- Mostra o andamento e a vazão (registros/s)
+
+Com --apenas-dividir mantém o fluxo antigo: gera lotes_sql/lote_NNN.sql de --lote
+registros cada, para colar no SQL Editor.
+
+Uso:
+    python dividir-sql.py                                   # importar-acessos.sql
+    python dividir-sql.py outro.sql --lote 5000 --por-insert 500
+    python dividir-sql.py --apenas-dividir
+
+Credenciais: as mesmas do executar-migration.py (DB_HOST, DB_PORT, DB_NAME,
+DB_USER, DB_PASSWORD no ambiente ou no .env).
+"""
+
 import os
+import re
+import sys
+import time
+import argparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "INSERT INTO tabela (colunas) VALUES (...);" → prefixo até VALUES e a tupla
+_INSERT = re.compile(r'^\s*(INSERT\s+INTO\s+.+?\s+VALUES)\s*(\(.*\))\s*;?\s*$', re.IGNORECASE | re.DOTALL)
+
+
+def ler_inserts(caminho: str):
+    """Gera (prefixo, tupla) de cada linha INSERT do arquivo, em streaming."""
+    with open(caminho, 'r', encoding='utf-8') as f:
+        for linha in f:
+            if not linha.strip().upper().startswith('INSERT INTO'):
+                continue
+            m = _INSERT.match(linha)
+            if m:
+                yield m.group(1), m.group(2)
+            else:
+                yield None, linha.strip()   # INSERT fora do padrão: executado como está
+
+
+def agrupar(inserts, por_insert: int):
+    """Junta INSERTs consecutivos de mesmo prefixo. Gera (sql, registros)."""
+    prefixo_atual, tuplas = None, []
+
+    def emitir():
+        return f"{prefixo_atual}\n" + ",\n".join(tuplas) + ";", len(tuplas)
+
+    for prefixo, valor in inserts:
+        if prefixo is None:
+            if tuplas:
+                yield emitir()
+                prefixo_atual, tuplas = None, []
+            yield valor, 1
+            continue
+
+        if tuplas and (prefixo != prefixo_atual or len(tuplas) >= por_insert):
+            yield emitir()
+            tuplas = []
+        prefixo_atual = prefixo
+        tuplas.append(valor)
+
+    if tuplas:
+        yield emitir()
+
+
+def ler_progresso(caminho: str) -> int:
+    try:
+        with open(caminho, encoding='utf-8') as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def gravar_progresso(caminho: str, registros: int):
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        f.write(str(registros))
+    os.replace(temporario, caminho)
+
+
+def apenas_dividir(arquivo: str, lote: int):
+    """Fluxo antigo, em streaming: arquivos de `lote` registros em lotes_sql/."""
+    os.makedirs('lotes_sql', exist_ok=True)
+    n_arquivo, escritos, saida = 0, 0, None
+
+    with open(arquivo, 'r', encoding='utf-8') as f:
+        for linha in f:
+            if not linha.strip().startswith('INSERT INTO'):
+                continue
+            if escritos % lote == 0:
+                if saida:
+                    saida.close()
+                    print(f"✅ Criado: lotes_sql/lote_{n_arquivo:03d}.sql")
+                n_arquivo += 1
+                saida = open(f'lotes_sql/lote_{n_arquivo:03d}.sql', 'w', encoding='utf-8')
+                saida.write(f"-- Lote {n_arquivo} — registros {escritos + 1} em diante\n\n")
+            saida.write(linha if linha.endswith('\n') else linha + '\n')
+            escritos += 1
+
+    if saida:
+        saida.close()
+        print(f"✅ Criado: lotes_sql/lote_{n_arquivo:03d}.sql")
+
+    print(f"\n🎉 {escritos} registros divididos em {n_arquivo} arquivos na pasta lotes_sql/")
+
+
+def executar(arquivo: str, lote: int, por_insert: int, do_zero: bool):
+    from carga_acessos import conectar_postgres
+
+    caminho_progresso = arquivo + '.progresso'
+    ja_feitos = 0 if do_zero else ler_progresso(caminho_progresso)
+    if ja_feitos:
+        print(f"↩️  Retomando: {ja_feitos} registros já importados serão pulados")
+
+    def pendentes():
+        for i, item in enumerate(ler_inserts(arquivo)):
+            if i >= ja_feitos:
+                yield item
+
+    conn = conectar_postgres()
+    conn.autocommit = False
+    print(f"✅ Conectado a {os.getenv('DB_HOST', 'parceria.daherlab.org.br')}\n")
 
-# Ler o arquivo SQL grande
-input_file = 'importar-acessos.sql'
-batch_size = 1000  # 1000 registros por arquivo
+    feitos = ja_feitos
+    no_lote = 0
+    inicio = time.monotonic()
+    inicio_lote = inicio
 
-print(f"📂 Lendo arquivo {input_file}...")
+    try:
+        with conn.cursor() as cur:
+            for sql, registros in agrupar(pendentes(), por_insert):
+                cur.execute(sql)
+                no_lote += registros
 
-with open(input_file, 'r', encoding='utf-8') as f:
-    lines = f.readlines()
+                if no_lote >= lote:
+                    conn.commit()
+                    feitos += no_lote
+                    gravar_progresso(caminho_progresso, feitos)
+                    agora = time.monotonic()
+                    print(f"✅ {feitos} registros | lote {no_lote / (agora - inicio_lote):.0f} reg/s"
+                          f" | média {(feitos - ja_feitos) / (agora - inicio):.0f} reg/s")
+                    no_lote, inicio_lote = 0, agora
 
-# Filtrar apenas linhas de INSERT
-inserts = [line for line in lines if line.strip().startswith('INSERT INTO')]
+            conn.commit()
+            feitos += no_lote
+            gravar_progresso(caminho_progresso, feitos)
 
-total_registros = len(inserts)
-num_arquivos = (total_registros + batch_size - 1) // batch_size
+    except Exception as e:
+        conn.rollback()
+        print(f"\n❌ ERRO — lote desfeito (rollback) após {feitos} registros confirmados:\n  {e}")
+        print(f"   Corrija e rode de novo para retomar a partir do registro {feitos + 1}.")
+        sys.exit(1)
+    finally:
+        conn.close()
 
-print(f"📊 Total de registros: {total_registros}")
-print(f"📦 Serão criados {num_arquivos} arquivos")
-print(f"")
+    decorrido = time.monotonic() - inicio
+    importados = feitos - ja_feitos
+    print(f"\n🎉 Importação concluída: {importados} registros em {decorrido:.1f}s"
+          f" ({importados / decorrido if decorrido else 0:.0f} reg/s) — total {feitos}")
 
-# Criar diretório para os lotes
-os.makedirs('lotes_sql', exist_ok=True)
 
-# Dividir em lotes
-for i in range(num_arquivos):
-    start_idx = i * batch_size
-    end_idx = min((i + 1) * batch_size, total_registros)
+def main():
+    parser = argparse.ArgumentParser(description="Executa um .sql grande de INSERTs em lotes, com retomada")
+    parser.add_argument("arquivo", nargs="?", default="importar-acessos.sql")
+    parser.add_argument("--lote", type=int, default=5000, help="Registros por transação/arquivo (padrão 5000)")
+    parser.add_argument("--por-insert", type=int, default=500, help="Registros por INSERT multi-linha (padrão 500)")
+    parser.add_argument("--do-zero", action="store_true", help="Ignora o progresso salvo")
+    parser.add_argument("--apenas-dividir", action="store_true", help="Só gera lotes_sql/ para o SQL Editor")
+    args = parser.parse_args()
 
-    batch_file = f'lotes_sql/lote_{i+1:03d}_de_{num_arquivos:03d}.sql'
+    print(f"📂 Arquivo: {args.arquivo}")
 
-    with open(batch_file, 'w', encoding='utf-8') as f:
-        f.write(f"-- Lote {i+1} de {num_arquivos}\n")
-        f.write(f"-- Registros {start_idx+1} a {end_idx}\n\n")
-        f.writelines(inserts[start_idx:end_idx])
-        f.write(f"\n-- ✅ Lote {i+1} concluído ({end_idx - start_idx} registros)\n")
+    if args.apenas_dividir:
+        apenas_dividir(args.arquivo, args.lote)
+    else:
+        executar(args.arquivo, args.lote, args.por_insert, args.do_zero)
 
-    print(f"✅ Criado: {batch_file} ({end_idx - start_idx} registros)")
 
-print(f"\n🎉 Divisão concluída!")
-print(f"📁 Arquivos criados na pasta: lotes_sql/")
-print(f"\n▶️  Próximos passos:")
-print(f"   1. Abra a pasta 'lotes_sql'")
-print(f"   2. Comece pelo 'lote_001_de_{num_arquivos:03d}.sql'")
-print(f"   3. Copie e execute no Supabase SQL Editor")
-print(f"   4. Repita para cada lote (ou execute os primeiros 5-10)")
-print(f"\n💡 Dica: Você não precisa importar todos os lotes se quiser apenas testar!")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Avaliação concorrente de escalas com logs em ordem.
+
+Os scripts de status (verificar-presenca-escalas.py, recalcular-status-diario.py)
+passam quase todo o tempo esperando leituras do PostgREST. Este módulo permite
+processar várias escalas ao mesmo tempo sem sobrecarregar o Supabase:
+
+- `criar_cliente_supabase()` cria um único cliente Supabase sobre um httpx.Client
+  com keep-alive e limite de conexões, compartilhado por todas as threads.
+- `executar_em_ordem()` processa os itens em um pool de threads com no máximo
+  `max_inflight` em andamento. Os logs de cada item são retidos e emitidos em
+  bloco, na ordem original dos itens, então o arquivo de log fica igual ao de
+  uma execução sequencial.
+
+Uso:
+    supabase = criar_cliente_supabase(url, chave, max_conexoes=8)
+    for escala, resultado in executar_em_ordem(escalas, processar_escala, max_inflight=8):
+        ...
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+import httpx
+from supabase import create_client, Client
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT_HTTP = 30.0        # segundos por requisição ao PostgREST
+KEEPALIVE_EXPIRY = 60.0    # segundos que uma conexão ociosa fica aberta
+
+_local = threading.local()
+
+
+def criar_cliente_supabase(url: str, chave: str, max_conexoes: int = 8) -> Client:
+    """
+    Cria um cliente Supabase cujas requisições usam um único httpx.Client
+    com keep-alive e até `max_conexoes` conexões simultâneas.
+    """
+    http = httpx.Client(
+        timeout=httpx.Timeout(TIMEOUT_HTTP),
+        limits=httpx.Limits(
+            max_connections=max_conexoes,
+            max_keepalive_connections=max_conexoes,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+    )
+
+    try:
+        from supabase import ClientOptions
+        return create_client(url, chave, options=ClientOptions(httpx_client=http))
+    except (ImportError, TypeError) as e:
+        # Versões antigas do supabase-py não aceitam httpx_client
+        logger.warning(f"supabase-py sem suporte a httpx_client ({e}) — usando cliente padrão")
+        http.close()
+        return create_client(url, chave)
+
+
+class _HandlerOrdenado(logging.Handler):
+    """
+    Substitui temporariamente os handlers do logger raiz: registros emitidos por
+    threads com buffer ativo são retidos; os demais seguem direto para os handlers originais.
+    """
+
+    def __init__(self, originais: List[logging.Handler]):
+        super().__init__()
+        self.originais = originais
+
+    def emit(self, record: logging.LogRecord):
+        buffer = getattr(_local, 'buffer', None)
+        if buffer is not None:
+            buffer.append(record)
+        else:
+            self.despachar(record)
+
+    def despachar(self, record: logging.LogRecord):
+        for handler in self.originais:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+@contextmanager
+def _logs_ordenados():
+    raiz = logging.getLogger()
+    originais = raiz.handlers[:]
+    ordenado = _HandlerOrdenado(originais)
+    raiz.handlers = [ordenado]
+    try:
+        yield ordenado
+    finally:
+        raiz.handlers = originais
+
+
+def _executar_com_buffer(funcao: Callable, item) -> Tuple[object, Optional[BaseException], List[logging.LogRecord]]:
+    """Executa `funcao(item)` retendo os logs da thread. Retorna (resultado, erro, registros)."""
+    _local.buffer = []
+    try:
+        return funcao(item), None, _local.buffer
+    except Exception as e:
+        return None, e, _local.buffer
+    finally:
+        _local.buffer = None
+
+
+def executar_em_ordem(itens: Iterable, funcao: Callable, max_inflight: int = 8) -> Iterator[Tuple[object, object]]:
+    """
+    Aplica `funcao` a cada item com até `max_inflight` execuções simultâneas e
+    devolve (item, resultado) na ordem original, emitindo os logs de cada item
+    nesse mesmo momento.
+
+    Exceções de `funcao` são propagadas ao consumidor no item correspondente.
+    Com max_inflight <= 1 a execução é sequencial, sem threads.
+    """
+    itens = list(itens)
+
+    if max_inflight <= 1:
+        for item in itens:
+            yield item, funcao(item)
+        return
+
+    # Quantos itens podem estar submetidos à frente do próximo a ser emitido;
+    # limita a memória retida quando um item lento segura a fila de logs
+    janela = max_inflight * 4
+
+    with _logs_ordenados() as handler, \
+            ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix='escala') as pool:
+        futuros = {}
+        proximo_envio = 0
+        proximo_emitir = 0
+
+        while proximo_emitir < len(itens):
+            while proximo_envio < len(itens) and proximo_envio < proximo_emitir + janela:
+                futuros[proximo_envio] = pool.submit(_executar_com_buffer, funcao, itens[proximo_envio])
+                proximo_envio += 1
+
+            item = itens[proximo_emitir]
+            resultado, erro, registros = futuros.pop(proximo_emitir).result()
+            proximo_emitir += 1
+
+            for record in registros:
+                handler.despachar(record)
+            if erro is not None:
+                raise erro
+            yield item, resultado
@@ -0,0 +1,74 @@
+"""
+Fatos de presença por (escala_id, cpf) — tabela escalas_presenca_fatos.
+
+Os jobs de status (verificar-presenca-escalas.py, recalcular-status-diario.py)
+já calculam, para cada médico de cada escala, as horas esperadas e medidas,
+a entrada/saída consideradas e o resultado. Em vez de persistir só o status
+final da escala, cada job monta um fato por médico com `montar_fato()` e
+grava todos em lote com `gravar_fatos()` (upsert pela chave escala_id + cpf).
+
+Dashboards e o cálculo de média de horas passam a ler essa tabela em vez de
+recalcular a presença a partir da tabela acessos.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TABELA = 'escalas_presenca_fatos'
+LOTE_UPSERT = 500
+
+RESULTADOS = ('presente_total', 'presente_parcial', 'ausente')
+
+
+def _iso(valor) -> Optional[str]:
+    if valor is None:
+        return None
+    return valor.isoformat() if isinstance(valor, datetime) else str(valor)
+
+
+def montar_fato(escala: dict, cpf: str, resultado: str, metodo: str, origem: str,
+                horas_esperadas: Optional[float] = None, horas_medidas: Optional[float] = None,
+                entrada=None, saida=None, qtd_acessos: Optional[int] = None) -> dict:
+    """
+    Monta a linha de fato de um médico em uma escala.
+
+    Args:
+        resultado: 'presente_total', 'presente_parcial' ou 'ausente'.
+        metodo: 'acessos' (primeiro→último acesso na janela), 'pareamento'
+            (entrada/saída mais próximas do horário) ou 'produtividade'.
+        origem: nome do job que calculou o fato.
+        entrada/saida: datetime ou string ISO dos acessos considerados.
+    """
+    return {
+        'escala_id': escala['id'],
+        'cpf': cpf,
+        'data': escala['data_inicio'][:10],
+        'horas_esperadas': round(horas_esperadas, 2) if horas_esperadas is not None else None,
+        'horas_medidas': round(horas_medidas, 2) if horas_medidas is not None else None,
+        'entrada': _iso(entrada),
+        'saida': _iso(saida),
+        'qtd_acessos': qtd_acessos,
+        'resultado': resultado,
+        'metodo': metodo,
+        'origem': origem,
+        'calculado_em': datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def gravar_fatos(supabase, fatos: Iterable[dict]) -> int:
+    """Upsert em lote dos fatos (o último de cada escala_id + cpf prevalece). Retorna quantos gravou."""
+    por_chave = {(f['escala_id'], f['cpf']): f for f in fatos}
+    linhas: List[dict] = list(por_chave.values())
+    gravados = 0
+
+    for i in range(0, len(linhas), LOTE_UPSERT):
+        lote = linhas[i:i + LOTE_UPSERT]
+        try:
+            supabase.table(TABELA).upsert(lote, on_conflict='escala_id,cpf').execute()
+            gravados += len(lote)
+        except Exception as e:
+            logger.error(f"Erro ao gravar {len(lote)} fato(s) de presença: {e}")
+
+    return gravados
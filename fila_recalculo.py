@@ -0,0 +1,132 @@
+"""
+Fila de recálculo incremental de escalas (tabela escalas_recalculo_pendente).
+
+Produtores (importadores de acessos, mv-produtividade-rds.py) registram as
+chaves que tocaram:
+    enfileirar_acessos(supabase, acessos)           → ('acesso', cpf, dia UTC, planta)
+    enfileirar_produtividade(supabase, registros)   → ('produtividade', codigo_mv, dia)
+
+O consumidor (verificar-presenca-escalas.py --incremental) lê tudo com
+ler_pendentes(), reavalia as escalas afetadas e chama confirmar() com as linhas
+lidas, removendo só as que não foram tocadas de novo nesse meio tempo
+(pelo par (id, atualizado_em) exato — migration 039).
+
+Falhas ao enfileirar são registradas no log e não interrompem a importação.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+TABELA = 'escalas_recalculo_pendente'
+PAGE_SIZE = 1000    # máximo por requisição no Supabase
+LOTE_UPSERT = 500   # chaves por upsert
+LOTE_CONFIRMAR = 5000   # linhas lidas por chamada de confirmar_escalas_recalculo
+
+ChaveAcesso = Tuple[str, str, str]          # (cpf, dia, planta)
+ChaveProdutividade = Tuple[str, str]        # (codigo_mv, dia)
+
+
+def dia_utc(data_acesso) -> Optional[str]:
+    """Dia (YYYY-MM-DD, UTC) de um data_acesso em ISO 8601 ou datetime."""
+    try:
+        if isinstance(data_acesso, str):
+            data_acesso = datetime.fromisoformat(data_acesso.replace('Z', '+00:00'))
+        if data_acesso.tzinfo is not None:
+            data_acesso = data_acesso.astimezone(timezone.utc)
+        return data_acesso.date().isoformat()
+    except Exception:
+        return None
+
+
+def chaves_acessos(acessos: Iterable[dict]) -> Set[ChaveAcesso]:
+    """Chaves (cpf, dia UTC, planta) tocadas por registros da tabela acessos."""
+    chaves = set()
+    for acesso in acessos:
+        cpf = (acesso.get('cpf') or '').strip()
+        dia = dia_utc(acesso.get('data_acesso'))
+        if cpf and dia:
+            chaves.add((cpf, dia, (acesso.get('planta') or '').strip()))
+    return chaves
+
+
+def chaves_produtividade(registros: Iterable[dict]) -> Set[ChaveProdutividade]:
+    """Chaves (codigo_mv, dia) tocadas por registros da tabela produtividade."""
+    return {
+        (str(r['codigo_mv']), str(r['data'])[:10])
+        for r in registros
+        if r.get('codigo_mv') and r.get('data')
+    }
+
+
+def _upsert(supabase, linhas: list) -> int:
+    for i in range(0, len(linhas), LOTE_UPSERT):
+        supabase.table(TABELA).upsert(
+            linhas[i:i + LOTE_UPSERT], on_conflict='origem,chave,dia,planta'
+        ).execute()
+    return len(linhas)
+
+
+def enfileirar_acessos(supabase, acessos: Iterable[dict]) -> int:
+    """Enfileira as chaves tocadas por acessos inseridos. Retorna quantas chaves."""
+    linhas = [
+        {'origem': 'acesso', 'chave': cpf, 'dia': dia, 'planta': planta}
+        for cpf, dia, planta in sorted(chaves_acessos(acessos))
+    ]
+    try:
+        return _upsert(supabase, linhas)
+    except Exception as e:
+        logger.error(f"Erro ao enfileirar recálculo de {len(linhas)} chave(s) de acesso: {e}")
+        return 0
+
+
+def enfileirar_produtividade(supabase, registros: Iterable[dict]) -> int:
+    """Enfileira as chaves tocadas por registros de produtividade gravados. Retorna quantas chaves."""
+    linhas = [
+        {'origem': 'produtividade', 'chave': codigo, 'dia': dia, 'planta': ''}
+        for codigo, dia in sorted(chaves_produtividade(registros))
+    ]
+    try:
+        return _upsert(supabase, linhas)
+    except Exception as e:
+        logger.error(f"Erro ao enfileirar recálculo de {len(linhas)} chave(s) de produtividade: {e}")
+        return 0
+
+
+def ler_pendentes(supabase) -> Tuple[Set[ChaveAcesso], Set[ChaveProdutividade], List[Dict]]:
+    """
+    Lê toda a fila. Retorna (chaves de acesso, chaves de produtividade, lidas),
+    onde lidas são os pares {id, atualizado_em} a passar para confirmar().
+    """
+    acessos: Set[ChaveAcesso] = set()
+    produtividade: Set[ChaveProdutividade] = set()
+    lidas: List[Dict] = []
+    offset = 0
+
+    while True:
+        resp = supabase.table(TABELA).select('id, origem, chave, dia, planta, atualizado_em') \
+            .order('id').range(offset, offset + PAGE_SIZE - 1).execute()
+        lote = resp.data or []
+
+        for row in lote:
+            if row['origem'] == 'acesso':
+                acessos.add((row['chave'], row['dia'], row['planta'] or ''))
+            else:
+                produtividade.add((row['chave'], row['dia']))
+            lidas.append({'id': row['id'], 'atualizado_em': row['atualizado_em']})
+
+        if len(lote) < PAGE_SIZE:
+            break
+        offset += PAGE_SIZE
+
+    return acessos, produtividade, lidas
+
+
+def confirmar(supabase, lidas: Optional[List[Dict]]):
+    """
+    Remove da fila as linhas consumidas. Uma chave reenfileirada depois da
+    leitura tem outro atualizado_em e continua na fila para a próxima execução.
+    """
+    for i in range(0, len(lidas or []), LOTE_CONFIRMAR):
+        supabase.rpc('confirmar_escalas_recalculo', {'p_lidos': lidas[i:i + LOTE_CONFIRMAR]}).execute()
@@ -0,0 +1,224 @@
+"""
+Gravação assíncrona (write-behind) de produtividade no Supabase.
+
+O coletor enfileira cada registro extraído e segue para o próximo médico;
+uma thread em segundo plano agrupa os registros em lotes e grava cada lote
+com poucas requisições:
+
+1. Um SELECT para descobrir quais (codigo_mv, data) do lote já existem
+2. Um upsert em massa (pela chave primária id) para os existentes
+3. Um insert em massa para os novos
+
+Falhas transitórias são retentadas com backoff exponencial. A fila é
+limitada: se o Supabase ficar lento, `enfileirar()` bloqueia e o navegador
+espera, em vez de acumular memória. `esvaziar()` aguarda a fila ser gravada
+e `parar()` grava tudo o que restou e encerra a thread.
+
+Uso:
+    gravador = GravadorProdutividade(supabase, ao_gravar=..., ao_falhar=...)
+    gravador.iniciar()
+    gravador.enfileirar({'codigo_mv': '1234', 'data': '2026-02-01', ...}, contexto=job)
+    gravador.parar()
+"""
+import time
+import queue
+import random
+import threading
+import logging
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_FIM = object()
+
+
+class GravadorProdutividade:
+    """Thread de gravação em lote da tabela produtividade."""
+
+    def __init__(self, supabase,
+                 tamanho_fila: int = 200,
+                 tamanho_lote: int = 25,
+                 intervalo_flush: float = 5.0,
+                 max_tentativas: int = 5,
+                 atraso_inicial: float = 2.0,
+                 atraso_maximo: float = 60.0,
+                 ao_gravar: Optional[Callable[[Dict, object], None]] = None,
+                 ao_falhar: Optional[Callable[[Dict, object, Exception], None]] = None,
+                 metricas=None):
+        """
+        Args:
+            supabase: Cliente Supabase já conectado.
+            tamanho_fila: Máximo de registros aguardando gravação.
+            tamanho_lote: Máximo de registros por lote.
+            intervalo_flush: Segundos máximos que um registro espera na fila.
+            max_tentativas: Tentativas por lote antes de desistir.
+            ao_gravar: Callback (registro, contexto) para cada registro gravado.
+            ao_falhar: Callback (registro, contexto, erro) para cada registro
+                descartado após as tentativas.
+            metricas: MetricasEtapas opcional; registra a etapa 'gravacao_lote'.
+        """
+        self.supabase = supabase
+        self.tamanho_lote = tamanho_lote
+        self.intervalo_flush = intervalo_flush
+        self.max_tentativas = max_tentativas
+        self.atraso_inicial = atraso_inicial
+        self.atraso_maximo = atraso_maximo
+        self.ao_gravar = ao_gravar
+        self.ao_falhar = ao_falhar
+        self.metricas = metricas
+
+        self._fila: queue.Queue = queue.Queue(maxsize=tamanho_fila)
+        self._thread: Optional[threading.Thread] = None
+
+        self.stats = {'gravados': 0, 'inseridos': 0, 'atualizados': 0, 'falhas': 0, 'lotes': 0}
+
+    def iniciar(self):
+        """Inicia a thread de gravação."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, name='gravador-produtividade', daemon=True)
+        self._thread.start()
+        logger.info(
+            f"Gravador write-behind iniciado (lote={self.tamanho_lote}, "
+            f"flush={self.intervalo_flush}s, fila={self._fila.maxsize})"
+        )
+
+    def enfileirar(self, registro: Dict, contexto: object = None):
+        """
+        Enfileira um registro completo (com codigo_mv e data) para gravação.
+        `contexto` é devolvido aos callbacks (ex.: a chave do job no journal).
+        """
+        if not self._thread or not self._thread.is_alive():
+            raise RuntimeError("Gravador não está em execução")
+        self._fila.put((registro, contexto))
+
+    def pendentes(self) -> int:
+        """Quantidade aproximada de registros aguardando gravação."""
+        return self._fila.qsize()
+
+    def esvaziar(self):
+        """Bloqueia até que todos os registros enfileirados tenham sido processados."""
+        if self._thread and self._thread.is_alive():
+            self._fila.join()
+
+    def parar(self, timeout: Optional[float] = None):
+        """Grava os registros restantes e encerra a thread."""
+        if not self._thread or not self._thread.is_alive():
+            return
+
+        logger.info(f"Finalizando gravador ({self.pendentes()} registros na fila)...")
+        self._fila.put(_FIM)
+        self._thread.join(timeout)
+
+        if self._thread.is_alive():
+            logger.warning("Gravador não terminou dentro do tempo limite")
+        else:
+            logger.info(
+                f"Gravador finalizado: {self.stats['gravados']} gravados "
+                f"({self.stats['inseridos']} inseridos, {self.stats['atualizados']} atualizados) "
+                f"em {self.stats['lotes']} lotes, {self.stats['falhas']} falhas"
+            )
+
+    def _loop(self):
+        """Consome a fila montando lotes por tamanho ou por tempo."""
+        encerrar = False
+
+        while not encerrar:
+            lote: List[tuple] = []
+            limite = None
+
+            while len(lote) < self.tamanho_lote:
+                espera = None if limite is None else max(limite - time.monotonic(), 0)
+                try:
+                    item = self._fila.get(timeout=espera)
+                except queue.Empty:
+                    break
+
+                if item is _FIM:
+                    self._fila.task_done()
+                    encerrar = True
+                    break
+
+                lote.append(item)
+                if limite is None:
+                    limite = time.monotonic() + self.intervalo_flush
+
+            if lote:
+                self._gravar_com_retry(lote)
+                for _ in lote:
+                    self._fila.task_done()
+
+    def _gravar_com_retry(self, lote: List[tuple]):
+        """Grava o lote retentando falhas transitórias com backoff exponencial."""
+        atraso = self.atraso_inicial
+
+        for tentativa in range(1, self.max_tentativas + 1):
+            inicio = time.perf_counter()
+            try:
+                inseridos, atualizados = self._gravar_lote([registro for registro, _ in lote])
+                if self.metricas:
+                    self.metricas.registrar('gravacao_lote', time.perf_counter() - inicio)
+            except Exception as e:
+                if self.metricas:
+                    self.metricas.registrar('gravacao_lote', time.perf_counter() - inicio)
+                if tentativa == self.max_tentativas:
+                    logger.error(f"Lote de {len(lote)} registros descartado após {tentativa} tentativas: {e}")
+                    self.stats['falhas'] += len(lote)
+                    if self.ao_falhar:
+                        for registro, contexto in lote:
+                            self._callback(self.ao_falhar, registro, contexto, e)
+                    return
+
+                espera = min(atraso + random.uniform(0, 0.3 * atraso), self.atraso_maximo)
+                logger.warning(
+                    f"Erro ao gravar lote (tentativa {tentativa}/{self.max_tentativas}): "
+                    f"{str(e)[:200]} — nova tentativa em {espera:.1f}s"
+                )
+                time.sleep(espera)
+                atraso = min(atraso * 2, self.atraso_maximo)
+                continue
+
+            self.stats['lotes'] += 1
+            self.stats['gravados'] += len(lote)
+            self.stats['inseridos'] += inseridos
+            self.stats['atualizados'] += atualizados
+            logger.debug(f"Lote gravado: {inseridos} inseridos, {atualizados} atualizados")
+
+            if self.ao_gravar:
+                for registro, contexto in lote:
+                    self._callback(self.ao_gravar, registro, contexto)
+            return
+
+    def _gravar_lote(self, lote: List[Dict]):
+        """Grava um lote com um SELECT, um upsert e um insert. Retorna (inseridos, atualizados)."""
+        # O último registro de cada (codigo_mv, data) prevalece
+        por_chave = {(str(r['codigo_mv']), r['data']): r for r in lote}
+
+        codigos = sorted({codigo for codigo, _ in por_chave})
+        datas = sorted({data for _, data in por_chave})
+
+        existentes = self.supabase.table('produtividade').select(
+            'id, codigo_mv, data'
+        ).in_('codigo_mv', codigos).in_('data', datas).execute()
+
+        ids = {
+            (str(row['codigo_mv']), row['data']): row['id']
+            for row in (existentes.data or [])
+        }
+
+        atualizar = [{**r, 'id': ids[chave]} for chave, r in por_chave.items() if chave in ids]
+        inserir = [r for chave, r in por_chave.items() if chave not in ids]
+
+        if atualizar:
+            self.supabase.table('produtividade').upsert(atualizar).execute()
+        if inserir:
+            self.supabase.table('produtividade').insert(inserir).execute()
+
+        return len(inserir), len(atualizar)
+
+    @staticmethod
+    def _callback(funcao: Callable, *args):
+        try:
+            funcao(*args)
+        except Exception as e:
+            logger.warning(f"Erro no callback do gravador: {e}")
@@ -13,6 +13,8 @@ from supabase import create_client, Client
 from dotenv import load_dotenv
 import pytz
 
+from fila_recalculo import enfileirar_acessos
+
 # Configuração para Windows suportar caracteres Unicode no console
 if sys.platform == 'win32':
     import codecs
@@ -159,6 +161,7 @@ def inserir_em_supabase(supabase: Client, dados):
 
         total = len(dados)
         inseridos = 0
+        acessos_inseridos = []
         duplicados = 0
         erros = 0
 
@@ -202,6 +205,7 @@ def inserir_em_supabase(supabase: Client, dados):
                 # Insere no Supabase
                 supabase.table('acessos').insert(acesso).execute()
                 inseridos += 1
+                acessos_inseridos.append(acesso)
 
                 # Mostra progresso a cada 100 registros ou no último
                 if i % 100 == 0 or i == total:
@@ -212,6 +216,11 @@ def inserir_em_supabase(supabase: Client, dados):
                 if erros <= 5:  # Mostra apenas os primeiros 5 erros
                     print(f"  ⚠️ Erro no registro {i}: {e}")
 
+        # Escalas afetadas pelos novos acessos serão reavaliadas pelo verificar-presenca-escalas.py --incremental
+        chaves = enfileirar_acessos(supabase, acessos_inseridos)
+        if chaves:
+            print(f"\n🔁 {chaves} chave(s) (cpf, dia, planta) enfileiradas para recálculo de escalas")
+
         print(f"\n✅ Importação concluída!")
         print(f"  📊 Resumo:")
         print(f"     - Total processado: {total}")
@@ -5,6 +5,7 @@ Script para importar os últimos N registros de acesso POR CPF do Data Warehouse
 - Inclui os campos planta e codin
 - Evita duplicações verificando se o registro já existe antes de inserir
 - Normaliza CPFs para 11 dígitos (adiciona zeros à esquerda quando necessário)
+- Com --copy, carrega tudo direto no PostgreSQL via COPY (carga_acessos.py, requer DB_PASSWORD)
 """
 
 import sys
@@ -15,6 +16,10 @@ from supabase import create_client, Client
 from dotenv import load_dotenv
 import pytz
 
+from carga_acessos import carregar_acessos
+from loja_acessos import espelhar_eventos
+from fila_recalculo import enfileirar_acessos
+
 # Configuração para Windows suportar caracteres Unicode no console
 if sys.platform == 'win32':
     import codecs
@@ -207,11 +212,14 @@ def registro_existe(supabase: Client, cpf: str, data_acesso: str, sentido: str):
         return False
 
 
-def inserir_em_supabase(supabase: Client, dados, cpf_map):
+def inserir_em_supabase(supabase: Client, dados, cpf_map, via_copy=False):
     """
     Insere os dados no Supabase, evitando duplicatas.
     Verifica cada registro individualmente antes de inserir.
     Normaliza CPFs para 11 dígitos antes de inserir.
+
+    Com via_copy=True (--copy), os registros normalizados são carregados de uma
+    vez direto no PostgreSQL (carga_acessos.py: COPY + ON CONFLICT DO NOTHING).
     """
     if not dados:
         print("⚠️ Nenhum dado para inserir.")
@@ -223,6 +231,8 @@ def inserir_em_supabase(supabase: Client, dados, cpf_map):
 
         total = len(dados)
         inseridos = 0
+        acessos_inseridos = []
+        acessos_copy = []
         duplicados = 0
         erros = 0
         cpfs_nao_encontrados = 0
@@ -272,6 +282,10 @@ def inserir_em_supabase(supabase: Client, dados, cpf_map):
                     'codin': registro.get('codin')
                 }
 
+                if via_copy:
+                    acessos_copy.append(acesso)
+                    continue
+
                 # Verifica se já existe (usando CPF normalizado)
                 if registro_existe(supabase, acesso['cpf'], acesso['data_acesso'], acesso['sentido']):
                     duplicados += 1
@@ -282,6 +296,7 @@ def inserir_em_supabase(supabase: Client, dados, cpf_map):
                 # Insere no Supabase
                 supabase.table('acessos').insert(acesso).execute()
                 inseridos += 1
+                acessos_inseridos.append(acesso)
 
                 # Mostra progresso a cada 100 registros ou no último
                 if i % 100 == 0 or i == total:
@@ -292,6 +307,22 @@ def inserir_em_supabase(supabase: Client, dados, cpf_map):
                 if erros <= 5:  # Mostra apenas os primeiros 5 erros
                     print(f"  ⚠️ Erro no registro {i}: {e}")
 
+        if via_copy and acessos_copy:
+            print(f"\n🚚 Carregando {len(acessos_copy)} registros via COPY...")
+            acessos_inseridos, duplicados_copy = carregar_acessos(acessos_copy)
+            inseridos += len(acessos_inseridos)
+            duplicados += duplicados_copy
+
+        # Escalas afetadas pelos novos acessos serão reavaliadas pelo verificar-presenca-escalas.py --incremental
+        chaves = enfileirar_acessos(supabase, acessos_inseridos)
+        if chaves:
+            print(f"\n🔁 {chaves} chave(s) (cpf, dia, planta) enfileiradas para recálculo de escalas")
+
+        # Cópia local em Parquet (loja_acessos.py), só com ACESSOS_LOJA_DIR definido
+        na_loja = espelhar_eventos(acessos_inseridos)
+        if na_loja:
+            print(f"🗄️  {na_loja} acesso(s) gravados na loja local")
+
         print(f"\n✅ Importação concluída!")
         print(f"  📊 Resumo:")
         print(f"     - Total processado: {total}")
@@ -331,18 +362,19 @@ def main():
 
         # Define o limite de registros por CPF
         limite_por_cpf = 125
-        if len(sys.argv) > 1:
+        argumentos = [a for a in sys.argv[1:] if a != '--copy']
+        if argumentos:
             try:
-                limite_por_cpf = int(sys.argv[1])
+                limite_por_cpf = int(argumentos[0])
                 print(f"\n⚙️ Limite por CPF definido via argumento: {limite_por_cpf}")
             except ValueError:
-                print(f"⚠️ Argumento '{sys.argv[1]}' inválido. Usando o padrão de 125 registros por CPF.")
+                print(f"⚠️ Argumento '{argumentos[0]}' inválido. Usando o padrão de 125 registros por CPF.")
 
         print(f"\n📥 Extraindo os últimos {limite_por_cpf} registros para cada CPF do Data Warehouse...")
         dados_extraidos = extrair_acessos(conn, cpf_map, limite_por_cpf)
 
         if dados_extraidos:
-            inserir_em_supabase(supabase, dados_extraidos, cpf_map)
+            inserir_em_supabase(supabase, dados_extraidos, cpf_map, via_copy='--copy' in sys.argv)
         else:
             print(f"\nℹ️ Nenhum acesso encontrado para os CPFs cadastrados.")
 
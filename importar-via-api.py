@@ -1,8 +1,34 @@
+"""
+Importa o Acessos.csv para a tabela acessos via API REST do Supabase.
+
+- Lê o CSV em streaming (não carrega o arquivo inteiro em memória)
+- Reaproveita conexões keep-alive (uma requests.Session por thread)
+- Mantém até --paralelo lotes em voo ao mesmo tempo
+- Tamanho do lote se adapta ao payload: mira --alvo-kb de JSON por requisição
+- Lote rejeitado por erro de dados (400/409/422) é dividido ao meio até isolar
+  só as linhas ruins, que vão para <arquivo>_erros.csv; erros transitórios
+  (429/5xx/rede) são repetidos com backoff; os demais 4xx (chave inválida,
+  tabela inexistente, RLS) abortam a importação
+- Duplicatas (cpf, data_acesso, sentido) são ignoradas pelo índice único da
+  migration 035, o que também torna as repetições seguras
+
+Uso:
+    python importar-via-api.py                       # Acessos.csv
+    python importar-via-api.py outro.csv --paralelo 8 --alvo-kb 512
+"""
+
 import csv
-import requests
-import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
+
 import pytz
+import requests
+from requests.adapters import HTTPAdapter
 
 # Configurações do Supabase (do arquivo .env)
 SUPABASE_URL = "https://qszqzdnlhxpglllyqtht.supabase.co"
@@ -13,92 +39,233 @@ headers = {
     "apikey": SUPABASE_KEY,
     "Authorization": f"Bearer {SUPABASE_KEY}",
     "Content-Type": "application/json",
-    "Prefer": "return=minimal"
+    "Prefer": "return=minimal,resolution=ignore-duplicates"
 }
 
-# URL da API
-api_url = f"{SUPABASE_URL}/rest/v1/acessos"
+# URL da API (duplicatas pelo índice único de acessos são ignoradas)
+api_url = f"{SUPABASE_URL}/rest/v1/acessos?on_conflict=cpf,data_acesso,sentido"
 
-print("🚀 Iniciando importação via Supabase API...")
-print(f"📂 Lendo arquivo Acessos.csv...\n")
-
-# Contadores
-total = 0
-sucesso = 0
-erros = 0
-batch = []
-batch_size = 100
+LOTE_MINIMO = 20          # registros por lote
+LOTE_MAXIMO = 2000
+TENTATIVAS = 4            # para 429/5xx/falhas de rede
+TIMEOUT = (10, 120)       # (conexão, leitura) em segundos
+STATUS_DADOS = (400, 409, 422)   # rejeições causadas pelas linhas: vale dividir o lote
+# Códigos de erro (Postgres/PostgREST) que, mesmo com esses status, vêm do
+# esquema ou da configuração e não das linhas: abortam em vez de dividir
+CODIGOS_FATAIS = (
+    '42P10',   # on_conflict sem índice único (migration 035 não aplicada)
+    '42P01',   # tabela inexistente
+    '42703',   # coluna inexistente
+    '42501',   # sem permissão
+)
+PREFIXO_FATAL = 'PGRST'      # erros do próprio PostgREST (cache de esquema, parâmetros)
+CODIGOS_PGRST_DADOS = ('PGRST102',)   # corpo inválido: problema das linhas
 
 # Timezone do Brasil (Brasília)
 brazil_tz = pytz.timezone('America/Sao_Paulo')
 
-# Ler e importar CSV
-with open('Acessos.csv', 'r', encoding='utf-8') as csvfile:
-    reader = csv.DictReader(csvfile)
+_local = threading.local()
+
+
+def sessao() -> requests.Session:
+    """Session keep-alive da thread atual."""
+    if not hasattr(_local, "sessao"):
+        s = requests.Session()
+        s.headers.update(headers)
+        s.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        _local.sessao = s
+    return _local.sessao
+
+
+def converter_linha(row: dict) -> dict:
+    """Linha do CSV → registro da tabela acessos (data DD/MM/YYYY HH:MM:SS em horário de Brasília)."""
+    data_parts = row['data_acesso'].split(' ')
+    date_parts = data_parts[0].split('/')
+    time_part = data_parts[1] if len(data_parts) > 1 else '00:00:00'
 
-    for row in reader:
+    dt_naive = datetime.strptime(
+        f"{date_parts[2]}-{date_parts[1]}-{date_parts[0]} {time_part}",
+        "%Y-%m-%d %H:%M:%S"
+    )
+
+    return {
+        "tipo": row['tipo'],
+        "matricula": row['matricula'],
+        "nome": row['nome'],
+        "cpf": row['cpf'],
+        "data_acesso": brazil_tz.localize(dt_naive).isoformat(),
+        "sentido": row['sentido']
+    }
+
+
+def gerar_lotes(arquivo: str, alvo_bytes: int, erros_linha: list):
+    """
+    Lê o CSV em streaming e agrupa em lotes de ~alvo_bytes de JSON.
+    O tamanho (em registros) é recalculado pela média de bytes por registro.
+    Linhas que não convertem vão para `erros_linha` como (linha, registro, motivo).
+    """
+    lote, bytes_lote = [], 0
+    media_bytes = 200.0
+    tamanho = max(LOTE_MINIMO, min(LOTE_MAXIMO, int(alvo_bytes / media_bytes)))
+
+    with open(arquivo, 'r', encoding='utf-8') as csvfile:
+        for n, row in enumerate(csv.DictReader(csvfile), 2):
+            try:
+                registro = converter_linha(row)
+            except Exception as e:
+                erros_linha.append((n, row, f"linha inválida: {e}"))
+                continue
+
+            lote.append(registro)
+            bytes_lote += len(json.dumps(registro, ensure_ascii=False)) + 1
+
+            if len(lote) >= tamanho or bytes_lote >= alvo_bytes:
+                yield lote
+                media_bytes = 0.8 * media_bytes + 0.2 * (bytes_lote / len(lote))
+                tamanho = max(LOTE_MINIMO, min(LOTE_MAXIMO, int(alvo_bytes / media_bytes)))
+                lote, bytes_lote = [], 0
+
+    if lote:
+        yield lote
+
+
+def _post(lote: list) -> requests.Response:
+    """POST com repetição e backoff em erros transitórios (429, 5xx, rede)."""
+    for tentativa in range(1, TENTATIVAS + 1):
         try:
-            # Converter data DD/MM/YYYY HH:MM:SS -> datetime com timezone do Brasil
-            data_parts = row['data_acesso'].split(' ')
-            date_parts = data_parts[0].split('/')
-            time_part = data_parts[1] if len(data_parts) > 1 else '00:00:00'
-
-            # Criar datetime naive
-            dt_naive = datetime.strptime(
-                f"{date_parts[2]}-{date_parts[1]}-{date_parts[0]} {time_part}",
-                "%Y-%m-%d %H:%M:%S"
-            )
-
-            # Localizar no timezone do Brasil e converter para ISO format
-            dt_brazil = brazil_tz.localize(dt_naive)
-            data_formatada = dt_brazil.isoformat()
-
-            # Criar registro
-            registro = {
-                "tipo": row['tipo'],
-                "matricula": row['matricula'],
-                "nome": row['nome'],
-                "cpf": row['cpf'],
-                "data_acesso": data_formatada,
-                "sentido": row['sentido']
-            }
-
-            batch.append(registro)
-            total += 1
-
-            # Enviar batch quando atingir o tamanho
-            if len(batch) >= batch_size:
-                response = requests.post(api_url, json=batch, headers=headers)
-
-                if response.status_code in [200, 201]:
-                    sucesso += len(batch)
-                    print(f"✅ Importados {sucesso}/{total} registros...")
-                else:
-                    erros += len(batch)
-                    print(f"❌ Erro no lote: {response.status_code} - {response.text[:100]}")
-
-                batch = []
-
-        except Exception as e:
-            erros += 1
-            print(f"❌ Erro ao processar linha {total}: {e}")
-            continue
-
-    # Enviar registros restantes
-    if batch:
-        response = requests.post(api_url, json=batch, headers=headers)
-
-        if response.status_code in [200, 201]:
-            sucesso += len(batch)
-            print(f"✅ Importados {sucesso}/{total} registros...")
-        else:
-            erros += len(batch)
-            print(f"❌ Erro no último lote: {response.status_code}")
-
-print(f"\n{'='*50}")
-print(f"🎉 Importação concluída!")
-print(f"{'='*50}")
-print(f"📊 Total processado: {total}")
-print(f"✅ Sucesso: {sucesso}")
-print(f"❌ Erros: {erros}")
-print(f"\n▶️  Acesse o dashboard para ver os dados!")
+            response = sessao().post(api_url, data=json.dumps(lote, ensure_ascii=False).encode('utf-8'),
+                                     timeout=TIMEOUT)
+            if response.status_code != 429 and response.status_code < 500:
+                return response
+            motivo = f"HTTP {response.status_code}"
+        except requests.RequestException as e:
+            response, motivo = None, str(e)
+
+        if tentativa == TENTATIVAS:
+            if response is not None:
+                return response
+            raise requests.RequestException(motivo)
+        time.sleep(min(30, 2 ** tentativa))
+
+
+def _erro_fatal(response: requests.Response) -> bool:
+    """A rejeição é de autenticação, esquema ou configuração (vale para qualquer lote)?"""
+    if response.status_code == 429 or not 400 <= response.status_code < 500:
+        return False
+    if response.status_code not in STATUS_DADOS:
+        return True
+    try:
+        codigo = str(response.json().get('code') or '')
+    except (ValueError, AttributeError):
+        return False
+    return codigo in CODIGOS_FATAIS or (
+        codigo.startswith(PREFIXO_FATAL) and codigo not in CODIGOS_PGRST_DADOS
+    )
+
+
+def enviar_lote(lote: list) -> tuple:
+    """
+    Envia um lote; se a API rejeitar os dados (STATUS_DADOS), divide ao meio e
+    reenvia cada metade até isolar os registros ruins.
+    Retorna (enviados, [(registro, motivo), ...]).
+    Outros 4xx (401/403/404...) e os códigos de esquema/configuração
+    (CODIGOS_FATAIS, PGRST*) valem para qualquer lote: levanta RuntimeError
+    em vez de dividir.
+    """
+    try:
+        response = _post(lote)
+    except requests.RequestException as e:
+        return 0, [(r, f"falha de rede: {e}") for r in lote]
+
+    if response.status_code in (200, 201):
+        return len(lote), []
+
+    motivo = f"HTTP {response.status_code}: {response.text[:200]}"
+    if _erro_fatal(response):
+        raise RuntimeError(f"API recusou a requisição ({motivo}) — verifique a chave, a URL e as permissões")
+    if response.status_code >= 500 or response.status_code == 429 or len(lote) == 1:
+        return 0, [(r, motivo) for r in lote]
+
+    meio = len(lote) // 2
+    ok_a, ruins_a = enviar_lote(lote[:meio])
+    ok_b, ruins_b = enviar_lote(lote[meio:])
+    return ok_a + ok_b, ruins_a + ruins_b
+
+
+def salvar_erros(arquivo: str, erros_linha: list, rejeitados: list) -> str:
+    caminho = arquivo.rsplit('.', 1)[0] + '_erros.csv'
+    campos = ["linha", "tipo", "matricula", "nome", "cpf", "data_acesso", "sentido", "motivo"]
+    with open(caminho, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=campos, extrasaction='ignore')
+        writer.writeheader()
+        for n, row, motivo in erros_linha:
+            writer.writerow({**row, "linha": n, "motivo": motivo})
+        for registro, motivo in rejeitados:
+            writer.writerow({**registro, "linha": "", "motivo": motivo})
+    return caminho
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa um CSV de acessos via API do Supabase")
+    parser.add_argument("arquivo", nargs="?", default="Acessos.csv")
+    parser.add_argument("--paralelo", type=int, default=4, help="Lotes em voo ao mesmo tempo (padrão 4)")
+    parser.add_argument("--alvo-kb", type=int, default=256, help="Tamanho alvo do JSON por lote (padrão 256 KB)")
+    args = parser.parse_args()
+
+    print("🚀 Iniciando importação via Supabase API...")
+    print(f"📂 Lendo arquivo {args.arquivo} ({args.paralelo} lote(s) em paralelo, ~{args.alvo_kb} KB por lote)\n")
+
+    total = 0
+    sucesso = 0
+    erros_linha = []
+    rejeitados = []
+    inicio = time.monotonic()
+
+    def registrar(futuro):
+        nonlocal sucesso
+        enviados, ruins = futuro.result()
+        sucesso += enviados
+        rejeitados.extend(ruins)
+        if ruins:
+            print(f"❌ {len(ruins)} registro(s) rejeitado(s): {ruins[0][1][:100]}")
+
+    try:
+        with ThreadPoolExecutor(max_workers=args.paralelo) as pool:
+            em_voo = set()
+            for lote in gerar_lotes(args.arquivo, args.alvo_kb * 1024, erros_linha):
+                total += len(lote)
+                em_voo.add(pool.submit(enviar_lote, lote))
+
+                if len(em_voo) >= args.paralelo:
+                    prontos, em_voo = wait(em_voo, return_when=FIRST_COMPLETED)
+                    for futuro in prontos:
+                        registrar(futuro)
+                    decorrido = time.monotonic() - inicio
+                    print(f"✅ Importados {sucesso}/{total} registros... ({sucesso / decorrido:.0f} reg/s)")
+
+            for futuro in wait(em_voo).done:
+                registrar(futuro)
+    except RuntimeError as e:
+        print(f"\n🛑 Importação abortada: {e}")
+        print(f"✅ Enviados antes da falha: {sucesso}")
+        if erros_linha or rejeitados:
+            print(f"📝 Linhas com erro salvas em {salvar_erros(args.arquivo, erros_linha, rejeitados)}")
+        sys.exit(1)
+
+    decorrido = time.monotonic() - inicio
+    erros = len(erros_linha) + len(rejeitados)
+
+    print(f"\n{'='*50}")
+    print(f"🎉 Importação concluída!")
+    print(f"{'='*50}")
+    print(f"📊 Total processado: {total + len(erros_linha)}")
+    print(f"✅ Sucesso: {sucesso}")
+    print(f"❌ Erros: {erros}")
+    print(f"⏱️  {decorrido:.1f}s ({sucesso / decorrido if decorrido else 0:.0f} reg/s)")
+    if erros:
+        print(f"📝 Linhas com erro salvas em {salvar_erros(args.arquivo, erros_linha, rejeitados)}")
+    print(f"\n▶️  Acesse o dashboard para ver os dados!")
+
+
+if __name__ == "__main__":
+    main()
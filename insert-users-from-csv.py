@@ -1,112 +1,129 @@
+import io
 import csv
+import sys
 import uuid
 import json
+import argparse
 from datetime import datetime
 
-# Ler o arquivo CSV e gerar SQL INSERT statements
-def generate_insert_statements(csv_file_path, output_sql_file):
-    """
-    Gera SQL INSERT statements para inserir usuários do CSV na tabela usuarios
-    sem criar usuários de autenticação.
-    """
-
-    insert_statements = []
+COLUNAS_USUARIOS = ('id', 'email', 'nome', 'cpf', 'tipo', 'contrato_id', 'codigomv', 'especialidade',
+                    'created_at', 'updated_at')
+COLUNAS_VINCULO = ('id', 'usuario_id', 'contrato_id', 'cpf', 'created_at')
 
-    # Header do arquivo SQL
-    sql_header = """-- Script para inserir usuários do arquivo new_users.csv
--- Execute este script no Supabase SQL Editor
--- ATENÇÃO: Este script insere registros na tabela usuarios SEM criar usuários de autenticação
-
--- Desabilitar temporariamente os triggers e validações se necessário
-BEGIN;
+_ESCAPES_COPY = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
 
-"""
 
-    insert_statements.append(sql_header)
-
-    # Ler o CSV
+def ler_usuarios(csv_file_path):
+    """
+    Lê o CSV em streaming e gera (usuario, vinculo) para cada linha; vinculo é o
+    registro de usuario_contrato, ou None quando a linha não tem contrato_id.
+    """
     with open(csv_file_path, 'r', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
-
-        for row in reader:
-            # Gerar um UUID para o usuário
+        for row in csv.DictReader(csvfile):
             user_id = str(uuid.uuid4())
-
-            # Extrair dados do CSV
-            nome = row['nome'].strip()
             cpf = row['cpf'].strip()
-            tipo = row['tipo'].strip()
-            contrato_id = row['contrato_id'].strip() if row['contrato_id'].strip() else None
-            codigomv = row['codigomv'].strip() if row['codigomv'].strip() else None
-            especialidade_raw = row['especialidade'].strip() if row['especialidade'].strip() else None
+            contrato_id = row['contrato_id'].strip() or None
+            especialidade_raw = row['especialidade'].strip()
 
-            # Processar especialidade (converter de JSON string para array PostgreSQL)
+            # Processar especialidade (JSON string → lista; inválida vira NULL)
+            especialidade = None
             if especialidade_raw:
                 try:
-                    # Parse JSON array
-                    especialidade_list = json.loads(especialidade_raw)
-                    # Converter para formato PostgreSQL array
-                    especialidade_pg = "ARRAY[" + ", ".join([f"'{esp}'" for esp in especialidade_list]) + "]"
-                except json.JSONDecodeError:
-                    especialidade_pg = "NULL"
-            else:
-                especialidade_pg = "NULL"
-
-            # Gerar email fictício baseado no CPF (para cumprir requisito de campo não-nulo)
-            email = f"{cpf}@terceiro.agir.com.br"
-
-            # Timestamps
+                    especialidade = [str(esp) for esp in json.loads(especialidade_raw)]
+                except (json.JSONDecodeError, TypeError):
+                    especialidade = None
+
             now = datetime.now().isoformat()
 
-            # Gerar INSERT statement
-            if contrato_id:
-                insert_sql = f"""INSERT INTO usuarios (id, email, nome, cpf, tipo, contrato_id, codigomv, especialidade, created_at, updated_at)
-VALUES (
-    '{user_id}',
-    '{email}',
-    '{nome}',
-    '{cpf}',
-    '{tipo}',
-    '{contrato_id}',
-    '{codigomv}',
-    {especialidade_pg},
-    '{now}',
-    '{now}'
-);
-"""
-            else:
-                insert_sql = f"""INSERT INTO usuarios (id, email, nome, cpf, tipo, contrato_id, codigomv, especialidade, created_at, updated_at)
-VALUES (
-    '{user_id}',
-    '{email}',
-    '{nome}',
-    '{cpf}',
-    '{tipo}',
-    NULL,
-    '{codigomv}',
-    {especialidade_pg},
-    '{now}',
-    '{now}'
-);
-"""
-
-            insert_statements.append(insert_sql)
-
-            # Se houver contrato_id, criar vínculo na tabela usuario_contrato
+            usuario = {
+                'id': user_id,
+                # Email fictício baseado no CPF (para cumprir requisito de campo não-nulo)
+                'email': f"{cpf}@terceiro.agir.com.br",
+                'nome': row['nome'].strip(),
+                'cpf': cpf,
+                'tipo': row['tipo'].strip(),
+                'contrato_id': contrato_id,
+                'codigomv': row['codigomv'].strip() or None,
+                'especialidade': especialidade,
+                'created_at': now,
+                'updated_at': now,
+            }
+            vinculo = None
             if contrato_id:
-                vinculo_sql = f"""INSERT INTO usuario_contrato (id, usuario_id, contrato_id, cpf, created_at)
-VALUES (
-    '{str(uuid.uuid4())}',
-    '{user_id}',
-    '{contrato_id}',
-    '{cpf}',
-    '{now}'
-);
-"""
-                insert_statements.append(vinculo_sql)
-
-    # Footer do arquivo SQL
-    sql_footer = """
+                vinculo = {'id': str(uuid.uuid4()), 'usuario_id': user_id, 'contrato_id': contrato_id,
+                           'cpf': cpf, 'created_at': now}
+
+            yield usuario, vinculo
+
+
+def _em_blocos(itens, tamanho):
+    bloco = []
+    for item in itens:
+        bloco.append(item)
+        if len(bloco) >= tamanho:
+            yield bloco
+            bloco = []
+    if bloco:
+        yield bloco
+
+
+def sql_literal(valor) -> str:
+    """Literal SQL com aspas escapadas; listas viram ARRAY[...]::text[]."""
+    if valor is None:
+        return "NULL"
+    if isinstance(valor, list):
+        return "ARRAY[" + ", ".join(sql_literal(v) for v in valor) + "]::text[]"
+    return "'" + str(valor).replace("'", "''") + "'"
+
+
+def pg_array(valores: list) -> str:
+    """Lista → literal de array do PostgreSQL ({"a","b"}), com aspas e barras escapadas."""
+    return "{" + ",".join('"' + v.replace('\\', '\\\\').replace('"', '\\"') + '"' for v in valores) + "}"
+
+
+def copy_campo(valor) -> str:
+    """Valor no formato texto do COPY (\\N para NULL, arrays como {...})."""
+    if valor is None:
+        return '\\N'
+    if isinstance(valor, list):
+        valor = pg_array(valor)
+    return str(valor).translate(_ESCAPES_COPY)
+
+
+def _insert_multi(tabela, colunas, registros) -> str:
+    valores = ",\n".join(
+        "    (" + ", ".join(sql_literal(r[c]) for c in colunas) + ")" for r in registros
+    )
+    return f"INSERT INTO {tabela} ({', '.join(colunas)})\nVALUES\n{valores};\n"
+
+
+# Ler o arquivo CSV e gerar SQL INSERT statements
+def generate_insert_statements(csv_file_path, output_sql_file, chunk=500):
+    """
+    Gera SQL para inserir usuários do CSV na tabela usuarios sem criar usuários
+    de autenticação. Escreve em streaming um INSERT multi-linha por bloco de
+    `chunk` usuários (e outro para os vínculos em usuario_contrato do bloco).
+    """
+    total = vinculos = 0
+
+    with open(output_sql_file, 'w', encoding='utf-8') as f:
+        f.write("""-- Script para inserir usuários do arquivo new_users.csv
+-- Execute este script no Supabase SQL Editor
+-- ATENÇÃO: Este script insere registros na tabela usuarios SEM criar usuários de autenticação
+
+BEGIN;
+
+""")
+        for bloco in _em_blocos(ler_usuarios(csv_file_path), chunk):
+            usuarios = [u for u, _ in bloco]
+            vinculos_bloco = [v for _, v in bloco if v]
+            f.write(_insert_multi('usuarios', COLUNAS_USUARIOS, usuarios) + "\n")
+            if vinculos_bloco:
+                f.write(_insert_multi('usuario_contrato', COLUNAS_VINCULO, vinculos_bloco) + "\n")
+            total += len(usuarios)
+            vinculos += len(vinculos_bloco)
+
+        f.write("""
 COMMIT;
 
 -- Verificar os usuários inseridos
@@ -114,26 +131,87 @@ SELECT id, email, nome, cpf, tipo, codigomv, especialidade
 FROM usuarios
 WHERE email LIKE '%@terceiro.agir.com.br'
 ORDER BY created_at DESC;
-"""
-
-    insert_statements.append(sql_footer)
-
-    # Escrever no arquivo SQL
-    with open(output_sql_file, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(insert_statements))
+""")
 
     print(f"[OK] SQL gerado com sucesso!")
     print(f"[OK] Arquivo de saida: {output_sql_file}")
-    print(f"[OK] Total de usuarios processados: {len(insert_statements) - 2}")  # -2 para remover header e footer
+    print(f"[OK] Total de usuarios processados: {total} ({vinculos} vinculos com contrato)")
+
+
+def _escrever_tsv(saida_usuarios, saida_vinculos, csv_file_path):
+    total = vinculos = 0
+    for usuario, vinculo in ler_usuarios(csv_file_path):
+        saida_usuarios.write('\t'.join(copy_campo(usuario[c]) for c in COLUNAS_USUARIOS) + '\n')
+        total += 1
+        if vinculo:
+            saida_vinculos.write('\t'.join(copy_campo(vinculo[c]) for c in COLUNAS_VINCULO) + '\n')
+            vinculos += 1
+    return total, vinculos
+
+
+def generate_copy_tsv(csv_file_path, output_prefix):
+    """
+    Gera <prefixo>_usuarios.tsv e <prefixo>_usuario_contrato.tsv no formato texto
+    do COPY, para carga com \\copy no psql.
+    """
+    arq_usuarios = f"{output_prefix}_usuarios.tsv"
+    arq_vinculos = f"{output_prefix}_usuario_contrato.tsv"
+
+    with open(arq_usuarios, 'w', encoding='utf-8') as fu, open(arq_vinculos, 'w', encoding='utf-8') as fv:
+        total, vinculos = _escrever_tsv(fu, fv, csv_file_path)
+
+    print(f"[OK] TSV gerado: {arq_usuarios} ({total} usuarios) e {arq_vinculos} ({vinculos} vinculos)")
+    print(f"[OK] Carregar no psql (nesta ordem):")
+    print(f"     \\copy usuarios ({', '.join(COLUNAS_USUARIOS)}) FROM '{arq_usuarios}'")
+    print(f"     \\copy usuario_contrato ({', '.join(COLUNAS_VINCULO)}) FROM '{arq_vinculos}'")
+
+
+def load_direct(csv_file_path):
+    """Carrega direto no PostgreSQL do Supabase via COPY, em uma transação (credenciais DB_*)."""
+    from dotenv import load_dotenv
+    from carga_acessos import conectar_postgres
+
+    load_dotenv()
+
+    usuarios_buf, vinculos_buf = io.StringIO(), io.StringIO()
+    total, vinculos = _escrever_tsv(usuarios_buf, vinculos_buf, csv_file_path)
+    usuarios_buf.seek(0)
+    vinculos_buf.seek(0)
+
+    conn = conectar_postgres()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.copy_expert(f"COPY usuarios ({', '.join(COLUNAS_USUARIOS)}) FROM STDIN", usuarios_buf)
+                cur.copy_expert(f"COPY usuario_contrato ({', '.join(COLUNAS_VINCULO)}) FROM STDIN", vinculos_buf)
+    finally:
+        conn.close()
+
+    print(f"[OK] Carga direta concluida: {total} usuarios e {vinculos} vinculos")
+
 
 if __name__ == "__main__":
-    csv_file = "new_users.csv"
-    output_file = "insert-users-from-csv.sql"
+    parser = argparse.ArgumentParser(description="Gera a carga de usuarios (terceiros) a partir de um CSV")
+    parser.add_argument("csv_file", nargs="?", default="new_users.csv")
+    parser.add_argument("--formato", choices=["insert", "copy"], default="insert",
+                        help="insert: SQL com INSERTs multi-linha | copy: arquivos TSV para \\copy")
+    parser.add_argument("--saida", help="Arquivo .sql (insert) ou prefixo dos .tsv (copy)")
+    parser.add_argument("--chunk", type=int, default=500, help="Usuarios por INSERT (padrao 500)")
+    parser.add_argument("--carregar", action="store_true",
+                        help="Carrega direto no banco via COPY (requer DB_PASSWORD)")
+    args = parser.parse_args()
 
     try:
-        generate_insert_statements(csv_file, output_file)
+        if args.carregar:
+            load_direct(args.csv_file)
+        elif args.formato == "copy":
+            generate_copy_tsv(args.csv_file, args.saida or "insert-users-from-csv")
+        else:
+            generate_insert_statements(args.csv_file, args.saida or "insert-users-from-csv.sql", args.chunk)
     except FileNotFoundError:
-        print(f"[ERRO] Arquivo '{csv_file}' nao encontrado!")
+        print(f"[ERRO] Arquivo '{args.csv_file}' nao encontrado!")
         print(f"       Certifique-se de que o arquivo esta no mesmo diretorio do script.")
+        sys.exit(1)
     except Exception as e:
         print(f"[ERRO] Erro ao processar arquivo: {str(e)}")
+        sys.exit(1)
@@ -0,0 +1,78 @@
+"""
+Janelas de turno vetorizadas (NumPy) para lotes de escalas.
+
+Versão em lote dos helpers de horário de regras_presenca.py, com a mesma regra:
+o turno é noturno quando horario_saida <= horario_entrada (entrada = saída é um
+plantão de 24h). Em vez de fatiar strings a cada escala, `calcular_janelas()`
+converte milhares de escalas de uma vez em arrays datetime64 (UTC) de entrada,
+saída e janela de busca, mais a duração e o indicador de turno noturno.
+
+    janelas = calcular_janelas(escalas, janela_horas=2.5)
+    inicio, fim = epoch_segundos(janelas.inicio_busca), epoch_segundos(janelas.fim_busca)
+"""
+import re
+from typing import NamedTuple, Sequence
+
+import numpy as np
+
+from regras_presenca import JANELA_BUSCA_HORAS, BRT_TO_UTC
+
+_BRT_TO_UTC = np.timedelta64(int(BRT_TO_UTC.total_seconds()), 's')
+_UM_DIA = np.timedelta64(1, 'D')
+_HHMM = re.compile(r'\d{2}:\d{2}(:\d{2})?')
+
+
+class JanelasTurno(NamedTuple):
+    """Arrays alinhados com a lista de escalas; horários em datetime64[s] UTC."""
+    entrada: np.ndarray
+    saida: np.ndarray
+    inicio_busca: np.ndarray
+    fim_busca: np.ndarray
+    overnight: np.ndarray       # bool
+    duracao_horas: np.ndarray   # float64
+
+
+def minutos_do_dia(horarios: Sequence[str]) -> np.ndarray:
+    """
+    Converte 'HH:MM' ou 'HH:MM:SS' em minutos desde a meia-noite (int64), em lote.
+    Levanta ValueError para qualquer horário fora desse formato ou fora de 00:00–23:59.
+    """
+    for horario in horarios:
+        if not isinstance(horario, str) or not _HHMM.fullmatch(horario):
+            raise ValueError(f"Horário inválido (esperado HH:MM ou HH:MM:SS): {horario!r}")
+
+    # Os 5 primeiros caracteres como code points: 'H','H',':','M','M'
+    digitos = np.array(horarios, dtype='<U5').view(np.uint32).reshape(-1, 5).astype(np.int64) - ord('0')
+    horas = digitos[:, 0] * 10 + digitos[:, 1]
+    minutos = digitos[:, 3] * 10 + digitos[:, 4]
+
+    invalidos = (horas > 23) | (minutos > 59)
+    if invalidos.any():
+        raise ValueError(f"Horário inválido (fora de 00:00–23:59): {horarios[int(np.argmax(invalidos))]!r}")
+    return horas * 60 + minutos
+
+
+def calcular_janelas(escalas: Sequence[dict], janela_horas: float = JANELA_BUSCA_HORAS) -> JanelasTurno:
+    """
+    Entrada, saída e janela de busca (±`janela_horas`) de cada escala, em UTC.
+    Os horários das escalas estão em BRT; plantões noturnos saem no dia seguinte.
+    """
+    datas = np.array([e['data_inicio'][:10] for e in escalas], dtype='datetime64[D]')
+    min_entrada = minutos_do_dia([e['horario_entrada'] for e in escalas])
+    min_saida = minutos_do_dia([e['horario_saida'] for e in escalas])
+
+    overnight = min_saida <= min_entrada
+    dia_saida = datas + overnight.astype(np.int64) * _UM_DIA
+
+    entrada = datas.astype('datetime64[s]') + min_entrada.astype('timedelta64[m]') + _BRT_TO_UTC
+    saida = dia_saida.astype('datetime64[s]') + min_saida.astype('timedelta64[m]') + _BRT_TO_UTC
+
+    margem = np.timedelta64(int(round(janela_horas * 3600)), 's')
+    duracao_horas = (saida - entrada).astype(np.float64) / 3600.0
+
+    return JanelasTurno(entrada, saida, entrada - margem, saida + margem, overnight, duracao_horas)
+
+
+def epoch_segundos(horarios: np.ndarray) -> np.ndarray:
+    """datetime64 (UTC) → segundos epoch em float64, como os timestamps pré-carregados de acessos."""
+    return horarios.astype('datetime64[s]').astype(np.int64).astype(np.float64)
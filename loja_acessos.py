@@ -0,0 +1,333 @@
+"""
+Loja local de eventos de acesso (Parquet particionado + DuckDB).
+
+Os cálculos de presença e os relatórios releem a tabela acessos por chamadas
+paginadas ao PostgREST. Esta loja mantém uma cópia local dos eventos
+normalizados, em arquivos Parquet particionados por mês e planta:
+
+    <ACESSOS_LOJA_DIR>/mes=2026-02/planta=HUGOL/parte-....parquet
+
+Quem alimenta:
+    espelhar_eventos(acessos)   — importadores, com os acessos que acabaram de inserir
+                                  (só quando ACESSOS_LOJA_DIR está definido)
+    sincronizar(supabase)       — delta pela marca d'água em acessos.created_at
+                                  (sincronizar-loja-acessos.py), para máquinas que não importam
+    refazer_mes(supabase, mes)  — recarrega um mês inteiro do Supabase, substituindo a partição
+
+Limitação: o delta só enxerga linhas novas (created_at). UPDATEs e DELETEs em
+acessos — como as reescritas dos scripts corrigir-timezone-* — não chegam à
+loja; depois deles, refaça os meses afetados (sincronizar-loja-acessos.py
+--refazer YYYY-MM), senão reavaliar-escalas-historico.py --loja diverge do Supabase.
+
+Quem consome:
+    conectar()                  — conexão DuckDB com a view `acessos` (sem duplicatas)
+    carregar_timestamps(...)    — (cpf, planta) → [epoch UTC ordenados], no formato
+                                  usado por reavaliar-escalas-historico.py
+
+As partes são só acrescentadas; compactar() reescreve cada partição em um único
+arquivo sem duplicatas (cpf, data_acesso, sentido).
+"""
+import os
+import glob
+import shutil
+import uuid
+import logging
+from urllib.parse import quote
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DIRETORIO = os.getenv('ACESSOS_LOJA_DIR', 'loja_acessos')
+PAGE_SIZE = 1000                           # máximo por requisição no Supabase
+LINHAS_POR_PARTE = 50000                   # eventos acumulados antes de gravar na sincronização
+MARGEM_WATERMARK = timedelta(minutes=5)    # releitura antes da marca (ver construir-sessoes-presenca.py)
+SEM_PLANTA = '_'                           # diretório dos eventos sem planta
+REFAZENDO = '_refazendo'                   # área temporária de refazer_mes() (fora do padrão mes=*)
+
+COLUNAS = ('cpf', 'data_acesso', 'sentido', 'tipo', 'matricula', 'nome', 'codin')
+
+
+def _diretorio(diretorio: Optional[str]) -> str:
+    return diretorio or DIRETORIO
+
+
+def _utc(valor) -> Optional[datetime]:
+    if valor is None:
+        return None
+    if isinstance(valor, str):
+        valor = datetime.fromisoformat(valor.replace('Z', '+00:00'))
+    if valor.tzinfo is None:
+        valor = valor.replace(tzinfo=timezone.utc)
+    return valor.astimezone(timezone.utc)
+
+
+def _planta_dir(planta) -> str:
+    """Nome do diretório da planta: URL-encoded (reversível; '_' também, para não colidir com SEM_PLANTA)."""
+    planta = (planta or '').strip()
+    return quote(planta, safe='').replace('_', '%5F') if planta else SEM_PLANTA
+
+
+def gravar_eventos(acessos: Iterable[dict], diretorio: Optional[str] = None) -> int:
+    """Normaliza e grava os eventos, uma parte nova por (mês, planta). Retorna quantos gravou."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('cpf', pa.string()), ('data_acesso', pa.timestamp('us', tz='UTC')), ('sentido', pa.string()),
+        ('tipo', pa.string()), ('matricula', pa.string()), ('nome', pa.string()), ('codin', pa.string()),
+    ])
+
+    grupos: Dict[Tuple[str, str], List[dict]] = defaultdict(list)
+    for acesso in acessos:
+        cpf = (acesso.get('cpf') or '').strip()
+        try:
+            data_acesso = _utc(acesso.get('data_acesso'))
+        except (TypeError, ValueError):
+            continue
+        if not cpf or data_acesso is None or acesso.get('sentido') not in ('E', 'S'):
+            continue
+        linha = {c: acesso.get(c) for c in COLUNAS}
+        linha.update(cpf=cpf, data_acesso=data_acesso)
+        for c in ('tipo', 'matricula', 'nome', 'codin'):
+            linha[c] = None if linha[c] is None else str(linha[c])
+        grupos[(data_acesso.strftime('%Y-%m'), _planta_dir(acesso.get('planta')))].append(linha)
+
+    base = _diretorio(diretorio)
+    carimbo = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+    gravados = 0
+    for (mes, planta), linhas in grupos.items():
+        pasta = os.path.join(base, f"mes={mes}", f"planta={planta}")
+        os.makedirs(pasta, exist_ok=True)
+        caminho = os.path.join(pasta, f"parte-{carimbo}-{uuid.uuid4().hex[:8]}.parquet")
+        pq.write_table(pa.Table.from_pylist(linhas, schema=schema), caminho, compression='zstd')
+        gravados += len(linhas)
+
+    return gravados
+
+
+def espelhar_eventos(acessos: List[dict]) -> int:
+    """
+    Grava na loja local os acessos recém-inseridos por um importador, se
+    ACESSOS_LOJA_DIR estiver definido. Falhas vão para o log e não interrompem a importação.
+    """
+    if not os.getenv('ACESSOS_LOJA_DIR') or not acessos:
+        return 0
+    try:
+        return gravar_eventos(acessos)
+    except Exception as e:
+        logger.error(f"Erro ao gravar {len(acessos)} acesso(s) na loja local: {e}")
+        return 0
+
+
+# ============================================================
+# SINCRONIZAÇÃO POR DELTA
+# ============================================================
+
+def _arquivo_watermark(diretorio: Optional[str]) -> str:
+    return os.path.join(_diretorio(diretorio), '_watermark')
+
+
+def ler_watermark(diretorio: Optional[str] = None) -> Optional[datetime]:
+    try:
+        with open(_arquivo_watermark(diretorio), encoding='utf-8') as f:
+            return _utc(f.read().strip())
+    except FileNotFoundError:
+        return None
+
+
+def gravar_watermark(watermark: datetime, diretorio: Optional[str] = None):
+    caminho = _arquivo_watermark(diretorio)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(watermark.isoformat())
+    os.replace(caminho + '.tmp', caminho)
+
+
+def sincronizar(supabase, diretorio: Optional[str] = None) -> int:
+    """
+    Copia para a loja os acessos com created_at após a marca d'água (tudo, na primeira vez).
+    A marca só avança depois que todas as páginas foram gravadas. Retorna os eventos lidos.
+    """
+    watermark = ler_watermark(diretorio)
+    a_partir = (watermark - MARGEM_WATERMARK).isoformat() if watermark else '1970-01-01T00:00:00+00:00'
+    colunas = 'cpf, data_acesso, sentido, planta, tipo, matricula, nome, codin, created_at'
+
+    pendentes: List[dict] = []
+    maior_created_at = watermark
+    lidos = 0
+    offset = 0
+
+    while True:
+        resp = supabase.table('acessos').select(colunas) \
+            .gt('created_at', a_partir).order('created_at').order('id') \
+            .range(offset, offset + PAGE_SIZE - 1).execute()
+        lote = resp.data or []
+
+        for acesso in lote:
+            created_at = _utc(acesso.get('created_at'))
+            if created_at and (maior_created_at is None or created_at > maior_created_at):
+                maior_created_at = created_at
+        pendentes.extend(lote)
+        lidos += len(lote)
+
+        if len(pendentes) >= LINHAS_POR_PARTE:
+            gravar_eventos(pendentes, diretorio)
+            logger.info(f"  {lidos} acesso(s) sincronizado(s)...")
+            pendentes = []
+
+        if len(lote) < PAGE_SIZE:
+            break
+        offset += PAGE_SIZE
+
+    gravar_eventos(pendentes, diretorio)
+    if maior_created_at is not None and maior_created_at != watermark:
+        gravar_watermark(maior_created_at, diretorio)
+    return lidos
+
+
+def refazer_mes(supabase, mes: str, diretorio: Optional[str] = None) -> int:
+    """
+    Recarrega do Supabase todos os acessos do mês `mes` ('YYYY-MM', por data_acesso
+    em UTC) e substitui a partição mes=YYYY-MM inteira, incorporando UPDATEs e DELETEs
+    que o delta por created_at não vê. Retorna os eventos gravados.
+    """
+    inicio = datetime.strptime(mes, '%Y-%m').replace(tzinfo=timezone.utc)
+    fim = (inicio + timedelta(days=32)).replace(day=1)
+    base = _diretorio(diretorio)
+    temporario = os.path.join(base, REFAZENDO)
+    shutil.rmtree(temporario, ignore_errors=True)
+
+    colunas = 'cpf, data_acesso, sentido, planta, tipo, matricula, nome, codin'
+    pendentes: List[dict] = []
+    gravados = 0
+    offset = 0
+    while True:
+        resp = supabase.table('acessos').select(colunas) \
+            .gte('data_acesso', inicio.isoformat()).lt('data_acesso', fim.isoformat()) \
+            .order('id').range(offset, offset + PAGE_SIZE - 1).execute()
+        lote = resp.data or []
+        pendentes.extend(lote)
+
+        if len(pendentes) >= LINHAS_POR_PARTE:
+            gravados += gravar_eventos(pendentes, temporario)
+            pendentes = []
+
+        if len(lote) < PAGE_SIZE:
+            break
+        offset += PAGE_SIZE
+    gravados += gravar_eventos(pendentes, temporario)
+
+    # Troca a partição só depois da carga completa
+    destino = os.path.join(base, f"mes={mes}")
+    antigo = os.path.join(base, f"_antigo-{mes}")
+    shutil.rmtree(antigo, ignore_errors=True)
+    if os.path.isdir(destino):
+        os.replace(destino, antigo)
+    novo = os.path.join(temporario, f"mes={mes}")
+    if os.path.isdir(novo):
+        os.replace(novo, destino)
+    shutil.rmtree(antigo, ignore_errors=True)
+    shutil.rmtree(temporario, ignore_errors=True)
+    return gravados
+
+
+# ============================================================
+# CONSULTA (DuckDB)
+# ============================================================
+
+def _padrao(diretorio: Optional[str], mes: str = '*') -> str:
+    return os.path.join(_diretorio(diretorio), f"mes={mes}", "planta=*", "*.parquet")
+
+
+def conectar(diretorio: Optional[str] = None):
+    """
+    Conexão DuckDB em memória com a view `acessos` sobre a loja
+    (cpf, data_acesso, sentido, planta, tipo, matricula, nome, codin, mes),
+    sem duplicatas de (cpf, data_acesso, sentido). A planta é decodificada do
+    nome do diretório (ver _planta_dir).
+    """
+    import duckdb
+
+    con = duckdb.connect()
+    padrao = _padrao(diretorio)
+    if glob.glob(padrao):
+        con.execute(f"""
+            CREATE VIEW acessos AS
+            SELECT DISTINCT ON (cpf, data_acesso, sentido)
+                   cpf, data_acesso, sentido,
+                   CASE WHEN planta_dir = '{SEM_PLANTA}' THEN '' ELSE url_decode(planta_dir) END AS planta,
+                   tipo, matricula, nome, codin, mes
+            FROM (
+                SELECT *, regexp_extract(replace(filename, '\\', '/'), '/planta=([^/]*)/', 1) AS planta_dir
+                FROM read_parquet('{padrao}', hive_partitioning = true, filename = true,
+                                  hive_types = {{'mes': VARCHAR, 'planta': VARCHAR}})
+            )
+        """)
+    else:
+        con.execute("""
+            CREATE VIEW acessos AS
+            SELECT NULL::VARCHAR AS cpf, NULL::TIMESTAMPTZ AS data_acesso, NULL::VARCHAR AS sentido,
+                   NULL::VARCHAR AS planta, NULL::VARCHAR AS tipo, NULL::VARCHAR AS matricula,
+                   NULL::VARCHAR AS nome, NULL::VARCHAR AS codin, NULL::VARCHAR AS mes
+            WHERE false
+        """)
+    return con
+
+
+def carregar_timestamps(cpfs: Iterable[str], inicio: datetime, fim: datetime,
+                        diretorio: Optional[str] = None) -> Dict[Tuple[str, str], List[float]]:
+    """
+    Eventos dos `cpfs` entre `inicio` e `fim` (UTC): (cpf, planta) → [epoch ordenados].
+    Os meses fora do intervalo nem são lidos (poda pela partição mes=).
+    """
+    con = conectar(diretorio)
+    try:
+        linhas = con.execute("""
+            SELECT cpf, planta, epoch(data_acesso) AS ts
+            FROM acessos
+            WHERE mes BETWEEN ? AND ?
+              AND data_acesso BETWEEN ? AND ?
+              AND cpf IN (SELECT unnest(?::VARCHAR[]))
+            ORDER BY cpf, planta, ts
+        """, [inicio.strftime('%Y-%m'), fim.strftime('%Y-%m'), inicio, fim, sorted(set(cpfs))]).fetchall()
+    finally:
+        con.close()
+
+    acessos: Dict[Tuple[str, str], List[float]] = defaultdict(list)
+    for cpf, planta, ts in linhas:
+        acessos[(cpf, planta)].append(float(ts))
+    return dict(acessos)
+
+
+def compactar(diretorio: Optional[str] = None) -> int:
+    """Reescreve cada partição com mais de uma parte em um único arquivo sem duplicatas. Retorna quantas compactou."""
+    import duckdb
+
+    compactadas = 0
+    for pasta in sorted(glob.glob(os.path.join(_diretorio(diretorio), "mes=*", "planta=*"))):
+        partes = sorted(glob.glob(os.path.join(pasta, "*.parquet")))
+        if len(partes) < 2:
+            continue
+
+        temporario = os.path.join(pasta, "_compactando.parquet.tmp")
+        con = duckdb.connect()
+        try:
+            con.execute(f"""
+                COPY (
+                    SELECT DISTINCT ON (cpf, data_acesso, sentido) {', '.join(COLUNAS)}
+                    FROM read_parquet({partes!r}, hive_partitioning = false)
+                    ORDER BY cpf, data_acesso, sentido
+                ) TO '{temporario}' (FORMAT parquet, COMPRESSION zstd)
+            """)
+        finally:
+            con.close()
+
+        destino = os.path.join(pasta, f"parte-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-compacta.parquet")
+        shutil.move(temporario, destino)
+        for parte in partes:
+            os.remove(parte)
+        compactadas += 1
+
+    return compactadas
@@ -0,0 +1,265 @@
+"""
+manter-particoes-acessos.py
+===========================
+Manutenção das partições mensais da tabela acessos (migration 036).
+
+  1. Garante as partições dos próximos --meses-futuros meses
+     (criar_particao_acessos), para que inserts nunca caiam em acessos_default
+  2. Avisa se acessos_default tem linhas (datas fora das partições existentes)
+  3. Com --arquivar, para cada partição mais antiga que --retencao-meses:
+       - desanexa a partição primeiro, para que nenhuma linha nova caia nela
+         depois da exportação: DETACH PARTITION ... CONCURRENTLY, fora de
+         transação (sem bloquear leituras e escritas em acessos). O Postgres
+         não aceita CONCURRENTLY enquanto existir acessos_default; nesse caso
+         usa DETACH simples com lock_timeout curto
+       - exporta a tabela desanexada para Parquet comprimido (zstd) em
+         streaming (<destino>/acessos_YYYY_MM.parquet)
+       - confere as linhas exportadas contra a tabela; só então, com
+         --remover, apaga a tabela
+
+Uma tabela acessos_YYYY_MM já desanexada (execução anterior interrompida)
+é retomada: um DETACH CONCURRENTLY pendente é finalizado (FINALIZE) e a
+exportação é refeita se o Parquet não existir.
+
+Sem --arquivar o script só cria partições e relata o que seria arquivado.
+
+Uso:
+    python manter-particoes-acessos.py
+    python manter-particoes-acessos.py --arquivar --retencao-meses 24 --destino /backup/acessos
+    python manter-particoes-acessos.py --arquivar --remover
+
+Credenciais: as mesmas do executar-migration.py (DB_HOST, DB_PORT, DB_NAME,
+DB_USER, DB_PASSWORD no ambiente ou no .env). O arquivamento requer pyarrow.
+"""
+
+import os
+import re
+import argparse
+import logging
+from datetime import date
+
+from dotenv import load_dotenv
+
+from carga_acessos import conectar_postgres
+
+# ============================================================
+# CONFIGURAÇÕES
+# ============================================================
+
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env'))
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+MESES_FUTUROS = int(os.getenv('ACESSOS_MESES_FUTUROS', '3'))
+RETENCAO_MESES = int(os.getenv('ACESSOS_RETENCAO_MESES', '24'))
+DESTINO = os.getenv('ACESSOS_ARQUIVO_DIR', 'arquivo_acessos')
+
+LINHAS_POR_LOTE = 50000   # linhas por fetch do cursor de exportação / row group do Parquet
+LOCK_TIMEOUT_DETACH = '5s'  # DETACH sem CONCURRENTLY: desiste em vez de enfileirar atrás de consultas longas
+
+ANEXADA = 'anexada'
+DESANEXANDO = 'desanexando'   # DETACH CONCURRENTLY interrompido
+DESANEXADA = 'desanexada'
+
+COLUNAS = ('id', 'tipo', 'matricula', 'nome', 'cpf', 'data_acesso', 'sentido', 'planta', 'codin', 'created_at',
+           'pis', 'cracha', 'grupo_de_acess', 'desc_perm', 'tipo_acesso', 'descr_acesso', 'modelo',
+           'cod_planta', 'cod_codin')
+
+_PARTICAO = re.compile(r'^acessos_(\d{4})_(\d{2})$')
+
+
+def separador(titulo: str = ""):
+    logger.info("=" * 60)
+    if titulo:
+        logger.info(f"  {titulo}")
+        logger.info("=" * 60)
+
+
+def somar_meses(mes: date, n: int) -> date:
+    total = mes.year * 12 + (mes.month - 1) + n
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def listar_particoes(conn) -> dict:
+    """
+    Tabelas mensais acessos_YYYY_MM: primeiro dia do mês → (nome, situação),
+    com situação ANEXADA, DESANEXANDO ou DESANEXADA (fora da hierarquia).
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT c.relname, i.inhdetachpending
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace AND n.nspname = 'public'
+            LEFT JOIN pg_inherits i ON i.inhrelid = c.oid AND i.inhparent = 'public.acessos'::regclass
+            WHERE c.relkind = 'r' AND c.relname LIKE 'acessos\\_%'
+        """)
+        particoes = {}
+        for nome, pendente in cur.fetchall():
+            m = _PARTICAO.match(nome)
+            if m:
+                situacao = DESANEXADA if pendente is None else DESANEXANDO if pendente else ANEXADA
+                particoes[date(int(m.group(1)), int(m.group(2)), 1)] = (nome, situacao)
+    conn.commit()
+    return particoes
+
+
+def criar_futuras(conn, meses_futuros: int):
+    hoje = date.today().replace(day=1)
+    with conn, conn.cursor() as cur:
+        for n in range(meses_futuros + 1):
+            cur.execute("SELECT criar_particao_acessos(%s)", (somar_meses(hoje, n),))
+            logger.info(f"  Partição garantida: {cur.fetchone()[0]}")
+
+        cur.execute("SELECT COUNT(*) FROM acessos_default")
+        no_default = cur.fetchone()[0]
+    if no_default:
+        logger.warning(f"  acessos_default tem {no_default} linha(s) fora das partições mensais — verificar datas")
+
+
+def exportar_parquet(conn, particao: str, caminho: str) -> int:
+    """Exporta a partição para Parquet (zstd) em streaming. Retorna as linhas gravadas."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("pyarrow não instalado — necessário para --arquivar (pip install pyarrow)")
+
+    schema = pa.schema([
+        ('id', pa.string()), ('tipo', pa.string()), ('matricula', pa.string()), ('nome', pa.string()),
+        ('cpf', pa.string()), ('data_acesso', pa.timestamp('us', tz='UTC')), ('sentido', pa.string()),
+        ('planta', pa.string()), ('codin', pa.string()), ('created_at', pa.timestamp('us', tz='UTC')),
+        ('pis', pa.string()), ('cracha', pa.string()), ('grupo_de_acess', pa.string()), ('desc_perm', pa.string()),
+        ('tipo_acesso', pa.string()), ('descr_acesso', pa.string()), ('modelo', pa.string()),
+        ('cod_planta', pa.string()), ('cod_codin', pa.string()),
+    ])
+
+    temporario = caminho + '.tmp'
+    gravadas = 0
+    with conn.cursor(name=f"exportar_{particao}") as cur:
+        cur.itersize = LINHAS_POR_LOTE
+        cur.execute(f"SELECT {', '.join(COLUNAS)} FROM public.{particao} ORDER BY data_acesso")
+
+        with pq.ParquetWriter(temporario, schema, compression='zstd') as writer:
+            while True:
+                linhas = cur.fetchmany(LINHAS_POR_LOTE)
+                if not linhas:
+                    break
+                colunas = list(zip(*linhas))
+                colunas[0] = [str(v) for v in colunas[0]]   # uuid → texto
+                writer.write_table(pa.Table.from_arrays([list(c) for c in colunas], schema=schema))
+                gravadas += len(linhas)
+    conn.commit()
+
+    os.replace(temporario, caminho)
+    return gravadas
+
+
+def desanexar(conn, particao: str, situacao: str):
+    """
+    Tira a partição de acessos. CONCURRENTLY (e FINALIZE) não rodam dentro de
+    transação e não são aceitos com partição default: sem ela, usa autocommit;
+    com ela, DETACH simples limitado por LOCK_TIMEOUT_DETACH.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT partdefid <> 0 FROM pg_partitioned_table WHERE partrelid = 'public.acessos'::regclass")
+        tem_default = cur.fetchone()[0]
+    conn.commit()
+
+    if situacao == DESANEXANDO or not tem_default:
+        modo = 'FINALIZE' if situacao == DESANEXANDO else 'CONCURRENTLY'
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"ALTER TABLE public.acessos DETACH PARTITION public.{particao} {modo}")
+        finally:
+            conn.autocommit = False
+    else:
+        logger.info("  acessos_default existe: DETACH CONCURRENTLY indisponível, usando DETACH com lock_timeout")
+        with conn, conn.cursor() as cur:
+            cur.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT_DETACH}'")
+            cur.execute(f"ALTER TABLE public.acessos DETACH PARTITION public.{particao}")
+    logger.info(f"  {particao}: desanexada")
+
+
+def linhas_parquet(caminho: str) -> int:
+    import pyarrow.parquet as pq
+    return pq.ParquetFile(caminho).metadata.num_rows
+
+
+def arquivar(conn, particao: str, situacao: str, destino: str, remover: bool):
+    """Desanexa, exporta e confere a partição; com `remover`, apaga a tabela conferida."""
+    caminho = os.path.join(destino, f"{particao}.parquet")
+
+    if situacao != DESANEXADA:
+        desanexar(conn, particao, situacao)
+
+    # Desanexada, a tabela não recebe mais linhas: a contagem é definitiva
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT COUNT(*) FROM public.{particao}")
+        esperado = cur.fetchone()[0]
+    conn.commit()
+
+    if situacao == DESANEXADA and os.path.exists(caminho):
+        gravadas = linhas_parquet(caminho)
+    else:
+        gravadas = exportar_parquet(conn, particao, caminho)
+    if gravadas != esperado:
+        raise RuntimeError(
+            f"{particao}: {gravadas} linha(s) no Parquet, esperado {esperado} — "
+            f"a tabela desanexada foi mantida"
+        )
+
+    logger.info(f"  {particao}: {gravadas} linha(s) → {caminho} ({os.path.getsize(caminho) / 1e6:.1f} MB)")
+
+    if remover:
+        with conn, conn.cursor() as cur:
+            cur.execute(f"DROP TABLE public.{particao}")
+        logger.info(f"  {particao}: removida")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manutenção das partições mensais de acessos")
+    parser.add_argument("--meses-futuros", type=int, default=MESES_FUTUROS)
+    parser.add_argument("--retencao-meses", type=int, default=RETENCAO_MESES,
+                        help=f"Meses mantidos na tabela (padrão {RETENCAO_MESES})")
+    parser.add_argument("--arquivar", action="store_true", help="Desanexa e exporta as partições antigas")
+    parser.add_argument("--destino", default=DESTINO, help="Diretório dos arquivos Parquet")
+    parser.add_argument("--remover", action="store_true", help="Apaga a partição depois de desanexar")
+    args = parser.parse_args()
+
+    separador("manter-particoes-acessos.py")
+    conn = conectar_postgres()
+
+    try:
+        criar_futuras(conn, args.meses_futuros)
+
+        limite = somar_meses(date.today().replace(day=1), -args.retencao_meses)
+        # Já desanexadas só voltam à fila se faltar o Parquet ou se for para remover
+        antigas = sorted(
+            (mes, nome, situacao) for mes, (nome, situacao) in listar_particoes(conn).items()
+            if mes < limite and (
+                situacao != DESANEXADA or args.remover
+                or not os.path.exists(os.path.join(args.destino, f"{nome}.parquet"))
+            )
+        )
+        logger.info(f"  Retenção: {args.retencao_meses} meses | {len(antigas)} partição(ões) anteriores a {limite:%Y-%m}")
+
+        if antigas and not args.arquivar:
+            logger.info(f"  Use --arquivar para desanexar e exportar: {', '.join(n for _, n, _ in antigas)}")
+        elif antigas:
+            os.makedirs(args.destino, exist_ok=True)
+            for _, nome, situacao in antigas:
+                arquivar(conn, nome, situacao, args.destino, args.remover)
+    finally:
+        conn.close()
+
+    separador("CONCLUÍDO")
+
+
+if __name__ == "__main__":
+    main()
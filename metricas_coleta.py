@@ -0,0 +1,154 @@
+"""
+Instrumentação de tempo por etapa dos coletores Selenium.
+
+Cada etapa (início do driver, carregamento da página, preenchimento do
+formulário, espera do código, extração, gravação...) é medida com
+`metricas.medir('etapa', usuario=codigo_mv)`. Ao final da execução, as
+durações são agregadas em percentis e histogramas e exportadas em JSON
+e/ou no formato textfile do Prometheus (node_exporter).
+
+Uso:
+    metricas = MetricasEtapas()
+    with metricas.medir('extracao', usuario='1234'):
+        ...
+    metricas.salvar_json('metricas.json')
+    metricas.salvar_prometheus('/var/lib/node_exporter/coleta_mv.prom')
+"""
+import os
+import json
+import time
+import threading
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Limites (em segundos) dos buckets do histograma
+BUCKETS_PADRAO = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+PERCENTIS = (50, 90, 95, 99)
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    """Percentil por interpolação linear sobre uma lista já ordenada."""
+    if not valores:
+        return 0.0
+    posicao = (len(valores) - 1) * p / 100
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(valores) - 1)
+    fracao = posicao - inferior
+    return valores[inferior] + (valores[superior] - valores[inferior]) * fracao
+
+
+class MetricasEtapas:
+    """Acumula durações por etapa e por usuário (thread-safe)."""
+
+    def __init__(self, prefixo: str = 'coleta_mv', buckets=BUCKETS_PADRAO):
+        self.prefixo = prefixo
+        self.buckets = tuple(sorted(buckets))
+        self.inicio = datetime.now()
+        self._lock = threading.Lock()
+        self._amostras: Dict[str, List[float]] = {}
+        self._por_usuario: Dict[str, Dict[str, float]] = {}
+
+    @contextmanager
+    def medir(self, etapa: str, usuario: Optional[str] = None):
+        """Context manager que registra a duração do bloco na etapa indicada."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(etapa, time.perf_counter() - inicio, usuario)
+
+    def registrar(self, etapa: str, duracao: float, usuario: Optional[str] = None):
+        """Registra uma duração (em segundos) para a etapa."""
+        with self._lock:
+            self._amostras.setdefault(etapa, []).append(duracao)
+            if usuario is not None:
+                etapas_usuario = self._por_usuario.setdefault(str(usuario), {})
+                etapas_usuario[etapa] = etapas_usuario.get(etapa, 0.0) + duracao
+
+    def resumo(self) -> Dict[str, Dict]:
+        """Retorna count/soma/média/percentis/máximo e histograma de cada etapa."""
+        with self._lock:
+            amostras = {etapa: sorted(valores) for etapa, valores in self._amostras.items()}
+
+        resumo = {}
+        for etapa, valores in amostras.items():
+            total = sum(valores)
+            resumo[etapa] = {
+                'count': len(valores),
+                'soma': round(total, 3),
+                'media': round(total / len(valores), 3),
+                **{f'p{p}': round(_percentil(valores, p), 3) for p in PERCENTIS},
+                'max': round(valores[-1], 3),
+                'histograma': {
+                    str(limite): sum(1 for v in valores if v <= limite) for limite in self.buckets
+                },
+            }
+        return resumo
+
+    def log_resumo(self):
+        """Escreve no log uma tabela com os percentis de cada etapa."""
+        resumo = self.resumo()
+        if not resumo:
+            return
+
+        logger.info(f"{'Etapa':<28} {'n':>6} {'soma(s)':>10} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}")
+        for etapa, stats in sorted(resumo.items(), key=lambda item: -item[1]['soma']):
+            logger.info(
+                f"{etapa:<28} {stats['count']:>6} {stats['soma']:>10.1f} "
+                f"{stats['p50']:>8.2f} {stats['p90']:>8.2f} {stats['p99']:>8.2f} {stats['max']:>8.2f}"
+            )
+
+    def salvar_json(self, caminho: str):
+        """Salva o resumo por etapa e os totais por usuário em JSON."""
+        with self._lock:
+            por_usuario = {
+                usuario: {etapa: round(total, 3) for etapa, total in etapas.items()}
+                for usuario, etapas in self._por_usuario.items()
+            }
+
+        conteudo = {
+            'inicio': self.inicio.isoformat(timespec='seconds'),
+            'fim': datetime.now().isoformat(timespec='seconds'),
+            'etapas': self.resumo(),
+            'por_usuario': por_usuario,
+        }
+        self._escrever(caminho, json.dumps(conteudo, ensure_ascii=False, indent=2))
+        logger.info(f"Métricas salvas em: {caminho}")
+
+    def salvar_prometheus(self, caminho: str):
+        """Salva histogramas no formato textfile do Prometheus (escrita atômica)."""
+        with self._lock:
+            amostras = {etapa: list(valores) for etapa, valores in self._amostras.items()}
+
+        nome = f"{self.prefixo}_etapa_segundos"
+        linhas = [
+            f"# HELP {nome} Duração das etapas da coleta em segundos.",
+            f"# TYPE {nome} histogram",
+        ]
+        for etapa in sorted(amostras):
+            valores = amostras[etapa]
+            for limite in self.buckets:
+                acumulado = sum(1 for v in valores if v <= limite)
+                linhas.append(f'{nome}_bucket{{etapa="{etapa}",le="{limite}"}} {acumulado}')
+            linhas.append(f'{nome}_bucket{{etapa="{etapa}",le="+Inf"}} {len(valores)}')
+            linhas.append(f'{nome}_sum{{etapa="{etapa}"}} {sum(valores):.6f}')
+            linhas.append(f'{nome}_count{{etapa="{etapa}"}} {len(valores)}')
+
+        linhas.append(f"# HELP {self.prefixo}_ultima_execucao_timestamp Fim da última execução (epoch).")
+        linhas.append(f"# TYPE {self.prefixo}_ultima_execucao_timestamp gauge")
+        linhas.append(f"{self.prefixo}_ultima_execucao_timestamp {time.time():.0f}")
+
+        self._escrever(caminho, "\n".join(linhas) + "\n")
+        logger.info(f"Métricas Prometheus salvas em: {caminho}")
+
+    @staticmethod
+    def _escrever(caminho: str, conteudo: str):
+        """Escreve em arquivo temporário e renomeia, para leitores nunca verem arquivo parcial."""
+        temporario = f"{caminho}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as f:
+            f.write(conteudo)
+        os.replace(temporario, caminho)
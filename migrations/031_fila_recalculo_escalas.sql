@@ -0,0 +1,57 @@
+-- =============================================================
+-- Migration 031 — Fila de recálculo incremental de escalas
+-- =============================================================
+-- Importadores de acessos e a sincronização de produtividade (RDS)
+-- registram aqui as chaves que tocaram:
+--   origem 'acesso'        → (cpf, dia UTC, planta)
+--   origem 'produtividade' → (codigo_mv, dia)
+-- O verificar-presenca-escalas.py --incremental lê a fila, reavalia
+-- apenas as escalas que dependem dessas chaves e remove o que consumiu.
+-- =============================================================
+
+BEGIN;
+
+-- ─────────────────────────────────────────────────────────────
+-- 1. Tabela da fila
+-- ─────────────────────────────────────────────────────────────
+CREATE TABLE IF NOT EXISTS escalas_recalculo_pendente (
+    id             BIGSERIAL   PRIMARY KEY,
+    origem         TEXT        NOT NULL CHECK (origem IN ('acesso', 'produtividade')),
+    chave          TEXT        NOT NULL,              -- cpf ou codigo_mv
+    dia            DATE        NOT NULL,
+    planta         TEXT        NOT NULL DEFAULT '',   -- '' quando não se aplica/desconhecida
+    atualizado_em  TIMESTAMPTZ NOT NULL DEFAULT now(),
+
+    -- Uma chave tocada várias vezes ocupa uma única linha
+    CONSTRAINT escalas_recalculo_pendente_unique UNIQUE (origem, chave, dia, planta)
+);
+
+COMMENT ON TABLE  escalas_recalculo_pendente               IS 'Chaves (cpf/dia/planta, codigo_mv/dia) com dados novos aguardando reavaliação de escalas';
+COMMENT ON COLUMN escalas_recalculo_pendente.atualizado_em IS 'Última vez que a chave foi tocada; o consumidor só remove linhas até o instante que leu';
+
+CREATE INDEX IF NOT EXISTS idx_escalas_recalculo_pendente_atualizado_em
+    ON escalas_recalculo_pendente (atualizado_em);
+
+-- ─────────────────────────────────────────────────────────────
+-- 2. Reenfileirar uma chave existente renova atualizado_em,
+--    para que não seja removida por um consumidor em andamento
+-- ─────────────────────────────────────────────────────────────
+CREATE OR REPLACE FUNCTION tocar_escalas_recalculo_pendente()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.atualizado_em := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_tocar_escalas_recalculo_pendente ON escalas_recalculo_pendente;
+CREATE TRIGGER trg_tocar_escalas_recalculo_pendente
+    BEFORE UPDATE ON escalas_recalculo_pendente
+    FOR EACH ROW EXECUTE FUNCTION tocar_escalas_recalculo_pendente();
+
+-- ─────────────────────────────────────────────────────────────
+-- 3. RLS — acesso apenas pelo service role (scripts)
+-- ─────────────────────────────────────────────────────────────
+ALTER TABLE escalas_recalculo_pendente ENABLE ROW LEVEL SECURITY;
+
+COMMIT;
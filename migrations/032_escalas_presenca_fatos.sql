@@ -0,0 +1,48 @@
+-- =============================================================
+-- Migration 032 — Fatos de presença por escala e médico
+-- =============================================================
+-- Uma linha por (escala_id, cpf), mantida pelos jobs de status
+-- (verificar-presenca-escalas.py, recalcular-status-diario.py):
+-- horas esperadas x medidas, entrada/saída consideradas e resultado.
+-- Leituras de presença passam a ser um lookup indexado em vez de
+-- recalcular a partir da tabela acessos.
+-- =============================================================
+
+BEGIN;
+
+-- ─────────────────────────────────────────────────────────────
+-- 1. Tabela
+-- ─────────────────────────────────────────────────────────────
+CREATE TABLE IF NOT EXISTS escalas_presenca_fatos (
+    escala_id        UUID         NOT NULL REFERENCES escalas_medicas(id) ON DELETE CASCADE,
+    cpf              TEXT         NOT NULL,
+    data             DATE         NOT NULL,
+    horas_esperadas  NUMERIC(6,2),
+    horas_medidas    NUMERIC(6,2),
+    entrada          TIMESTAMPTZ,
+    saida            TIMESTAMPTZ,
+    qtd_acessos      INTEGER,
+    resultado        TEXT         NOT NULL CHECK (resultado IN ('presente_total', 'presente_parcial', 'ausente')),
+    metodo           TEXT         NOT NULL CHECK (metodo IN ('acessos', 'pareamento', 'produtividade')),
+    origem           TEXT         NOT NULL,
+    calculado_em     TIMESTAMPTZ  NOT NULL DEFAULT now(),
+
+    PRIMARY KEY (escala_id, cpf)
+);
+
+COMMENT ON TABLE  escalas_presenca_fatos               IS 'Presença calculada por médico em cada escala (mantida pelos jobs de status)';
+COMMENT ON COLUMN escalas_presenca_fatos.metodo        IS 'acessos: primeiro→último acesso na janela | pareamento: entrada/saída mais próximas do horário | produtividade: unidade sem gestão de acesso';
+COMMENT ON COLUMN escalas_presenca_fatos.horas_medidas IS 'NULL quando metodo = produtividade';
+
+CREATE INDEX IF NOT EXISTS idx_escalas_presenca_fatos_cpf_data ON escalas_presenca_fatos (cpf, data);
+CREATE INDEX IF NOT EXISTS idx_escalas_presenca_fatos_data     ON escalas_presenca_fatos (data);
+
+-- ─────────────────────────────────────────────────────────────
+-- 2. RLS — leitura para autenticados; escrita só pelo service role
+-- ─────────────────────────────────────────────────────────────
+ALTER TABLE escalas_presenca_fatos ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Usuarios autenticados podem visualizar escalas_presenca_fatos"
+    ON escalas_presenca_fatos FOR SELECT TO authenticated USING (true);
+
+COMMIT;
@@ -0,0 +1,65 @@
+-- =============================================================
+-- Migration 033 — Sessões de presença derivadas dos acessos
+-- =============================================================
+-- O construir-sessoes-presenca.py transforma os eventos brutos
+-- de catraca (acessos E/S) em sessões (cpf, planta, entrada, saída),
+-- de forma incremental a partir de uma marca d'água em
+-- acessos.created_at. Sessões atravessam a meia-noite naturalmente;
+-- eventos sem par viram sessões órfãs.
+-- =============================================================
+
+BEGIN;
+
+-- ─────────────────────────────────────────────────────────────
+-- 1. Sessões
+-- ─────────────────────────────────────────────────────────────
+CREATE TABLE IF NOT EXISTS presenca_sessoes (
+    id             BIGSERIAL    PRIMARY KEY,
+    cpf            TEXT         NOT NULL,
+    planta         TEXT         NOT NULL DEFAULT '',   -- '' quando o acesso não tem planta
+    inicio         TIMESTAMPTZ  NOT NULL,              -- entrada, ou a saída em órfãs de saída
+    fim            TIMESTAMPTZ  NOT NULL,              -- saída, ou a entrada em sessões abertas/órfãs
+    entrada        TIMESTAMPTZ,
+    saida          TIMESTAMPTZ,
+    duracao_horas  NUMERIC(6,2) GENERATED ALWAYS AS (
+                       CASE WHEN entrada IS NOT NULL AND saida IS NOT NULL
+                            THEN ROUND(EXTRACT(EPOCH FROM (saida - entrada)) / 3600.0, 2)
+                       END
+                   ) STORED,
+    qtd_eventos    INTEGER      NOT NULL,
+    situacao       TEXT         NOT NULL CHECK (situacao IN ('fechada', 'aberta', 'orfa_entrada', 'orfa_saida')),
+    atualizado_em  TIMESTAMPTZ  NOT NULL DEFAULT now(),
+
+    CONSTRAINT presenca_sessoes_unique UNIQUE (cpf, planta, inicio)
+);
+
+COMMENT ON TABLE  presenca_sessoes          IS 'Sessões de presença (entrada→saída) construídas incrementalmente a partir de acessos';
+COMMENT ON COLUMN presenca_sessoes.situacao IS 'fechada: E→S | aberta: E recente sem S | orfa_entrada: E sem S após o limite | orfa_saida: S sem E';
+
+CREATE INDEX IF NOT EXISTS idx_presenca_sessoes_cpf_planta_fim ON presenca_sessoes (cpf, planta, fim);
+CREATE INDEX IF NOT EXISTS idx_presenca_sessoes_planta_inicio  ON presenca_sessoes (planta, inicio);
+
+-- ─────────────────────────────────────────────────────────────
+-- 2. Marca d'água do construtor
+-- ─────────────────────────────────────────────────────────────
+CREATE TABLE IF NOT EXISTS presenca_sessoes_controle (
+    nome           TEXT         PRIMARY KEY,
+    watermark      TIMESTAMPTZ  NOT NULL,
+    atualizado_em  TIMESTAMPTZ  NOT NULL DEFAULT now()
+);
+
+COMMENT ON TABLE presenca_sessoes_controle IS 'Último acessos.created_at processado pelo construtor de sessões';
+
+-- Índice para a leitura incremental por data de ingestão
+CREATE INDEX IF NOT EXISTS idx_acessos_created_at ON acessos (created_at);
+
+-- ─────────────────────────────────────────────────────────────
+-- 3. RLS — leitura para autenticados; escrita só pelo service role
+-- ─────────────────────────────────────────────────────────────
+ALTER TABLE presenca_sessoes ENABLE ROW LEVEL SECURITY;
+ALTER TABLE presenca_sessoes_controle ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Usuarios autenticados podem visualizar presenca_sessoes"
+    ON presenca_sessoes FOR SELECT TO authenticated USING (true);
+
+COMMIT;
@@ -0,0 +1,84 @@
+-- =============================================================
+-- Migration 034 — Tabela normalizada escala ↔ médico
+-- =============================================================
+-- escalas_medicas.medicos é um array JSONB [{nome, cpf}]. Para saber
+-- "quais escalas têm este CPF" ou "quais CPFs estão escalados no dia"
+-- era preciso baixar todas as escalas e percorrer o array no cliente.
+-- escalas_medicos guarda uma linha por (escala, cpf), indexada por
+-- cpf e por dia, mantida por trigger a cada INSERT/UPDATE da escala.
+-- A carga inicial é feita aqui mesmo (passo 3), para que os coletores
+-- nunca leiam a tabela pela metade; a conferência fica no
+-- sincronizar-escalas-medicos.py.
+-- =============================================================
+
+BEGIN;
+
+-- ─────────────────────────────────────────────────────────────
+-- 1. Tabela
+-- ─────────────────────────────────────────────────────────────
+CREATE TABLE IF NOT EXISTS escalas_medicos (
+    escala_id     UUID     NOT NULL REFERENCES escalas_medicas(id) ON DELETE CASCADE,
+    cpf           TEXT     NOT NULL,
+    nome          TEXT,
+    data_inicio   DATE     NOT NULL,
+    contrato_id   UUID     NOT NULL,
+    ativo         BOOLEAN  NOT NULL DEFAULT true,
+
+    PRIMARY KEY (escala_id, cpf)
+);
+
+COMMENT ON TABLE escalas_medicos IS 'Uma linha por médico de cada escala (espelho de escalas_medicas.medicos, mantido por trigger)';
+
+CREATE INDEX IF NOT EXISTS idx_escalas_medicos_cpf_data  ON escalas_medicos (cpf, data_inicio);
+CREATE INDEX IF NOT EXISTS idx_escalas_medicos_data_ativo ON escalas_medicos (data_inicio, ativo);
+
+-- ─────────────────────────────────────────────────────────────
+-- 2. Sincronização: refaz as linhas da escala quando ela muda
+--    (DELETE da escala é coberto pelo ON DELETE CASCADE)
+-- ─────────────────────────────────────────────────────────────
+CREATE OR REPLACE FUNCTION sincronizar_escalas_medicos()
+RETURNS TRIGGER AS $$
+BEGIN
+    DELETE FROM escalas_medicos WHERE escala_id = NEW.id;
+
+    INSERT INTO escalas_medicos (escala_id, cpf, nome, data_inicio, contrato_id, ativo)
+    SELECT DISTINCT ON (btrim(m->>'cpf'))
+           NEW.id, btrim(m->>'cpf'), m->>'nome', NEW.data_inicio, NEW.contrato_id, COALESCE(NEW.ativo, true)
+    FROM jsonb_array_elements(
+             CASE WHEN jsonb_typeof(NEW.medicos) = 'array' THEN NEW.medicos ELSE '[]'::jsonb END
+         ) AS m
+    WHERE jsonb_typeof(m) = 'object'
+      AND COALESCE(btrim(m->>'cpf'), '') <> '';
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;  -- escreve mesmo quando quem edita a escala não tem permissão na tabela filha
+
+DROP TRIGGER IF EXISTS trg_sincronizar_escalas_medicos ON escalas_medicas;
+CREATE TRIGGER trg_sincronizar_escalas_medicos
+    AFTER INSERT OR UPDATE OF medicos, data_inicio, contrato_id, ativo ON escalas_medicas
+    FOR EACH ROW EXECUTE FUNCTION sincronizar_escalas_medicos();
+
+-- ─────────────────────────────────────────────────────────────
+-- 3. Carga inicial das escalas existentes (mesma regra do trigger)
+-- ─────────────────────────────────────────────────────────────
+INSERT INTO escalas_medicos (escala_id, cpf, nome, data_inicio, contrato_id, ativo)
+SELECT DISTINCT ON (e.id, btrim(m->>'cpf'))
+       e.id, btrim(m->>'cpf'), m->>'nome', e.data_inicio, e.contrato_id, COALESCE(e.ativo, true)
+FROM escalas_medicas e
+CROSS JOIN LATERAL jsonb_array_elements(
+         CASE WHEN jsonb_typeof(e.medicos) = 'array' THEN e.medicos ELSE '[]'::jsonb END
+     ) AS m
+WHERE jsonb_typeof(m) = 'object'
+  AND COALESCE(btrim(m->>'cpf'), '') <> ''
+ON CONFLICT (escala_id, cpf) DO NOTHING;
+
+-- ─────────────────────────────────────────────────────────────
+-- 4. RLS — leitura para autenticados; escrita só pelo trigger/service role
+-- ─────────────────────────────────────────────────────────────
+ALTER TABLE escalas_medicos ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Usuarios autenticados podem visualizar escalas_medicos"
+    ON escalas_medicos FOR SELECT TO authenticated USING (true);
+
+COMMIT;
@@ -0,0 +1,34 @@
+-- =============================================================
+-- Migration 035 — Unicidade de acessos (cpf, data_acesso, sentido)
+-- =============================================================
+-- Os importadores evitavam duplicatas consultando cada registro antes
+-- de inserir. A carga em massa (carga_acessos.py) faz o merge com
+-- INSERT ... ON CONFLICT (cpf, data_acesso, sentido) DO NOTHING, o que
+-- exige um índice único nessas colunas. Duplicatas já existentes são
+-- removidas antes, mantendo o registro mais antigo.
+-- =============================================================
+
+BEGIN;
+
+-- ─────────────────────────────────────────────────────────────
+-- 1. Remover duplicatas (mantém o menor created_at / id)
+-- ─────────────────────────────────────────────────────────────
+DELETE FROM acessos a
+USING (
+    SELECT id,
+           ROW_NUMBER() OVER (
+               PARTITION BY cpf, data_acesso, sentido
+               ORDER BY created_at, id
+           ) AS ordem
+    FROM acessos
+) d
+WHERE a.id = d.id
+  AND d.ordem > 1;
+
+-- ─────────────────────────────────────────────────────────────
+-- 2. Índice único usado pelo ON CONFLICT
+-- ─────────────────────────────────────────────────────────────
+CREATE UNIQUE INDEX IF NOT EXISTS idx_acessos_cpf_data_sentido_unique
+    ON acessos (cpf, data_acesso, sentido);
+
+COMMIT;
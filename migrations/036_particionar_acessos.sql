@@ -0,0 +1,147 @@
+-- =============================================================
+-- Migration 036 — Particionamento mensal de acessos
+-- =============================================================
+-- acessos cresce a cada evento de catraca e toda consulta de presença
+-- filtra por cpf + intervalo de data_acesso. A tabela passa a ser
+-- particionada por mês (RANGE em data_acesso, limites em UTC):
+--   acessos_YYYY_MM  — uma partição por mês
+--   acessos_default  — rede de segurança para datas fora das partições
+-- O manter-particoes-acessos.py cria as partições futuras e, além do
+-- horizonte de retenção, exporta as antigas para Parquet e as desanexa.
+--
+-- Os dados atuais são copiados para a nova tabela dentro desta
+-- transação (pode levar alguns minutos em bases grandes).
+-- =============================================================
+
+BEGIN;
+
+-- ─────────────────────────────────────────────────────────────
+-- 1. Tirar a tabela atual do caminho
+--    (a view materializada depende dela e é recriada no fim)
+-- ─────────────────────────────────────────────────────────────
+DROP MATERIALIZED VIEW IF EXISTS vm_acessos_mensal;
+
+ALTER TABLE acessos RENAME TO acessos_legado;
+
+-- ─────────────────────────────────────────────────────────────
+-- 2. Tabela particionada, com as mesmas colunas da atual
+--    (inclusive as extras de criar-colunas-acessos.sql: pis, cracha,
+--    grupo_de_acess, ...; defaults, NOT NULL e CHECKs vêm juntos).
+--    A chave primária precisa incluir a coluna de partição e é
+--    criada no passo 5.
+-- ─────────────────────────────────────────────────────────────
+CREATE TABLE acessos (
+    LIKE acessos_legado INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+) PARTITION BY RANGE (data_acesso);
+
+COMMENT ON TABLE acessos IS 'Eventos de catraca, particionados por mês de data_acesso (UTC); ver manter-particoes-acessos.py';
+
+-- Cria (se não existir) a partição do mês de p_mes. Retorna o nome da partição.
+CREATE OR REPLACE FUNCTION criar_particao_acessos(p_mes DATE)
+RETURNS TEXT AS $$
+DECLARE
+    v_inicio DATE := date_trunc('month', p_mes)::date;
+    v_nome   TEXT := 'acessos_' || to_char(v_inicio, 'YYYY_MM');
+BEGIN
+    IF to_regclass('public.' || v_nome) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE public.%I PARTITION OF public.acessos FOR VALUES FROM (%L) TO (%L)',
+            v_nome,
+            v_inicio::timestamp AT TIME ZONE 'UTC',
+            (v_inicio + INTERVAL '1 month')::timestamp AT TIME ZONE 'UTC'
+        );
+    END IF;
+    RETURN v_nome;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Partições do primeiro mês com dados até 3 meses à frente
+DO $$
+DECLARE
+    v_mes DATE;
+    v_fim DATE := (date_trunc('month', now() AT TIME ZONE 'UTC') + INTERVAL '3 months')::date;
+BEGIN
+    SELECT COALESCE(date_trunc('month', MIN(data_acesso) AT TIME ZONE 'UTC')::date,
+                    date_trunc('month', now() AT TIME ZONE 'UTC')::date)
+      INTO v_mes
+      FROM acessos_legado;
+
+    WHILE v_mes <= v_fim LOOP
+        PERFORM criar_particao_acessos(v_mes);
+        v_mes := (v_mes + INTERVAL '1 month')::date;
+    END LOOP;
+END;
+$$;
+
+CREATE TABLE IF NOT EXISTS acessos_default PARTITION OF acessos DEFAULT;
+
+-- ─────────────────────────────────────────────────────────────
+-- 3. Copiar os dados
+-- ─────────────────────────────────────────────────────────────
+-- (mesma ordem de colunas, pelo LIKE)
+INSERT INTO acessos
+SELECT * FROM acessos_legado;
+
+-- ─────────────────────────────────────────────────────────────
+-- 4. Políticas de RLS: replicadas da tabela antiga, como estiverem
+-- ─────────────────────────────────────────────────────────────
+DO $$
+DECLARE
+    p RECORD;
+BEGIN
+    IF (SELECT relrowsecurity FROM pg_class WHERE oid = 'public.acessos_legado'::regclass) THEN
+        ALTER TABLE acessos ENABLE ROW LEVEL SECURITY;
+    END IF;
+
+    FOR p IN SELECT * FROM pg_policies WHERE schemaname = 'public' AND tablename = 'acessos_legado' LOOP
+        EXECUTE format(
+            'CREATE POLICY %I ON public.acessos AS %s FOR %s TO %s%s%s',
+            p.policyname,
+            p.permissive,
+            p.cmd,
+            array_to_string(p.roles, ', '),
+            CASE WHEN p.qual IS NOT NULL
+                 THEN ' USING (' || replace(p.qual, 'acessos_legado.', 'acessos.') || ')' ELSE '' END,
+            CASE WHEN p.with_check IS NOT NULL
+                 THEN ' WITH CHECK (' || replace(p.with_check, 'acessos_legado.', 'acessos.') || ')' ELSE '' END
+        );
+    END LOOP;
+END;
+$$;
+
+GRANT SELECT ON acessos TO authenticated;
+
+-- ─────────────────────────────────────────────────────────────
+-- 5. Remover a tabela antiga e recriar chaves e índices
+--    (criados depois da carga; propagam para todas as partições)
+-- ─────────────────────────────────────────────────────────────
+DROP TABLE acessos_legado;
+
+ALTER TABLE acessos ADD CONSTRAINT acessos_pkey PRIMARY KEY (id, data_acesso);
+
+-- Unicidade usada pelos importadores (migration 035); também atende cpf + intervalo de data
+CREATE UNIQUE INDEX idx_acessos_cpf_data_sentido_unique ON acessos (cpf, data_acesso, sentido);
+CREATE INDEX idx_acessos_data       ON acessos (data_acesso DESC);
+CREATE INDEX idx_acessos_created_at ON acessos (created_at);   -- leitura incremental (migration 033)
+CREATE INDEX idx_acessos_planta     ON acessos (planta);
+CREATE INDEX idx_acessos_matricula  ON acessos (matricula);
+CREATE INDEX idx_acessos_cracha     ON acessos (cracha);
+
+-- ─────────────────────────────────────────────────────────────
+-- 6. Recriar a view materializada de acessos (migration 015)
+-- ─────────────────────────────────────────────────────────────
+CREATE MATERIALIZED VIEW vm_acessos_mensal AS
+SELECT
+  date_trunc('month', a.data_acesso::date) AS mes,
+  a.planta,
+  a.tipo,
+  COUNT(*) AS total_registros,
+  COUNT(*) FILTER (WHERE a.sentido = 'E') AS entradas,
+  COUNT(*) FILTER (WHERE a.sentido = 'S') AS saidas,
+  COUNT(DISTINCT a.cpf) AS pessoas_unicas
+FROM acessos a
+GROUP BY 1, 2, 3;
+
+CREATE UNIQUE INDEX idx_vm_acessos_mensal ON vm_acessos_mensal(mes, planta, tipo);
+
+COMMIT;
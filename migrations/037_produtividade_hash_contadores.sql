@@ -0,0 +1,44 @@
+-- =============================================================
+-- Migration 037 — Hash dos contadores de produtividade
+-- =============================================================
+-- A revisão retroativa do mv-produtividade-rds.py buscava as 9
+-- colunas de cada registro, uma requisição por registro, para
+-- comparar com o RDS. Com uma coluna gerada contendo o hash dos
+-- 9 contadores, a revisão lê (codigo_mv, nm_unidade, hash) do dia
+-- inteiro de uma vez e só envia os registros cujo hash mudou.
+--
+-- Fórmula (repetida em hash_contadores() no mv-produtividade-rds.py):
+--   primeiros 16 hex do md5 dos 9 contadores, na ordem abaixo,
+--   como inteiros separados por '|'
+-- =============================================================
+
+BEGIN;
+
+-- ─────────────────────────────────────────────────────────────
+-- 1. Coluna gerada (reescreve a tabela uma vez)
+-- ─────────────────────────────────────────────────────────────
+ALTER TABLE produtividade
+    ADD COLUMN IF NOT EXISTS hash_contadores TEXT GENERATED ALWAYS AS (
+        left(md5(
+            prescricao::text           || '|' ||
+            diagnostico::text          || '|' ||
+            encaminhamento::text       || '|' ||
+            parecer::text              || '|' ||
+            anotacao::text             || '|' ||
+            avaliacao::text            || '|' ||
+            documento_eletronico::text || '|' ||
+            evolucao::text             || '|' ||
+            alta_medica::text
+        ), 16)
+    ) STORED;
+
+COMMENT ON COLUMN produtividade.hash_contadores IS
+    'md5 (16 hex) dos 9 contadores separados por | — detecção de mudança na revisão retroativa do RDS';
+
+-- ─────────────────────────────────────────────────────────────
+-- 2. Leitura (data → chave, hash) só pelo índice
+-- ─────────────────────────────────────────────────────────────
+CREATE INDEX IF NOT EXISTS idx_produtividade_data_hash
+    ON produtividade (data) INCLUDE (codigo_mv, nm_unidade, hash_contadores);
+
+COMMIT;
@@ -0,0 +1,112 @@
+-- =============================================================
+-- Migration 038 — RPC upsert_produtividade_batch
+-- =============================================================
+-- O mv-produtividade-rds.py gravava cada registro com chamadas
+-- separadas ao PostgREST (select, depois update ou insert) e a regra
+-- "só atualiza — e só mexe em updated_at — se os contadores mudaram"
+-- era aplicada no cliente. Esta função recebe o dia inteiro como um
+-- array JSONB e, em um único INSERT ... ON CONFLICT:
+--   - insere as chaves (codigo_mv, data, nm_unidade) novas
+--   - atualiza só as linhas cujos 9 contadores, nome ou especialidade
+--     diferem (o trigger update_produtividade_updated_at só dispara nelas)
+--   - não toca nas iguais
+-- Retorna as contagens e as chaves gravadas (para a fila de recálculo).
+--
+-- Uso (supabase-py):
+--   sb.rpc('upsert_produtividade_batch', {'p_registros': [...]}).execute()
+-- =============================================================
+
+BEGIN;
+
+-- ─────────────────────────────────────────────────────────────
+-- 1. Função
+-- ─────────────────────────────────────────────────────────────
+CREATE OR REPLACE FUNCTION upsert_produtividade_batch(p_registros JSONB)
+RETURNS TABLE (
+    inseridos    INTEGER,
+    atualizados  INTEGER,
+    inalterados  INTEGER,
+    tocados      JSONB      -- [{codigo_mv, data}] inseridos ou atualizados
+)
+LANGUAGE sql
+SET search_path = public
+AS $$
+    WITH entrada AS (
+        -- Chave repetida no lote: vale a última ocorrência
+        SELECT DISTINCT ON (r.codigo_mv, r.data, r.nm_unidade) r.*
+        FROM ROWS FROM (
+            jsonb_to_recordset(p_registros) AS (
+                codigo_mv            TEXT,
+                data                 DATE,
+                nm_unidade           TEXT,
+                nome                 TEXT,
+                especialidade        TEXT,
+                prescricao           INTEGER,
+                diagnostico          INTEGER,
+                encaminhamento       INTEGER,
+                parecer              INTEGER,
+                anotacao             INTEGER,
+                avaliacao            INTEGER,
+                documento_eletronico INTEGER,
+                evolucao             INTEGER,
+                alta_medica          INTEGER
+            )
+        ) WITH ORDINALITY AS r(
+            codigo_mv, data, nm_unidade, nome, especialidade,
+            prescricao, diagnostico, encaminhamento, parecer, anotacao,
+            avaliacao, documento_eletronico, evolucao, alta_medica, ordem
+        )
+        ORDER BY r.codigo_mv, r.data, r.nm_unidade, r.ordem DESC
+    ),
+    gravados AS (
+        INSERT INTO produtividade AS p (
+            codigo_mv, data, nm_unidade, nome, especialidade,
+            prescricao, diagnostico, encaminhamento, parecer, anotacao,
+            avaliacao, documento_eletronico, evolucao, alta_medica
+        )
+        SELECT
+            codigo_mv, data, nm_unidade, COALESCE(nome, ''), especialidade,
+            COALESCE(prescricao, 0), COALESCE(diagnostico, 0), COALESCE(encaminhamento, 0),
+            COALESCE(parecer, 0), COALESCE(anotacao, 0), COALESCE(avaliacao, 0),
+            COALESCE(documento_eletronico, 0), COALESCE(evolucao, 0), COALESCE(alta_medica, 0)
+        FROM entrada
+        ON CONFLICT (codigo_mv, data, nm_unidade) DO UPDATE SET
+            nome                 = EXCLUDED.nome,
+            especialidade        = EXCLUDED.especialidade,
+            prescricao           = EXCLUDED.prescricao,
+            diagnostico          = EXCLUDED.diagnostico,
+            encaminhamento       = EXCLUDED.encaminhamento,
+            parecer              = EXCLUDED.parecer,
+            anotacao             = EXCLUDED.anotacao,
+            avaliacao            = EXCLUDED.avaliacao,
+            documento_eletronico = EXCLUDED.documento_eletronico,
+            evolucao             = EXCLUDED.evolucao,
+            alta_medica          = EXCLUDED.alta_medica
+        WHERE (p.prescricao, p.diagnostico, p.encaminhamento, p.parecer, p.anotacao,
+               p.avaliacao, p.documento_eletronico, p.evolucao, p.alta_medica,
+               p.nome, p.especialidade)
+              IS DISTINCT FROM
+              (EXCLUDED.prescricao, EXCLUDED.diagnostico, EXCLUDED.encaminhamento,
+               EXCLUDED.parecer, EXCLUDED.anotacao, EXCLUDED.avaliacao,
+               EXCLUDED.documento_eletronico, EXCLUDED.evolucao, EXCLUDED.alta_medica,
+               EXCLUDED.nome, EXCLUDED.especialidade)
+        RETURNING p.codigo_mv, p.data, (p.xmax = 0) AS inserido
+    )
+    SELECT
+        (COUNT(*) FILTER (WHERE inserido))::INTEGER,
+        (COUNT(*) FILTER (WHERE NOT inserido))::INTEGER,
+        ((SELECT COUNT(*) FROM entrada) - COUNT(*))::INTEGER,
+        COALESCE(jsonb_agg(jsonb_build_object('codigo_mv', codigo_mv, 'data', data)), '[]'::jsonb)
+    FROM gravados;
+$$;
+
+COMMENT ON FUNCTION upsert_produtividade_batch(JSONB) IS
+    'Upsert em lote de produtividade: insere chaves novas, atualiza só linhas com contadores, nome ou especialidade alterados; retorna inseridos/atualizados/inalterados';
+
+-- ─────────────────────────────────────────────────────────────
+-- 2. Permissões — apenas o service role (scripts)
+-- ─────────────────────────────────────────────────────────────
+REVOKE ALL ON FUNCTION upsert_produtividade_batch(JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION upsert_produtividade_batch(JSONB) TO service_role;
+
+COMMIT;
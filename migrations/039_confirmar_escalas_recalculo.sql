@@ -0,0 +1,60 @@
+-- =============================================================
+-- Migration 039 — Confirmação exata da fila de recálculo
+-- =============================================================
+-- O consumidor removia da escalas_recalculo_pendente tudo com
+-- atualizado_em <= maior valor lido. Como o trigger carimbava now()
+-- (início da transação), um enfileiramento concorrente podia gravar
+-- depois da leitura com um atualizado_em menor que essa marca e ser
+-- removido sem nunca ter sido processado.
+--
+--   - atualizado_em passa a usar clock_timestamp() (instante real da
+--     escrita), no DEFAULT e no trigger
+--   - confirmar_escalas_recalculo() remove só as linhas lidas, pelo par
+--     (id, atualizado_em) exato: uma chave tocada de novo depois da
+--     leitura tem outro atualizado_em e permanece na fila
+--
+-- Uso (supabase-py, fila_recalculo.confirmar):
+--   sb.rpc('confirmar_escalas_recalculo', {'p_lidos': [{id, atualizado_em}, ...]}).execute()
+-- =============================================================
+
+BEGIN;
+
+-- ─────────────────────────────────────────────────────────────
+-- 1. Carimbo no instante da escrita
+-- ─────────────────────────────────────────────────────────────
+ALTER TABLE escalas_recalculo_pendente
+    ALTER COLUMN atualizado_em SET DEFAULT clock_timestamp();
+
+CREATE OR REPLACE FUNCTION tocar_escalas_recalculo_pendente()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.atualizado_em := clock_timestamp();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ─────────────────────────────────────────────────────────────
+-- 2. Remoção das linhas lidas
+-- ─────────────────────────────────────────────────────────────
+CREATE OR REPLACE FUNCTION confirmar_escalas_recalculo(p_lidos JSONB)
+RETURNS INTEGER
+LANGUAGE sql
+SET search_path = public
+AS $$
+    WITH removidas AS (
+        DELETE FROM escalas_recalculo_pendente f
+        USING jsonb_to_recordset(p_lidos) AS l(id BIGINT, atualizado_em TIMESTAMPTZ)
+        WHERE f.id = l.id
+          AND f.atualizado_em = l.atualizado_em
+        RETURNING 1
+    )
+    SELECT COUNT(*)::INTEGER FROM removidas;
+$$;
+
+COMMENT ON FUNCTION confirmar_escalas_recalculo(JSONB) IS
+    'Remove da fila de recálculo as linhas consumidas, pelo par (id, atualizado_em) lido; retorna quantas';
+
+REVOKE ALL ON FUNCTION confirmar_escalas_recalculo(JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION confirmar_escalas_recalculo(JSONB) TO service_role;
+
+COMMIT;
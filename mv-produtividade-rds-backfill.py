@@ -5,6 +5,8 @@ Mesmo fluxo de mv-produtividade-rds.py, mas processa uma lista de datas
 específicas em vez de apenas ONTEM.
 
 Edite DATAS abaixo para definir quais dias serão (re)processados.
+Dias já consultados depois da janela mutável vêm do cache local
+(cache_documentos_rds.py); IGNORAR_CACHE força a ida ao RDS.
 """
 
 import os
@@ -12,11 +14,12 @@ import csv
 import logging
 from datetime import date
 
-import psycopg2
-import psycopg2.extras
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+import conexao_rds
+from cache_documentos_rds import CacheDocumentosRDS
+
 # ============================================================
 # CONFIGURAÇÕES
 # ============================================================
@@ -33,14 +36,6 @@ logger = logging.getLogger(__name__)
 SUPABASE_URL = os.getenv("VITE_SUPABASE_URL")
 SUPABASE_KEY = os.getenv("VITE_SUPABASE_SERVICE_ROLE_KEY")
 
-RDS_CONFIG = dict(
-    host="db-rds-postgres.cx4bovrfmkbp.sa-east-1.rds.amazonaws.com",
-    database="db_rds_01",
-    user="gest_contratos",
-    password="asdgRTFG98",
-    port="5432",
-)
-
 NM_BANCOS = [
     "producao_ses_go",   # Goiás    → HUGOL, HECAD, CRER
     "producao_ses_ms",   # Mato Grosso do Sul
@@ -99,6 +94,10 @@ DATAS: list[date] = [
     date(2026, 8, 4),
 ]
 
+# True: reconsulta o RDS para todas as DATAS mesmo que o cache local já as
+# tenha como definitivas (o cache é atualizado com o resultado)
+IGNORAR_CACHE = False
+
 # ============================================================
 # UTILITÁRIOS
 # ============================================================
@@ -166,7 +165,7 @@ def buscar_prestadores() -> list:
 # ============================================================
 
 def detectar_colunas(cur) -> dict:
-    cur.execute("""
+    conexao_rds.executar(cur, """
         SELECT column_name
         FROM information_schema.columns
         WHERE table_schema = 'assistencial'
@@ -199,7 +198,17 @@ def detectar_colunas(cur) -> dict:
     return mapa
 
 
-def consultar_rds(prestadores: list, data_iso: str) -> tuple:
+_MAPA_COLUNAS: dict = {}
+
+
+def _colunas_documento(cur) -> dict:
+    """detectar_colunas uma vez por execução (a estrutura não muda entre os dias)."""
+    if not _MAPA_COLUNAS:
+        _MAPA_COLUNAS.update(detectar_colunas(cur))
+    return _MAPA_COLUNAS
+
+
+def consultar_rds(prestadores: list, data_iso: str, cache: CacheDocumentosRDS) -> tuple:
     """
     Retorna (rows, pares_validos) para a data especificada.
     """
@@ -231,63 +240,63 @@ def consultar_rds(prestadores: list, data_iso: str) -> tuple:
     logger.info(f"  Prestadores válidos: {len(cd_prestadores)} (únicos)")
     logger.info(f"  Unidades  : {nm_unidades}")
 
-    conn = psycopg2.connect(**RDS_CONFIG)
-    conn.set_session(readonly=True, autocommit=True)
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    faltantes = sorted(cd_prestadores) if IGNORAR_CACHE else cache.pendentes(data_iso, cd_prestadores)
+    logger.info(f"  Cache     : {len(cd_prestadores) - len(faltantes)} prestador(es) do cache local, "
+                f"{len(faltantes)} a consultar no RDS")
+    if faltantes:
+        cache.gravar(data_iso, faltantes, _agregar_documentos(faltantes, cd_tipos, data_iso))
 
-    mapa  = detectar_colunas(cur)
-    col_p = mapa["prestador"]
-    col_t = mapa["tipo"]
-    col_d = mapa["data"]
-    col_u = mapa["unidade"]
-    col_b = mapa["banco"]
+    rows = cache.contagens(data_iso, cd_prestadores)
+    logger.info(f"  {len(rows)} linhas de contagem para {data_iso}")
+    return rows, pares_validos
 
-    sel_unidade = col_u if col_u else "'N/D'"
-    sel_banco   = col_b if col_b else "'N/D'"
 
-    filtro_banco = (
-        f"AND {col_b} IN ({', '.join(['%s'] * len(NM_BANCOS))})"
-        if col_b else ""
-    )
-    filtro_unidade = (
-        f"AND {col_u} IN ({', '.join(['%s'] * len(nm_unidades))})"
-        if col_u and nm_unidades else ""
-    )
-
-    sql = f"""
-        SELECT
-            {col_p}       AS cd_prestador,
-            {col_t}       AS cd_tipo_documento,
-            {sel_unidade} AS nm_unidade,
-            {sel_banco}   AS nm_banco,
-            COUNT(*)      AS total
-        FROM {TABELA_DOC}
-        WHERE {col_p} IN ({', '.join(['%s'] * len(cd_prestadores))})
-          AND {col_t}  IN ({', '.join(['%s'] * len(cd_tipos))})
-          AND {col_d}  >= %s
-          AND {col_d}  <= %s
-          {filtro_banco}
-          {filtro_unidade}
-        GROUP BY {col_p}, {col_t}, {sel_unidade}, {sel_banco}
-        ORDER BY {col_p}, nm_unidade, {col_t}
+def _agregar_documentos(cd_prestadores: list, cd_tipos: list, data_iso: str) -> list:
     """
-
-    params = (
-        cd_prestadores
-        + cd_tipos
-        + [f"{data_iso} 00:00:00", f"{data_iso} 23:59:59"]
-        + (NM_BANCOS if col_b else [])
-        + (nm_unidades if col_u and nm_unidades else [])
-    )
-
-    logger.info("  Executando query...")
-    cur.execute(sql, params)
-    rows = [dict(r) for r in cur.fetchall()]
+    Contagens do dia no RDS por (prestador, tipo, unidade, banco).
+    Sem filtro de unidade: o cache guarda todas as unidades do prestador e
+    pivotar() descarta os pares (prestador, unidade) não autorizados.
+    """
+    with conexao_rds.cursor() as cur:
+        mapa = _colunas_documento(cur)
+        col_p = mapa["prestador"]
+        col_t = mapa["tipo"]
+        col_d = mapa["data"]
+        col_u = mapa["unidade"]
+        col_b = mapa["banco"]
+
+        sel_unidade = col_u if col_u else "'N/D'"
+        sel_banco   = col_b if col_b else "'N/D'"
+
+        # Listas como arrays (= ANY($n)): o texto do SQL não muda com a quantidade
+        # de prestadores, então o mesmo prepared statement serve para todos os dias
+        params = [cd_prestadores, cd_tipos, f"{data_iso} 00:00:00", f"{data_iso} 23:59:59"]
+        filtro_banco = ""
+        if col_b:
+            params.append(NM_BANCOS)
+            filtro_banco = f"AND {col_b} = ANY($5)"
+
+        sql = f"""
+            SELECT
+                {col_p}       AS cd_prestador,
+                {col_t}       AS cd_tipo_documento,
+                {sel_unidade} AS nm_unidade,
+                {sel_banco}   AS nm_banco,
+                COUNT(*)      AS total
+            FROM {TABELA_DOC}
+            WHERE {col_p} = ANY($1)
+              AND {col_t} = ANY($2)
+              AND {col_d} >= $3
+              AND {col_d} <= $4
+              {filtro_banco}
+            GROUP BY {col_p}, {col_t}, {sel_unidade}, {sel_banco}
+        """
+
+        logger.info(f"  Executando query ({len(cd_prestadores)} prestador(es))...")
+        conexao_rds.executar_preparada(cur, "agregacao_documentos", sql, params)
+        rows = [dict(r) for r in cur.fetchall()]
     logger.info(f"  {len(rows)} linhas retornadas do RDS")
-
-    cur.close()
-    conn.close()
-    return rows, pares_validos
+    return rows
 
 
 # ============================================================
@@ -428,6 +437,7 @@ def main():
         return
 
     sb: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    cache = CacheDocumentosRDS()
 
     todos_detalhe:  list = []
     todos_resumo:   list = []
@@ -439,7 +449,7 @@ def main():
 
         separador(f"Data: {data_br}")
 
-        rows, pares_validos = consultar_rds(prestadores, data_iso)
+        rows, pares_validos = consultar_rds(prestadores, data_iso, cache)
 
         if not rows:
             logger.warning(f"  Nenhum documento encontrado para {data_br}. Pulando.")
@@ -459,10 +469,15 @@ def main():
     salvar_csv(f"mv_backfill_detalhe_{datas_str}.csv", todos_detalhe)
     salvar_csv(f"mv_backfill_resumo_{datas_str}.csv",  todos_resumo)
 
+    cache.fechar()
+
     separador("CONCLUÍDO")
     logger.info(f"  {len(DATAS)} datas processadas, {total_inseridos} registros enviados ao Supabase")
     logger.info(f"  CSVs em: {DOWNLOADS}/")
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        conexao_rds.fechar()
@@ -17,11 +17,12 @@ import csv
 import logging
 from datetime import date, timedelta
 
-import psycopg2
 import psycopg2.extras
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+import conexao_rds
+
 # ============================================================
 # CONFIGURAÇÕES
 # ============================================================
@@ -38,14 +39,6 @@ logger = logging.getLogger(__name__)
 SUPABASE_URL = os.getenv("VITE_SUPABASE_URL")
 SUPABASE_KEY = os.getenv("VITE_SUPABASE_SERVICE_ROLE_KEY")
 
-RDS_CONFIG = dict(
-    host="db-rds-postgres.cx4bovrfmkbp.sa-east-1.rds.amazonaws.com",
-    database="db_rds_01",
-    user="gest_contratos",
-    password="asdgRTFG98",
-    port="5432",
-)
-
 NM_BANCOS = [
     "producao_ses_go",
     "producao_ses_ms",
@@ -274,8 +267,7 @@ def consultar_rds(prestadores: list) -> tuple:
     logger.info(f"  Tipos doc ({len(cd_tipos)}): {cd_tipos}")
     logger.info(f"  Bancos    : {NM_BANCOS}")
 
-    conn = psycopg2.connect(**RDS_CONFIG)
-    conn.set_session(readonly=True, autocommit=True)
+    conn = conexao_rds.conectar()
     cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
     logger.info("  Detectando colunas...")
@@ -327,7 +319,7 @@ def consultar_rds(prestadores: list) -> tuple:
     )
 
     logger.info("  Executando query...")
-    cur.execute(sql, params)
+    conexao_rds.executar(cur, sql, params, rotulo="agregacao_documentos")
     rows = [dict(r) for r in cur.fetchall()]
     logger.info(f"  {len(rows)} linhas retornadas")
 
@@ -439,8 +431,7 @@ def explorar_atendime_completo(cd_prestadores: list):
     """
     separador("EXPLORAÇÃO — assistencial.atendime_completo")
 
-    conn = psycopg2.connect(**RDS_CONFIG)
-    conn.set_session(readonly=True, autocommit=True)
+    conn = conexao_rds.conectar()
     cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
     # ── 1. Verificar acesso ──────────────────────────────────
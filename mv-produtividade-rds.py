@@ -9,9 +9,10 @@ Fluxo ao rodar (diariamente às 13h BRT via cron):
     1. Busca entradas de usuario_codigomv no Supabase
     2. Consulta pw_documento_clinico_completo no RDS para D-1
     3. Pivota contagens por CD_TIPO_DOCUMENTO → 9 colunas de produtividade
-    4. Upsert no Supabase (chave: codigo_mv + data + nm_unidade)
+    4. Upsert no Supabase (chave: codigo_mv + data + nm_unidade) pela RPC
+       upsert_produtividade_batch (migration 038), uma chamada por dia
        - INSERT: seta created_at e updated_at via default do banco
-       - UPDATE: sempre sobrescreve e atualiza updated_at
+       - UPDATE: só nas linhas cujos contadores mudaram (updated_at idem)
 
   FASE 2 — Revisão retroativa (D-2 a D-8):
     A tabela pw_documento_clinico_completo pode sofrer alterações por até
@@ -19,20 +20,29 @@ Fluxo ao rodar (diariamente às 13h BRT via cron):
     reprocessa os 7 dias anteriores a D-1 e corrige o Supabase apenas
     quando os valores de produtividade mudaram (updated_at é atualizado
     somente em caso de alteração real, preservando o histórico de created_at).
+    A comparação usa o hash dos 9 contadores (coluna hash_contadores,
+    migration 037): uma leitura por dia e só os registros alterados são enviados.
 
   FASE 3 — CSV de auditoria em ~/Downloads/
+
+As contagens do RDS passam pelo cache local cache_documentos_rds.py
+(RDS_CACHE_DB): cada (dia, prestador) só é reconsultado enquanto o dia está
+na janela retroativa; depois disso a última consulta vale para sempre.
 """
 
 import os
 import csv
+import hashlib
 import logging
-from datetime import date, timedelta, datetime, timezone
+from datetime import date, timedelta, datetime
 
-import psycopg2
-import psycopg2.extras
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+import conexao_rds
+from cache_documentos_rds import CacheDocumentosRDS
+from fila_recalculo import enfileirar_produtividade
+
 # ============================================================
 # CONFIGURAÇÕES
 # ============================================================
@@ -49,14 +59,6 @@ logger = logging.getLogger(__name__)
 SUPABASE_URL = os.getenv("VITE_SUPABASE_URL")
 SUPABASE_KEY = os.getenv("VITE_SUPABASE_SERVICE_ROLE_KEY")
 
-RDS_CONFIG = dict(
-    host="db-rds-postgres.cx4bovrfmkbp.sa-east-1.rds.amazonaws.com",
-    database="db_rds_01",
-    user="gest_contratos",
-    password="asdgRTFG98",
-    port="5432",
-)
-
 NM_BANCOS = [
     "producao_ses_go",   # Goiás    → HUGOL, HECAD, CRER
     "producao_ses_ms",   # Mato Grosso do Sul
@@ -96,6 +98,9 @@ MAPA_PRODUTIVIDADE = {
 
 PROD_COLS = list(MAPA_PRODUTIVIDADE.keys())   # lista das 9 colunas de produtividade
 
+PAGE_SIZE = 1000   # máximo por requisição no Supabase
+LOTE_RPC  = 2000   # registros por chamada de upsert_produtividade_batch
+
 # Quantos dias retroativos verificar após D-1 (D-2 até D-(JANELA+1))
 JANELA_RETROATIVA_DIAS = 7
 
@@ -121,11 +126,6 @@ def separador(titulo=""):
         logger.info("=" * 60)
 
 
-def now_utc_iso() -> str:
-    """Retorna o instante atual em UTC no formato ISO 8601."""
-    return datetime.now(timezone.utc).isoformat()
-
-
 def salvar_csv(nome_arquivo: str, linhas: list):
     if not linhas:
         logger.warning(f"  Sem dados — {nome_arquivo} não gerado")
@@ -182,7 +182,7 @@ def buscar_prestadores(sb: Client) -> list:
 # ============================================================
 
 def detectar_colunas(cur) -> dict:
-    cur.execute("""
+    conexao_rds.executar(cur, """
         SELECT column_name
         FROM information_schema.columns
         WHERE table_schema = 'assistencial'
@@ -217,7 +217,17 @@ def detectar_colunas(cur) -> dict:
     return mapa
 
 
-def consultar_rds(prestadores: list, data_iso: str) -> tuple:
+_MAPA_COLUNAS: dict = {}
+
+
+def _colunas_documento(cur) -> dict:
+    """detectar_colunas uma vez por execução (a estrutura não muda entre os dias)."""
+    if not _MAPA_COLUNAS:
+        _MAPA_COLUNAS.update(detectar_colunas(cur))
+    return _MAPA_COLUNAS
+
+
+def consultar_rds(prestadores: list, data_iso: str, cache: CacheDocumentosRDS) -> tuple:
     """
     Consulta o RDS para a data indicada (YYYY-MM-DD).
     Retorna (rows, pares_validos) onde:
@@ -254,63 +264,63 @@ def consultar_rds(prestadores: list, data_iso: str) -> tuple:
     logger.info(f"  Unidades  : {nm_unidades}")
     logger.info(f"  Bancos    : {NM_BANCOS}")
 
-    conn = psycopg2.connect(**RDS_CONFIG)
-    conn.set_session(readonly=True, autocommit=True)
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    faltantes = cache.pendentes(data_iso, cd_prestadores)
+    logger.info(f"  Cache     : {len(cd_prestadores) - len(faltantes)} prestador(es) do cache local, "
+                f"{len(faltantes)} a consultar no RDS")
+    if faltantes:
+        cache.gravar(data_iso, faltantes, _agregar_documentos(faltantes, cd_tipos, data_iso))
 
-    mapa = detectar_colunas(cur)
-    col_p = mapa["prestador"]
-    col_t = mapa["tipo"]
-    col_d = mapa["data"]
-    col_u = mapa["unidade"]
-    col_b = mapa["banco"]
+    rows = cache.contagens(data_iso, cd_prestadores)
+    logger.info(f"  {len(rows)} linhas de contagem para {data_iso}")
+    return rows, pares_validos
 
-    sel_unidade = col_u if col_u else "'N/D'"
-    sel_banco   = col_b if col_b else "'N/D'"
 
-    filtro_banco = (
-        f"AND {col_b} IN ({', '.join(['%s'] * len(NM_BANCOS))})"
-        if col_b else ""
-    )
-    filtro_unidade = (
-        f"AND {col_u} IN ({', '.join(['%s'] * len(nm_unidades))})"
-        if col_u and nm_unidades else ""
-    )
-
-    sql = f"""
-        SELECT
-            {col_p}       AS cd_prestador,
-            {col_t}       AS cd_tipo_documento,
-            {sel_unidade} AS nm_unidade,
-            {sel_banco}   AS nm_banco,
-            COUNT(*)      AS total
-        FROM {TABELA_DOC}
-        WHERE {col_p} IN ({', '.join(['%s'] * len(cd_prestadores))})
-          AND {col_t}  IN ({', '.join(['%s'] * len(cd_tipos))})
-          AND {col_d}  >= %s
-          AND {col_d}  <= %s
-          {filtro_banco}
-          {filtro_unidade}
-        GROUP BY {col_p}, {col_t}, {sel_unidade}, {sel_banco}
-        ORDER BY {col_p}, nm_unidade, {col_t}
+def _agregar_documentos(cd_prestadores: list, cd_tipos: list, data_iso: str) -> list:
     """
-
-    params = (
-        cd_prestadores
-        + cd_tipos
-        + [f"{data_iso} 00:00:00", f"{data_iso} 23:59:59"]
-        + (NM_BANCOS if col_b else [])
-        + (nm_unidades if col_u and nm_unidades else [])
-    )
-
-    logger.info("  Executando query...")
-    cur.execute(sql, params)
-    rows = [dict(r) for r in cur.fetchall()]
+    Contagens do dia no RDS por (prestador, tipo, unidade, banco).
+    Sem filtro de unidade: o cache guarda todas as unidades do prestador e
+    pivotar() descarta os pares (prestador, unidade) não autorizados.
+    """
+    with conexao_rds.cursor() as cur:
+        mapa = _colunas_documento(cur)
+        col_p = mapa["prestador"]
+        col_t = mapa["tipo"]
+        col_d = mapa["data"]
+        col_u = mapa["unidade"]
+        col_b = mapa["banco"]
+
+        sel_unidade = col_u if col_u else "'N/D'"
+        sel_banco   = col_b if col_b else "'N/D'"
+
+        # Listas como arrays (= ANY($n)): o texto do SQL não muda com a quantidade
+        # de prestadores, então o mesmo prepared statement serve para todos os dias
+        params = [cd_prestadores, cd_tipos, f"{data_iso} 00:00:00", f"{data_iso} 23:59:59"]
+        filtro_banco = ""
+        if col_b:
+            params.append(NM_BANCOS)
+            filtro_banco = f"AND {col_b} = ANY($5)"
+
+        sql = f"""
+            SELECT
+                {col_p}       AS cd_prestador,
+                {col_t}       AS cd_tipo_documento,
+                {sel_unidade} AS nm_unidade,
+                {sel_banco}   AS nm_banco,
+                COUNT(*)      AS total
+            FROM {TABELA_DOC}
+            WHERE {col_p} = ANY($1)
+              AND {col_t} = ANY($2)
+              AND {col_d} >= $3
+              AND {col_d} <= $4
+              {filtro_banco}
+            GROUP BY {col_p}, {col_t}, {sel_unidade}, {sel_banco}
+        """
+
+        logger.info(f"  Executando query ({len(cd_prestadores)} prestador(es))...")
+        conexao_rds.executar_preparada(cur, "agregacao_documentos", sql, params)
+        rows = [dict(r) for r in cur.fetchall()]
     logger.info(f"  {len(rows)} linhas retornadas do RDS")
-
-    cur.close()
-    conn.close()
-    return rows, pares_validos
+    return rows
 
 
 # ============================================================
@@ -401,13 +411,46 @@ def pivotar(rows: list, prestadores: list, pares_validos: set, data_iso: str) ->
 
 
 # ============================================================
-# PASSO 4a — Upsert D-1 (sempre grava, atualiza updated_at)
+# PASSO 4 — Gravação em lote (RPC upsert_produtividade_batch)
+# ============================================================
+
+CAMPOS_RPC = ["codigo_mv", "data", "nm_unidade", "nome", "especialidade", *PROD_COLS]
+
+
+def gravar_lote(sb: Client, registros: list) -> dict:
+    """
+    Grava os registros via RPC upsert_produtividade_batch (migration 038): insere
+    chaves novas e atualiza só as linhas com contadores, nome ou especialidade
+    diferentes, em um único statement por lote de LOTE_RPC registros.
+    Cada lote é uma transação própria: a falha de um lote é logada e contada em
+    `erros`, e os lotes já gravados continuam em `tocados` (para a fila de recálculo).
+    Retorna {inseridos, atualizados, inalterados, erros, tocados: [{codigo_mv, data}]}.
+    """
+    total = {"inseridos": 0, "atualizados": 0, "inalterados": 0, "erros": 0, "tocados": []}
+    for i in range(0, len(registros), LOTE_RPC):
+        lote = registros[i:i + LOTE_RPC]
+        payload = [{campo: reg.get(campo) for campo in CAMPOS_RPC} for reg in lote]
+        try:
+            resp = sb.rpc("upsert_produtividade_batch", {"p_registros": payload}).execute()
+        except Exception as e:
+            logger.error(f"  [ERR] upsert_produtividade_batch (registros {i + 1}-{i + len(lote)}): {e}")
+            total["erros"] += len(lote)
+            continue
+        linha = (resp.data or [{}])[0]
+        for campo in ("inseridos", "atualizados", "inalterados"):
+            total[campo] += int(linha.get(campo) or 0)
+        total["tocados"].extend(linha.get("tocados") or [])
+    return total
+
+
+# ============================================================
+# PASSO 4a — Upsert D-1
 # ============================================================
 
 def upsert_supabase(sb: Client, registros: list):
     """
-    Fase 1: insere ou atualiza os registros de D-1.
-    Em UPDATE, sempre seta updated_at = agora (dados frescos do RDS).
+    Fase 1: insere ou atualiza os registros de D-1 em uma chamada por lote.
+    updated_at só muda nas linhas cujos contadores, nome ou especialidade mudaram.
     """
     separador("PASSO 4a — Upsert D-1 no Supabase")
 
@@ -415,124 +458,107 @@ def upsert_supabase(sb: Client, registros: list):
         logger.warning("  Nenhum registro para inserir.")
         return
 
-    sucesso = erros = 0
-
-    for reg in registros:
-        try:
-            existing = (
-                sb.table("produtividade")
-                .select("id")
-                .eq("codigo_mv",  reg["codigo_mv"])
-                .eq("data",       reg["data"])
-                .eq("nm_unidade", reg["nm_unidade"])
-                .execute()
-            )
-
-            payload = {k: v for k, v in reg.items()
-                       if k not in ("codigo_mv", "data", "nm_unidade")}
-
-            if existing.data:
-                payload["updated_at"] = now_utc_iso()
-                sb.table("produtividade").update(payload).eq(
-                    "id", existing.data[0]["id"]
-                ).execute()
-                logger.info(f"  [UPD] {reg['nome']} / {reg['nm_unidade']} — {reg['data']}")
-            else:
-                payload["codigo_mv"]  = reg["codigo_mv"]
-                payload["data"]       = reg["data"]
-                payload["nm_unidade"] = reg["nm_unidade"]
-                sb.table("produtividade").insert(payload).execute()
-                logger.info(f"  [INS] {reg['nome']} / {reg['nm_unidade']} — {reg['data']}")
-
-            sucesso += 1
+    resultado = gravar_lote(sb, registros)
 
-        except Exception as e:
-            logger.error(f"  [ERR] {reg.get('nome', '?')} / {reg.get('nm_unidade', '?')}: {e}")
-            erros += 1
+    logger.info(
+        f"\n  Resultado: {resultado['inseridos']} inseridos, {resultado['atualizados']} atualizados, "
+        f"{resultado['inalterados']} sem alteração, {resultado['erros']} erros"
+    )
 
-    logger.info(f"\n  Resultado: {sucesso} ok, {erros} erros")
+    # Mesmo com lotes falhos, o que foi gravado precisa ser recalculado
+    chaves = enfileirar_produtividade(sb, resultado["tocados"])
+    logger.info(f"  {chaves} chave(s) (codigo_mv, data) enfileiradas para recálculo de escalas")
 
 
 # ============================================================
 # PASSO 4b — Revisão retroativa D-2 a D-8
 # ============================================================
 
+def hash_contadores(reg: dict) -> str:
+    """Mesma fórmula da coluna gerada produtividade.hash_contadores (migration 037)."""
+    texto = "|".join(str(int(reg.get(col) or 0)) for col in PROD_COLS)
+    return hashlib.md5(texto.encode()).hexdigest()[:16]
+
+
+def buscar_hashes_dia(sb: Client, data_iso: str) -> dict:
+    """(codigo_mv, nm_unidade) → hash_contadores de todos os registros do dia, em páginas."""
+    hashes = {}
+    offset = 0
+    while True:
+        resp = (
+            sb.table("produtividade")
+            .select("codigo_mv, nm_unidade, hash_contadores")
+            .eq("data", data_iso)
+            .order("codigo_mv")
+            .order("nm_unidade")
+            .range(offset, offset + PAGE_SIZE - 1)
+            .execute()
+        )
+        lote = resp.data or []
+        for r in lote:
+            hashes[(r["codigo_mv"], r["nm_unidade"])] = r["hash_contadores"]
+        if len(lote) < PAGE_SIZE:
+            break
+        offset += PAGE_SIZE
+    return hashes
+
+
 def revisar_retroativo(sb: Client, registros_novos: list):
     """
-    Fase 2: para dias anteriores (D-2 a D-8), compara as 9 colunas de
-    produtividade com o que já existe no Supabase.
+    Fase 2: para dias anteriores (D-2 a D-8), compara o hash das 9 colunas
+    de produtividade recalculadas do RDS com o hash gravado no Supabase
+    (uma leitura por dia, em vez de uma por registro).
 
     - Se o registro não existir → INSERT (dado que chegou com atraso)
-    - Se existir e os valores mudaram → UPDATE + atualiza updated_at
-    - Se existir e os valores são iguais → sem alteração (updated_at preservado)
+    - Se existir e o hash mudou → UPDATE (o trigger atualiza updated_at)
+    - Se existir e o hash é igual → nada é enviado (updated_at preservado)
+
+    Inserts e updates vão juntos para gravar_lote(); as contagens finais
+    são as da função (que confere os contadores de novo no banco).
     """
     if not registros_novos:
         logger.info("  Sem registros do RDS para esta data.")
         return
 
-    alterados = inseridos = iguais = erros = 0
+    data_iso = registros_novos[0]["data"]
+    existentes = buscar_hashes_dia(sb, data_iso)
+    logger.info(f"  {len(existentes)} registro(s) de {data_iso} no Supabase (hash)")
+
+    enviar = []
 
     for reg in registros_novos:
-        try:
-            existing_resp = (
-                sb.table("produtividade")
-                .select("id, " + ", ".join(PROD_COLS))
-                .eq("codigo_mv",  reg["codigo_mv"])
-                .eq("data",       reg["data"])
-                .eq("nm_unidade", reg["nm_unidade"])
-                .execute()
-            )
-
-            if not existing_resp.data:
-                # Registro inexistente — insere (dado retroativo)
-                sb.table("produtividade").insert(reg).execute()
-                logger.info(
-                    f"  [INS-RETRO] {reg['nome']} / {reg['nm_unidade']} — {reg['data']}"
-                )
-                inseridos += 1
-                continue
-
-            existente = existing_resp.data[0]
-
-            # Compara as 9 colunas
-            mudou = any(
-                int(existente.get(col) or 0) != int(reg.get(col) or 0)
-                for col in PROD_COLS
-            )
-
-            if mudou:
-                payload = {col: reg[col] for col in PROD_COLS}
-                payload["updated_at"] = now_utc_iso()
-                sb.table("produtividade").update(payload).eq(
-                    "id", existente["id"]
-                ).execute()
-                diffs = [
-                    f"{col}: {existente.get(col) or 0}→{reg.get(col) or 0}"
-                    for col in PROD_COLS
-                    if int(existente.get(col) or 0) != int(reg.get(col) or 0)
-                ]
-                logger.info(
-                    f"  [UPD-RETRO] {reg['nome']} / {reg['nm_unidade']} — {reg['data']}  "
-                    f"({', '.join(diffs)})"
-                )
-                alterados += 1
-            else:
-                logger.info(
-                    f"  [=] {reg['nome']} / {reg['nm_unidade']} — {reg['data']}  sem alteração"
-                )
-                iguais += 1
+        chave = (reg["codigo_mv"], reg["nm_unidade"])
+        novo = hash_contadores(reg)
+        atual = existentes.get(chave)
+
+        if atual is None:
+            logger.info(f"  [INS-RETRO] {reg['nome']} / {reg['nm_unidade']} — {reg['data']}")
+        elif atual != novo:
+            logger.info(f"  [UPD-RETRO] {reg['nome']} / {reg['nm_unidade']} — {reg['data']}  "
+                        f"(hash {atual}→{novo})")
+        else:
+            continue
+        enviar.append(reg)
 
-        except Exception as e:
-            logger.error(
-                f"  [ERR] {reg.get('nome', '?')} / {reg.get('nm_unidade', '?')}: {e}"
-            )
-            erros += 1
+    inseridos = alterados = erros = 0
+    iguais = len(registros_novos) - len(enviar)
+    tocados = []
+    if enviar:
+        resultado = gravar_lote(sb, enviar)
+        inseridos, alterados, erros = resultado["inseridos"], resultado["atualizados"], resultado["erros"]
+        iguais += resultado["inalterados"]
+        tocados = resultado["tocados"]
 
     logger.info(
         f"\n  Resultado retroativo: {inseridos} inseridos, "
         f"{alterados} atualizados, {iguais} sem alteração, {erros} erros"
     )
 
+    # Só dados que chegaram ou mudaram afetam o status das escalas
+    if tocados:
+        chaves = enfileirar_produtividade(sb, tocados)
+        logger.info(f"  {chaves} chave(s) (codigo_mv, data) enfileiradas para recálculo de escalas")
+
 
 # ============================================================
 # MAIN
@@ -562,12 +588,15 @@ def main():
         logger.warning("Nenhuma entrada em usuario_codigomv. Encerrando.")
         return
 
+    # Contagens já consultadas: dias fora da janela retroativa não voltam ao RDS
+    cache = CacheDocumentosRDS(janela_mutavel_dias=JANELA_RETROATIVA_DIAS)
+
     # ── FASE 1: D-1 (dados frescos, sempre upsert) ───────────────────────────
 
     separador(f"FASE 1 — Inserção D-1: {ontem.isoformat()}")
 
     data_iso_ontem = ontem.isoformat()
-    rows, pares_validos = consultar_rds(prestadores, data_iso_ontem)
+    rows, pares_validos = consultar_rds(prestadores, data_iso_ontem, cache)
 
     if rows:
         registros_prod, detalhe = pivotar(rows, prestadores, pares_validos, data_iso_ontem)
@@ -587,7 +616,7 @@ def main():
 
         separador(f"  Revisando D-{dias_atras}: {data_iso}")
 
-        rows_retro, _ = consultar_rds(prestadores, data_iso)
+        rows_retro, _ = consultar_rds(prestadores, data_iso, cache)
 
         if not rows_retro:
             logger.info(f"  Sem dados no RDS para {data_iso}.")
@@ -596,9 +625,16 @@ def main():
         registros_retro, _ = pivotar(rows_retro, prestadores, pares_validos, data_iso)
         revisar_retroativo(sb, registros_retro)
 
+    resumo_cache = cache.resumo()
+    cache.fechar()
+
     separador("CONCLUÍDO")
     logger.info(f"  CSVs em: {DOWNLOADS}/")
+    logger.info(f"  Cache RDS : {cache.caminho} ({resumo_cache['dias']} dias, {resumo_cache['linhas']} linhas)")
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        conexao_rds.fechar()
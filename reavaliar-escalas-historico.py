@@ -0,0 +1,450 @@
+"""
+reavaliar-escalas-historico.py
+==============================
+Reavaliação histórica (what-if) das regras de presença sobre um intervalo de datas.
+
+Quando as tolerâncias do verificar-presenca-escalas.py mudam (janela de busca de
+2.5h ao redor do turno, tolerância de 1h na carga horária), este script mede o
+impacto em meses de escalas de uma vez:
+
+  1. Carrega uma única vez as escalas do intervalo (status reavaliáveis), as
+     dimensões (contrato → unidade, CPF → códigos MV), os acessos e a
+     produtividade do período, em consultas paginadas
+  2. Avalia todas as escalas em um pool de processos, com as mesmas regras do
+     job diário (regras_presenca.py) e os parâmetros informados
+  3. Gera um CSV com as escalas cujo status mudaria (atual → novo) e um
+     resumo das transições no log
+  4. Com --commit, grava os novos status (só onde o status não mudou desde a leitura)
+
+Uso:
+    python reavaliar-escalas-historico.py --inicio 2026-01-01 --fim 2026-03-31
+    python reavaliar-escalas-historico.py --inicio 2026-01-01 --fim 2026-03-31 \\
+        --janela-busca 3 --tolerancia 1.5 --processos 8 --saida diff.csv --commit
+"""
+
+import os
+import csv
+import argparse
+import logging
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from dotenv import load_dotenv
+from supabase import create_client, Client
+
+from janelas_turno import calcular_janelas, epoch_segundos
+from loja_acessos import carregar_timestamps
+from regras_presenca import (
+    JANELA_BUSCA_HORAS, TOLERANCIA_HORAS, STATUS_REAVALIAVEIS, BRT_TO_UTC,
+    classificar_presenca, resultado_produtividade, status_por_resultados,
+)
+
+# ============================================================
+# CONFIGURAÇÕES
+# ============================================================
+
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env'))
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+SUPABASE_URL = os.getenv('SUPABASE_URL') or os.getenv('VITE_SUPABASE_URL')
+SUPABASE_KEY = os.getenv('SUPABASE_SERVICE_KEY') or os.getenv('VITE_SUPABASE_SERVICE_ROLE_KEY')
+
+PAGE_SIZE = 1000      # máximo por requisição no Supabase
+LOTE_IN = 100         # valores por filtro in_ (mantém a URL curta)
+LOTE_AVALIACAO = 200  # escalas por tarefa enviada ao pool
+
+COLUNAS_PRODUTIVIDADE = [
+    "prescricao", "diagnostico", "encaminhamento", "parecer", "anotacao",
+    "avaliacao", "documento_eletronico", "evolucao", "alta_medica",
+]
+
+
+def separador(titulo: str = ""):
+    logger.info("=" * 60)
+    if titulo:
+        logger.info(f"  {titulo}")
+        logger.info("=" * 60)
+
+
+# ============================================================
+# CARGA (uma vez para todo o intervalo)
+# ============================================================
+
+def buscar_paginado(montar_query) -> list:
+    """Executa uma consulta paginada; `montar_query` devolve uma query nova com ordenação estável."""
+    linhas = []
+    offset = 0
+
+    while True:
+        resp = montar_query().range(offset, offset + PAGE_SIZE - 1).execute()
+        lote = resp.data or []
+        linhas.extend(lote)
+
+        if len(lote) < PAGE_SIZE:
+            break
+        offset += PAGE_SIZE
+
+    return linhas
+
+
+def buscar_em_lotes(valores, montar_query) -> list:
+    """Executa `montar_query(lote)` paginada para cada lote de LOTE_IN valores."""
+    valores = sorted(valores)
+    linhas = []
+    for i in range(0, len(valores), LOTE_IN):
+        lote = valores[i:i + LOTE_IN]
+        linhas.extend(buscar_paginado(lambda: montar_query(lote)))
+    return linhas
+
+
+def _epoch_utc(valor: str) -> float:
+    """Converte data_acesso (ISO) ou janela naive em UTC para segundos epoch."""
+    dt = datetime.fromisoformat(valor.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def carregar_acessos_supabase(sb: Client, cpfs, inicio: datetime, fim: datetime) -> dict:
+    """(cpf, planta) → [epoch UTC ordenados] dos acessos entre inicio e fim (UTC), pela API."""
+    linhas = buscar_em_lotes(
+        cpfs,
+        lambda lote: sb.table("acessos").select("cpf, planta, data_acesso")
+            .in_("cpf", lote)
+            .gte("data_acesso", inicio.isoformat())
+            .lte("data_acesso", fim.isoformat())
+            .order("id")
+    )
+    acessos = {}
+    for a in linhas:
+        try:
+            acessos.setdefault((a['cpf'], a.get('planta') or ''), []).append(_epoch_utc(a['data_acesso']))
+        except Exception:
+            continue
+    for timestamps in acessos.values():
+        timestamps.sort()
+    logger.info(f"  {len(linhas)} acessos de {len(cpfs)} médico(s)")
+    return acessos
+
+
+def limites_acessos(inicio: str, fim: str, janela_horas: float) -> tuple[datetime, datetime]:
+    """
+    Intervalo UTC que contém as janelas de busca de todas as escalas de inicio..fim:
+    da entrada mais cedo (00:00 BRT de inicio) − janela até a saída mais tarde
+    (fim da noite de fim+1, plantão noturno) + janela, somando o fuso (+3h).
+    """
+    meia_noite = datetime.fromisoformat(f"{inicio}T00:00:00+00:00")
+    ultimo = datetime.fromisoformat(f"{fim}T00:00:00+00:00") + timedelta(days=2)
+    return (meia_noite + BRT_TO_UTC - timedelta(hours=janela_horas),
+            ultimo + BRT_TO_UTC + timedelta(hours=janela_horas))
+
+
+def carregar_dados(sb: Client, inicio: str, fim: str, janela_horas: float = JANELA_BUSCA_HORAS,
+                   loja: Optional[str] = None) -> tuple[list, dict]:
+    """
+    Carrega escalas, dimensões, acessos e produtividade do intervalo.
+    Os acessos cobrem as janelas de busca de `janela_horas` (limites_acessos).
+    Com `loja`, os acessos vêm da loja Parquet local (loja_acessos.py) em vez do Supabase.
+    Retorna (escalas, dados) onde dados contém:
+      unidades:      contrato_id → {codigo, possui_gestao_acesso}
+      codigomvs:     cpf → [codigomv, ...]
+      acessos:       (cpf, planta) → [epoch UTC ordenados]
+      produtividade: {(codigo_mv, data)} com soma das 9 colunas > 0
+    """
+    separador("CARGA")
+
+    escalas = buscar_paginado(
+        lambda: sb.table("escalas_medicas")
+            .select("id, contrato_id, data_inicio, horario_entrada, horario_saida, medicos, status")
+            .in_("status", STATUS_REAVALIAVEIS)
+            .eq("ativo", True)
+            .gte("data_inicio", inicio)
+            .lte("data_inicio", fim)
+            .order("id")
+    )
+    logger.info(f"  {len(escalas)} escalas ({', '.join(STATUS_REAVALIAVEIS)})")
+
+    contratos = buscar_paginado(lambda: sb.table("contratos").select("id, unidade_hospitalar_id").order("id"))
+    unidades = {
+        u['id']: {"codigo": u["codigo"], "possui_gestao_acesso": bool(u.get("possui_gestao_acesso", True))}
+        for u in buscar_paginado(
+            lambda: sb.table("unidades_hospitalares").select("id, codigo, possui_gestao_acesso").order("id")
+        )
+        if u.get("codigo")
+    }
+    unidade_por_contrato = {
+        c['id']: unidades.get(c.get('unidade_hospitalar_id')) for c in contratos
+    }
+
+    usuario_por_cpf = {}
+    for u in buscar_paginado(lambda: sb.table("usuarios").select("id, cpf").not_.is_("cpf", "null").order("id")):
+        usuario_por_cpf.setdefault(u['cpf'], u['id'])
+    mvs_por_usuario = {}
+    for r in buscar_paginado(lambda: sb.table("usuario_codigomv").select("usuario_id, codigomv").order("id")):
+        mvs_por_usuario.setdefault(r['usuario_id'], []).append(str(r['codigomv']))
+
+    cpfs_acesso, cpfs_produtividade = set(), set()
+    for escala in escalas:
+        info = unidade_por_contrato.get(escala['contrato_id'])
+        if not info:
+            continue
+        for medico in (escala.get('medicos') or []):
+            cpf = (medico.get('cpf') or '').strip()
+            if cpf:
+                (cpfs_acesso if info["possui_gestao_acesso"] else cpfs_produtividade).add(cpf)
+
+    codigomvs = {
+        cpf: mvs_por_usuario.get(usuario_por_cpf.get(cpf), [])
+        for cpf in cpfs_acesso | cpfs_produtividade
+    }
+    logger.info(f"  {len(unidade_por_contrato)} contratos, {len(unidades)} unidades, {len(codigomvs)} médicos")
+
+    # Acessos: a janela de uma escala do dia D vai de D − janela até D+2 (UTC)
+    inicio_acessos, fim_acessos = limites_acessos(inicio, fim, janela_horas)
+    if loja:
+        acessos = carregar_timestamps(cpfs_acesso, inicio_acessos, fim_acessos, loja)
+        logger.info(f"  {sum(map(len, acessos.values()))} acessos de {len(cpfs_acesso)} médico(s) (loja local: {loja})")
+    else:
+        acessos = carregar_acessos_supabase(sb, cpfs_acesso, inicio_acessos, fim_acessos)
+
+    codigos_prod = sorted({c for cpf in cpfs_produtividade for c in codigomvs[cpf]})
+    linhas = buscar_em_lotes(
+        codigos_prod,
+        lambda lote: sb.table("produtividade")
+            .select("id, codigo_mv, data, " + ", ".join(COLUNAS_PRODUTIVIDADE))
+            .in_("codigo_mv", lote)
+            .gte("data", inicio)
+            .lte("data", fim)
+            .order("id")
+    )
+    produtividade = {
+        (str(r['codigo_mv']), str(r['data'])[:10])
+        for r in linhas
+        if sum(r.get(col) or 0 for col in COLUNAS_PRODUTIVIDADE) > 0
+    }
+    logger.info(f"  {len(linhas)} registros de produtividade de {len(codigos_prod)} código(s) MV")
+
+    dados = {
+        "unidades": unidade_por_contrato,
+        "codigomvs": codigomvs,
+        "acessos": acessos,
+        "produtividade": produtividade,
+    }
+    return escalas, dados
+
+
+# ============================================================
+# AVALIAÇÃO (nos processos do pool)
+# ============================================================
+
+_dados: dict = {}
+_regras: dict = {}
+
+
+def _inicializar_worker(dados: dict, regras: dict):
+    """Recebe os dados carregados uma vez por processo."""
+    global _dados, _regras
+    _dados = dados
+    _regras = regras
+
+
+def avaliar_escala(escala: dict, inicio: float, fim: float, duracao: float) -> Optional[str]:
+    """
+    Mesmas regras de analisar_escala() do verificar-presenca-escalas.py, sobre os
+    dados pré-carregados. `inicio`/`fim` (epoch UTC) e `duracao` (horas) vêm de
+    calcular_janelas(). Retorna o novo status ou None se não for possível avaliar.
+    """
+    medicos = escala.get('medicos') or []
+    info = _dados["unidades"].get(escala['contrato_id'])
+    if not medicos or not info:
+        return None
+
+    data_inicio = escala['data_inicio'][:10]
+    resultados = []
+
+    if not info["possui_gestao_acesso"]:
+        for medico in medicos:
+            cpf = (medico.get('cpf') or '').strip()
+            if not cpf:
+                continue
+            tem_prod = any(
+                (codigo, data_inicio) in _dados["produtividade"]
+                for codigo in _dados["codigomvs"].get(cpf, [])
+            )
+            resultados.append(resultado_produtividade(tem_prod))
+        return status_por_resultados(resultados)
+
+    for medico in medicos:
+        cpf = (medico.get('cpf') or '').strip()
+        if not cpf:
+            continue
+
+        timestamps = _dados["acessos"].get((cpf, info["codigo"]), [])
+        i, j = bisect_left(timestamps, inicio), bisect_right(timestamps, fim)
+
+        if i == j:
+            resultados.append("ausente")
+            continue
+
+        horas = (timestamps[j - 1] - timestamps[i]) / 3600.0
+        resultados.append(classificar_presenca(horas, duracao, _regras["tolerancia_horas"]))
+
+    return status_por_resultados(resultados)
+
+
+def _avaliar_lote(itens: list) -> list:
+    return [(escala['id'], avaliar_escala(escala, inicio, fim, duracao)) for escala, inicio, fim, duracao in itens]
+
+
+def avaliar_todas(escalas: list, dados: dict, regras: dict, processos: int) -> dict:
+    """Avalia todas as escalas no pool de processos. Retorna escala_id → novo status."""
+    separador(f"AVALIAÇÃO ({processos} processo(s))")
+
+    # Janelas de todas as escalas de uma vez (arrays NumPy), enviadas junto com cada escala
+    janelas = calcular_janelas(escalas, regras["janela_busca_horas"])
+    itens = list(zip(
+        escalas,
+        epoch_segundos(janelas.inicio_busca).tolist(),
+        epoch_segundos(janelas.fim_busca).tolist(),
+        janelas.duracao_horas.tolist(),
+    ))
+    lotes = [itens[i:i + LOTE_AVALIACAO] for i in range(0, len(itens), LOTE_AVALIACAO)]
+    novos = {}
+
+    with ProcessPoolExecutor(max_workers=processos, initializer=_inicializar_worker,
+                             initargs=(dados, regras)) as pool:
+        for n, resultado in enumerate(pool.map(_avaliar_lote, lotes), 1):
+            novos.update(resultado)
+            if n % 10 == 0 or n == len(lotes):
+                logger.info(f"  {len(novos)}/{len(escalas)} escalas avaliadas")
+
+    return novos
+
+
+# ============================================================
+# DIFF E COMMIT
+# ============================================================
+
+def montar_diff(escalas: list, novos: dict) -> list:
+    """Escalas cujo status mudaria, ordenadas por data."""
+    diff = []
+    for escala in sorted(escalas, key=lambda e: (e['data_inicio'], e['id'])):
+        novo = novos.get(escala['id'])
+        if novo and novo != escala['status']:
+            diff.append({
+                "id": escala['id'],
+                "data_inicio": escala['data_inicio'],
+                "horario": f"{escala['horario_entrada'][:5]}-{escala['horario_saida'][:5]}",
+                "contrato_id": escala['contrato_id'],
+                "medicos": len(escala.get('medicos') or []),
+                "status_atual": escala['status'],
+                "status_novo": novo,
+            })
+    return diff
+
+
+def resumir(escalas: list, novos: dict, diff: list):
+    separador("RESUMO")
+    sem_dados = sum(1 for e in escalas if novos.get(e['id']) is None)
+    logger.info(f"  Escalas avaliadas : {len(escalas)}")
+    logger.info(f"  Sem dados         : {sem_dados}")
+    logger.info(f"  Mudariam de status: {len(diff)}")
+
+    transicoes = Counter((d['status_atual'], d['status_novo']) for d in diff)
+    for (atual, novo), qtd in transicoes.most_common():
+        logger.info(f"    {atual:<18} → {novo:<18} {qtd:>6}")
+
+
+def salvar_csv(caminho: str, diff: list):
+    campos = ["id", "data_inicio", "horario", "contrato_id", "medicos", "status_atual", "status_novo"]
+    with open(caminho, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=campos, delimiter=";")
+        writer.writeheader()
+        writer.writerows(diff)
+    logger.info(f"  Diff salvo: {caminho} ({len(diff)} linhas)")
+
+
+def gravar(sb: Client, diff: list):
+    """
+    Grava os novos status em lote, agrupando por transição. O filtro pelo status
+    atual evita sobrescrever escalas alteradas (ex.: aprovadas) depois da carga.
+    """
+    separador("COMMIT")
+    por_transicao = {}
+    for d in diff:
+        por_transicao.setdefault((d['status_atual'], d['status_novo']), []).append(d['id'])
+
+    gravadas = erros = 0
+    for (atual, novo), ids in por_transicao.items():
+        for i in range(0, len(ids), LOTE_IN):
+            lote = ids[i:i + LOTE_IN]
+            try:
+                resp = sb.table("escalas_medicas").update({'status': novo}) \
+                    .in_('id', lote).eq('status', atual).execute()
+                gravadas += len(resp.data or [])
+            except Exception as e:
+                logger.error(f"  Erro ao gravar {len(lote)} escala(s) {atual} → {novo}: {e}")
+                erros += len(lote)
+
+    logger.info(f"  {gravadas} escala(s) atualizada(s), {len(diff) - gravadas - erros} já alteradas, {erros} erros")
+
+
+# ============================================================
+# MAIN
+# ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Reavaliação histórica (what-if) das regras de presença")
+    parser.add_argument("--inicio", required=True, help="Data inicial (YYYY-MM-DD)")
+    parser.add_argument("--fim", required=True, help="Data final (YYYY-MM-DD)")
+    parser.add_argument("--janela-busca", type=float, default=JANELA_BUSCA_HORAS,
+                        help=f"Horas antes da entrada/depois da saída (padrão {JANELA_BUSCA_HORAS})")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_HORAS,
+                        help=f"Horas de tolerância na carga horária (padrão {TOLERANCIA_HORAS})")
+    parser.add_argument("--processos", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--saida", help="CSV do diff (padrão reavaliacao_<inicio>_<fim>.csv)")
+    parser.add_argument("--commit", action="store_true", help="Gravar os novos status no Supabase")
+    parser.add_argument("--loja", nargs="?", const=os.getenv('ACESSOS_LOJA_DIR', 'loja_acessos'),
+                        help="Ler os acessos da loja Parquet local (sincronizar-loja-acessos.py)")
+    args = parser.parse_args()
+
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise ValueError("VITE_SUPABASE_URL ou VITE_SUPABASE_SERVICE_ROLE_KEY não encontrados no .env")
+
+    regras = {"janela_busca_horas": args.janela_busca, "tolerancia_horas": args.tolerancia}
+
+    separador("reavaliar-escalas-historico.py")
+    logger.info(f"  Intervalo : {args.inicio} → {args.fim}")
+    logger.info(f"  Regras    : janela ±{args.janela_busca}h | tolerância {args.tolerancia}h")
+    logger.info(f"  Modo      : {'COMMIT' if args.commit else 'simulação (sem gravar)'}")
+
+    sb: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+    escalas, dados = carregar_dados(sb, args.inicio, args.fim, args.janela_busca, args.loja)
+    if not escalas:
+        logger.info("  Nenhuma escala no intervalo.")
+        return
+
+    novos = avaliar_todas(escalas, dados, regras, args.processos)
+    diff = montar_diff(escalas, novos)
+
+    resumir(escalas, novos, diff)
+    salvar_csv(args.saida or f"reavaliacao_{args.inicio}_{args.fim}.csv", diff)
+
+    if args.commit and diff:
+        gravar(sb, diff)
+
+    separador("CONCLUÍDO")
+
+
+if __name__ == "__main__":
+    main()
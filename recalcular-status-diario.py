@@ -8,11 +8,16 @@ Data: 2025-12-15
 
 import os
 import sys
+from bisect import bisect_left, bisect_right
 from datetime import datetime, timedelta
-from supabase import create_client, Client
+from supabase import Client
 from dotenv import load_dotenv
 import logging
 
+from execucao_paralela import criar_cliente_supabase, executar_em_ordem
+from fatos_presenca import montar_fato, gravar_fatos
+from regras_presenca import is_overnight, calcular_duracao_horas, status_por_resultados
+
 # Configurar logging
 logging.basicConfig(
     level=logging.INFO,
@@ -35,151 +40,181 @@ if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
     logger.error("❌ Variáveis de ambiente VITE_SUPABASE_URL e VITE_SUPABASE_SERVICE_ROLE_KEY são obrigatórias!")
     sys.exit(1)
 
+# Escalas avaliadas em paralelo (1 = sequencial); também limita as conexões HTTP
+MAX_INFLIGHT = int(os.getenv('ESCALAS_MAX_INFLIGHT', '8'))
+
+# Identifica este job na tabela escalas_presenca_fatos
+ORIGEM_FATOS = 'recalcular-status-diario'
+
 # Conectar ao Supabase
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+supabase: Client = criar_cliente_supabase(SUPABASE_URL, SUPABASE_SERVICE_KEY, max_conexoes=MAX_INFLIGHT)
 logger.info(f"✅ Conectado ao Supabase: {SUPABASE_URL}")
 
+PAGE_SIZE = 1000   # máximo por requisição no Supabase
+LOTE_CPFS = 100    # CPFs por consulta (mantém a URL do filtro in_ curta)
 
-def calcular_horas_escaladas(horario_entrada: str, horario_saida: str) -> float:
-    """Calcula as horas estabelecidas na escala"""
-    try:
-        hora_e, min_e = map(int, horario_entrada.split(':'))
-        hora_s, min_s = map(int, horario_saida.split(':'))
+# Janela de tolerância para parear entrada/saída com o horário escalado: ±3 horas
+JANELA_TOLERANCIA = timedelta(hours=3)
 
-        minutos_entrada = hora_e * 60 + min_e
-        minutos_saida = hora_s * 60 + min_s
 
-        # Se horário de saída é menor, passou da meia-noite
-        if minutos_saida >= minutos_entrada:
-            duracao_minutos = minutos_saida - minutos_entrada
-        else:
-            duracao_minutos = 1440 - minutos_entrada + minutos_saida
-
-        return duracao_minutos / 60
+def calcular_horas_escaladas(horario_entrada: str, horario_saida: str) -> float:
+    """Calcula as horas estabelecidas na escala (entrada = saída é plantão de 24h)"""
+    try:
+        return calcular_duracao_horas(horario_entrada, horario_saida)
     except Exception as e:
         logger.error(f"Erro ao calcular horas escaladas: {e}")
         return 0
 
 
-def calcular_horas_trabalhadas(cpf: str, data_escala: str, horario_entrada: str, horario_saida: str) -> float:
+def _parse_data_acesso(valor: str) -> datetime:
+    return datetime.fromisoformat(valor.replace('Z', '+00:00'))
+
+
+def carregar_acessos(cpfs: list, datas: list) -> dict:
+    """
+    Carrega de uma vez os acessos de vários CPFs para as datas indicadas (YYYY-MM-DD).
+
+    Busca apenas cpf, data_acesso e sentido, em consultas paginadas por lote de CPFs,
+    e converte cada timestamp uma única vez.
+
+    Retorna {(cpf, data_iso): {'E': [datetime, ...], 'S': [datetime, ...]}} com as
+    listas ordenadas, prontas para busca binária.
+    """
+    cpfs = sorted({cpf for cpf in cpfs if cpf})
+    datas = sorted(set(datas))
+    acessos = {}
+
+    if not cpfs or not datas:
+        return acessos
+
+    logger.info(f"📥 Carregando acessos de {len(cpfs)} CPF(s) para {', '.join(datas)}")
+
+    for i in range(0, len(cpfs), LOTE_CPFS):
+        lote = cpfs[i:i + LOTE_CPFS]
+        offset = 0
+
+        while True:
+            response = supabase.table("acessos").select("cpf, data_acesso, sentido")\
+                .in_("cpf", lote)\
+                .gte("data_acesso", f"{datas[0]}T00:00:00")\
+                .lte("data_acesso", f"{datas[-1]}T23:59:59")\
+                .order("data_acesso").order("id")\
+                .range(offset, offset + PAGE_SIZE - 1).execute()
+            linhas = response.data or []
+
+            for acesso in linhas:
+                dia = acesso['data_acesso'][:10]
+                if acesso['sentido'] not in ('E', 'S') or dia not in datas:
+                    continue
+                por_sentido = acessos.setdefault((acesso['cpf'], dia), {'E': [], 'S': []})
+                por_sentido[acesso['sentido']].append(_parse_data_acesso(acesso['data_acesso']))
+
+            if len(linhas) < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+
+    for por_sentido in acessos.values():
+        por_sentido['E'].sort()
+        por_sentido['S'].sort()
+
+    total = sum(len(v['E']) + len(v['S']) for v in acessos.values())
+    logger.info(f"📥 {total} acessos carregados")
+    return acessos
+
+
+def _mais_proximo(timestamps: list, alvo: datetime, inicio: int = 0):
+    """
+    Retorna o timestamp de timestamps[inicio:] mais próximo de `alvo` dentro da
+    JANELA_TOLERANCIA (em empate, o mais cedo), ou None.
+    """
+    pos = bisect_left(timestamps, alvo, lo=inicio)
+    melhor = None
+    melhor_diferenca = None
+
+    for candidato in timestamps[max(pos - 1, inicio):pos + 1]:
+        diferenca = abs((candidato - alvo).total_seconds())
+        if diferenca <= JANELA_TOLERANCIA.total_seconds():
+            if melhor_diferenca is None or diferenca < melhor_diferenca:
+                melhor_diferenca = diferenca
+                melhor = candidato
+
+    return melhor
+
+
+def medir_horas_trabalhadas(cpf: str, data_escala: str, horario_entrada: str, horario_saida: str,
+                            acessos_carregados: dict = None) -> tuple:
     """
     Calcula as horas trabalhadas por um médico baseado nos acessos
     Com fallback para acessos fora da janela de ±3h
+
+    Retorna (horas, entrada, saída), com entrada/saída None quando não há par.
+
+    `acessos_carregados` é o resultado de carregar_acessos(); se omitido,
+    os acessos do médico são buscados na hora.
     """
     try:
         # Normalizar a data para garantir que estamos buscando o dia correto
         data_obj = datetime.strptime(data_escala, "%Y-%m-%d")
         data_formatada = data_obj.strftime("%Y-%m-%d")
+        dia_seguinte = (data_obj + timedelta(days=1)).strftime("%Y-%m-%d")
 
-        # Verificar se a escala atravessa meia-noite
-        hora_e, min_e = map(int, horario_entrada.split(':'))
-        hora_s, min_s = map(int, horario_saida.split(':'))
-        minutos_entrada = hora_e * 60 + min_e
-        minutos_saida = hora_s * 60 + min_s
-        atravessa_meia_noite = minutos_saida < minutos_entrada
+        # Verificar se a escala atravessa meia-noite (mesma regra do verificar-presenca-escalas.py)
+        atravessa_meia_noite = is_overnight(horario_entrada, horario_saida)
 
-        logger.info(f"  Buscando acessos para CPF {cpf} no dia {data_formatada}")
+        # Acessos de um único dia, ou de dois dias se atravessa a meia-noite
+        dias = [data_formatada, dia_seguinte] if atravessa_meia_noite else [data_formatada]
 
-        # Buscar acessos
-        if atravessa_meia_noite:
-            # Buscar acessos de dois dias
-            dia_seguinte = (data_obj + timedelta(days=1)).strftime("%Y-%m-%d")
-
-            response1 = supabase.table("acessos").select("*").eq("cpf", cpf)\
-                .gte("data_acesso", f"{data_formatada}T00:00:00")\
-                .lte("data_acesso", f"{data_formatada}T23:59:59")\
-                .order("data_acesso").execute()
-
-            response2 = supabase.table("acessos").select("*").eq("cpf", cpf)\
-                .gte("data_acesso", f"{dia_seguinte}T00:00:00")\
-                .lte("data_acesso", f"{dia_seguinte}T23:59:59")\
-                .order("data_acesso").execute()
-
-            acessos = (response1.data or []) + (response2.data or [])
-        else:
-            # Buscar acessos de um único dia
-            response = supabase.table("acessos").select("*").eq("cpf", cpf)\
-                .gte("data_acesso", f"{data_formatada}T00:00:00")\
-                .lte("data_acesso", f"{data_formatada}T23:59:59")\
-                .order("data_acesso").execute()
+        if acessos_carregados is None:
+            logger.info(f"  Buscando acessos para CPF {cpf} no dia {data_formatada}")
+            acessos_carregados = carregar_acessos([cpf], dias)
 
-            acessos = response.data or []
+        # Dias consecutivos já ordenados: concatenar mantém a ordem
+        entradas = []
+        saidas = []
+        for dia in dias:
+            por_sentido = acessos_carregados.get((cpf, dia))
+            if por_sentido:
+                entradas.extend(por_sentido['E'])
+                saidas.extend(por_sentido['S'])
 
-        if not acessos:
+        if not entradas and not saidas:
             logger.info(f"  ❌ Nenhum acesso encontrado para CPF {cpf}")
-            return 0
-
-        logger.info(f"  ✅ {len(acessos)} acessos encontrados")
+            return 0, None, None
 
-        # Separar entradas e saídas
-        entradas = [a for a in acessos if a['sentido'] == 'E']
-        saidas = [a for a in acessos if a['sentido'] == 'S']
+        logger.info(f"  ✅ {len(entradas) + len(saidas)} acessos encontrados")
 
         if not entradas or not saidas:
             logger.info(f"  ❌ Não há pares completos de entrada/saída")
-            return 0
+            return 0, None, None
 
         # Criar horários esperados
         horario_entrada_esperado = datetime.strptime(f"{data_formatada} {horario_entrada}", "%Y-%m-%d %H:%M")
 
         if atravessa_meia_noite:
-            dia_seguinte = (data_obj + timedelta(days=1)).strftime("%Y-%m-%d")
             horario_saida_esperado = datetime.strptime(f"{dia_seguinte} {horario_saida}", "%Y-%m-%d %H:%M")
         else:
             horario_saida_esperado = datetime.strptime(f"{data_formatada} {horario_saida}", "%Y-%m-%d %H:%M")
 
-        # Janela de tolerância: ±3 horas
-        JANELA_TOLERANCIA = timedelta(hours=3)
-
         # Encontrar entrada mais próxima
-        entrada_mais_proxima = None
-        menor_diferenca_entrada = None
-
-        for entrada in entradas:
-            data_entrada = datetime.fromisoformat(entrada['data_acesso'].replace('Z', '+00:00'))
-            diferenca = abs((data_entrada - horario_entrada_esperado).total_seconds())
-
-            if diferenca <= JANELA_TOLERANCIA.total_seconds():
-                if menor_diferenca_entrada is None or diferenca < menor_diferenca_entrada:
-                    menor_diferenca_entrada = diferenca
-                    entrada_mais_proxima = entrada
+        data_entrada_selecionada = _mais_proximo(entradas, horario_entrada_esperado)
 
         # FALLBACK: Se não encontrou dentro da janela, usar primeira entrada
-        if not entrada_mais_proxima:
+        if data_entrada_selecionada is None:
             logger.info(f"  ⚠️  Nenhuma entrada dentro da janela de ±3h, usando primeira entrada do dia")
-            entrada_mais_proxima = entradas[0]
-
-        data_entrada_selecionada = datetime.fromisoformat(entrada_mais_proxima['data_acesso'].replace('Z', '+00:00'))
+            data_entrada_selecionada = entradas[0]
 
         # Encontrar saída mais próxima (após a entrada)
-        saida_mais_proxima = None
-        menor_diferenca_saida = None
-
-        for saida in saidas:
-            data_saida = datetime.fromisoformat(saida['data_acesso'].replace('Z', '+00:00'))
-
-            # Saída deve ser após a entrada
-            if data_saida <= data_entrada_selecionada:
-                continue
-
-            diferenca = abs((data_saida - horario_saida_esperado).total_seconds())
-
-            if diferenca <= JANELA_TOLERANCIA.total_seconds():
-                if menor_diferenca_saida is None or diferenca < menor_diferenca_saida:
-                    menor_diferenca_saida = diferenca
-                    saida_mais_proxima = saida
+        primeira_saida_apos_entrada = bisect_right(saidas, data_entrada_selecionada)
+        data_saida_selecionada = _mais_proximo(saidas, horario_saida_esperado, primeira_saida_apos_entrada)
 
         # FALLBACK: Se não encontrou saída dentro da janela, usar última saída após entrada
-        if not saida_mais_proxima:
+        if data_saida_selecionada is None:
             logger.info(f"  ⚠️  Nenhuma saída dentro da janela de ±3h, usando última saída do dia")
-            saidas_apos_entrada = [s for s in saidas if datetime.fromisoformat(s['data_acesso'].replace('Z', '+00:00')) > data_entrada_selecionada]
-            if saidas_apos_entrada:
-                saida_mais_proxima = saidas_apos_entrada[-1]
+            if primeira_saida_apos_entrada < len(saidas):
+                data_saida_selecionada = saidas[-1]
             else:
                 logger.info(f"  ❌ Nenhuma saída encontrada após a entrada")
-                return 0
-
-        data_saida_selecionada = datetime.fromisoformat(saida_mais_proxima['data_acesso'].replace('Z', '+00:00'))
+                return 0, None, None
 
         # Calcular horas trabalhadas
         diff = data_saida_selecionada - data_entrada_selecionada
@@ -187,15 +222,24 @@ def calcular_horas_trabalhadas(cpf: str, data_escala: str, horario_entrada: str,
 
         logger.info(f"  🎯 Horas trabalhadas: {horas_trabalhadas:.2f}h ({data_entrada_selecionada.strftime('%H:%M')} - {data_saida_selecionada.strftime('%H:%M')})")
 
-        return horas_trabalhadas
+        return horas_trabalhadas, data_entrada_selecionada, data_saida_selecionada
 
     except Exception as e:
         logger.error(f"Erro ao calcular horas trabalhadas: {e}")
-        return 0
+        return 0, None, None
 
 
-def analisar_escala(escala: dict) -> str:
-    """Analisa uma escala e determina seu status automático"""
+def calcular_horas_trabalhadas(cpf: str, data_escala: str, horario_entrada: str, horario_saida: str,
+                               acessos_carregados: dict = None) -> float:
+    """Horas trabalhadas por um médico (ver medir_horas_trabalhadas)"""
+    return medir_horas_trabalhadas(cpf, data_escala, horario_entrada, horario_saida, acessos_carregados)[0]
+
+
+def analisar_escala(escala: dict, acessos_carregados: dict = None, fatos: list = None) -> str:
+    """
+    Analisa uma escala e determina seu status automático
+    Se `fatos` for informado, recebe um fato de presença por médico (fatos_presenca.py)
+    """
     try:
         data_escala = datetime.strptime(escala['data_inicio'], "%Y-%m-%d")
         hoje = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
@@ -220,42 +264,46 @@ def analisar_escala(escala: dict) -> str:
 
         # Para cada médico escalado, verificar se cumpriu a carga horária
         medicos = escala['medicos']
-        todos_cumpriram = True
-        algum_nao_compareceu = False
-        algum_trabalhou_parcial = False
+        resultados = []
 
         for medico in medicos:
             logger.info(f"\n   👨‍⚕️ Médico: {medico['nome']} (CPF: {medico['cpf']})")
 
-            horas_trabalhadas = calcular_horas_trabalhadas(
+            horas_trabalhadas, entrada, saida = medir_horas_trabalhadas(
                 medico['cpf'],
                 escala['data_inicio'],
                 escala['horario_entrada'],
-                escala['horario_saida']
+                escala['horario_saida'],
+                acessos_carregados
             )
 
             logger.info(f"   📊 Comparação: {horas_trabalhadas:.2f}h trabalhadas vs {horas_esperadas:.2f}h esperadas")
 
             if horas_trabalhadas == 0:
                 logger.info(f"   ❌ Médico não compareceu (0 horas)")
-                algum_nao_compareceu = True
-                todos_cumpriram = False
+                resultado = "ausente"
             elif horas_trabalhadas < horas_esperadas:
                 logger.info(f"   ⚠️  Médico trabalhou parcialmente ({horas_trabalhadas:.2f}h < {horas_esperadas:.2f}h)")
-                algum_trabalhou_parcial = True
-                todos_cumpriram = False
+                resultado = "presente_parcial"
             else:
                 logger.info(f"   ✅ Médico cumpriu carga horária ({horas_trabalhadas:.2f}h >= {horas_esperadas:.2f}h)")
+                resultado = "presente_total"
+            resultados.append(resultado)
+
+            if fatos is not None:
+                fatos.append(montar_fato(
+                    escala, medico['cpf'], resultado, 'pareamento', ORIGEM_FATOS,
+                    horas_esperadas=horas_esperadas, horas_medidas=horas_trabalhadas,
+                    entrada=entrada, saida=saida,
+                ))
 
         # Determinar status
-        if algum_nao_compareceu:
-            status_final = "Atenção"
+        status_final = status_por_resultados(resultados)
+        if status_final == "Atenção":
             logger.info(f"\n   🔴 Status final: ATENÇÃO (médico não compareceu)")
-        elif algum_trabalhou_parcial:
-            status_final = "Aprovação Parcial"
+        elif status_final == "Aprovação Parcial":
             logger.info(f"\n   🟡 Status final: APROVAÇÃO PARCIAL (trabalho parcial)")
         else:
-            status_final = "Pré-Aprovado"
             logger.info(f"\n   ✅ Status final: PRÉ-APROVADO (todos cumpriram)")
 
         return status_final
@@ -265,6 +313,37 @@ def analisar_escala(escala: dict) -> str:
         return "Atenção"
 
 
+def processar_escala(escala: dict, acessos_carregados: dict) -> tuple:
+    """
+    Analisa uma escala e grava o novo status se mudou.
+    Retorna ("atualizada" | "mantida" | "erro", fatos de presença).
+    """
+    fatos = []
+    try:
+        novo_status = analisar_escala(escala, acessos_carregados, fatos)
+
+        # Atualizar apenas se o status mudou
+        if novo_status != escala['status']:
+            update_response = supabase.table("escalas_medicas")\
+                .update({'status': novo_status})\
+                .eq('id', escala['id'])\
+                .execute()
+
+            if update_response.data:
+                logger.info(f"✅ Escala {escala['id'][:8]}... atualizada: {escala['status']} → {novo_status}")
+                return "atualizada", fatos
+            else:
+                logger.error(f"❌ Erro ao atualizar escala {escala['id']}")
+                return "erro", fatos
+        else:
+            logger.info(f"⏭️  Escala {escala['id'][:8]}... mantém status: {novo_status}")
+            return "mantida", fatos
+
+    except Exception as e:
+        logger.error(f"❌ Erro ao processar escala {escala.get('id', 'unknown')}: {e}")
+        return "erro", []
+
+
 def recalcular_status_ontem():
     """
     Recalcula o status de todas as escalas do dia anterior com status "Programado"
@@ -301,32 +380,23 @@ def recalcular_status_ontem():
 
         logger.info(f"\n📊 {len(escalas)} escala(s) encontrada(s) para recalcular")
 
+        # Carregar de uma vez os acessos de todos os médicos escalados (ontem e hoje, p/ noturnos)
+        cpfs = [medico.get('cpf') for escala in escalas for medico in (escala.get('medicos') or [])]
+        dia_seguinte = (ontem + timedelta(days=1)).strftime("%Y-%m-%d")
+        acessos_carregados = carregar_acessos(cpfs, [data_ontem, dia_seguinte])
+
         atualizadas = 0
         erros = 0
-
-        # Analisar cada escala
-        for escala in escalas:
-            try:
-                novo_status = analisar_escala(escala)
-
-                # Atualizar apenas se o status mudou
-                if novo_status != escala['status']:
-                    update_response = supabase.table("escalas_medicas")\
-                        .update({'status': novo_status})\
-                        .eq('id', escala['id'])\
-                        .execute()
-
-                    if update_response.data:
-                        logger.info(f"✅ Escala {escala['id'][:8]}... atualizada: {escala['status']} → {novo_status}")
-                        atualizadas += 1
-                    else:
-                        logger.error(f"❌ Erro ao atualizar escala {escala['id']}")
-                        erros += 1
-                else:
-                    logger.info(f"⏭️  Escala {escala['id'][:8]}... mantém status: {novo_status}")
-
-            except Exception as e:
-                logger.error(f"❌ Erro ao processar escala {escala.get('id', 'unknown')}: {e}")
+        fatos = []
+
+        # Analisar as escalas em paralelo (logs emitidos na ordem original)
+        for escala, (resultado, fatos_escala) in executar_em_ordem(
+            escalas, lambda e: processar_escala(e, acessos_carregados), MAX_INFLIGHT
+        ):
+            fatos.extend(fatos_escala)
+            if resultado == "atualizada":
+                atualizadas += 1
+            elif resultado == "erro":
                 erros += 1
 
         logger.info("\n" + "="*80)
@@ -334,6 +404,7 @@ def recalcular_status_ontem():
         logger.info(f"   ✅ Escalas atualizadas: {atualizadas}")
         logger.info(f"   ❌ Erros encontrados: {erros}")
         logger.info(f"   📊 Total processado: {len(escalas)}")
+        logger.info(f"   🧾 Fatos de presença: {gravar_fatos(supabase, fatos)}/{len(fatos)}")
         logger.info("="*80)
 
         return {
@@ -0,0 +1,114 @@
+"""
+Regras de presença nas escalas compartilhadas pelos scripts de status
+(verificar-presenca-escalas.py, recalcular-status-diario.py, reavaliar-escalas-historico.py).
+
+Reúne os helpers de horário (turno noturno, duração, janela de busca em UTC),
+as tolerâncias e a classificação de médico/escala, para que a reavaliação
+histórica use exatamente as mesmas regras do job diário, mudando só os parâmetros.
+A versão vetorizada dos helpers de horário, para lotes de escalas, está em janelas_turno.py.
+"""
+from datetime import datetime, timedelta
+
+# Horas antes da entrada / depois da saída em que acessos são considerados
+JANELA_BUSCA_HORAS = 2.5
+
+# Horas a menos que a duração da escala ainda aceitas como presença total
+TOLERANCIA_HORAS = 1.0
+
+# Status que o job pode reavaliar (Aprovado/Reprovado etc. são decisões manuais)
+STATUS_REAVALIAVEIS = ["Programado", "Pré-Aprovado", "Aprovação Parcial", "Atenção"]
+
+
+def parse_hhmm(horario: str) -> tuple[int, int]:
+    """Extrai (hora, minuto) de uma string 'HH:MM' ou 'HH:MM:SS'."""
+    partes = horario.split(':')
+    return int(partes[0]), int(partes[1])
+
+
+def is_overnight(horario_entrada: str, horario_saida: str) -> bool:
+    """
+    Retorna True se o turno atravessa a meia-noite.
+    Regra: horario_saida <= horario_entrada (em minutos).
+    """
+    h_e, m_e = parse_hhmm(horario_entrada)
+    h_s, m_s = parse_hhmm(horario_saida)
+    return (h_s * 60 + m_s) <= (h_e * 60 + m_e)
+
+
+def calcular_duracao_horas(horario_entrada: str, horario_saida: str) -> float:
+    """Duração total da escala em horas (suporta plantão noturno)."""
+    h_e, m_e = parse_hhmm(horario_entrada)
+    h_s, m_s = parse_hhmm(horario_saida)
+    minutos_e = h_e * 60 + m_e
+    minutos_s = h_s * 60 + m_s
+
+    if minutos_s <= minutos_e:
+        # Noturno: saída no dia seguinte
+        duracao_min = (1440 - minutos_e) + minutos_s
+    else:
+        duracao_min = minutos_s - minutos_e
+
+    return duracao_min / 60.0
+
+
+BRT_TO_UTC = timedelta(hours=3)  # acessos.data_acesso é armazenado em UTC real; escalas usam BRT
+
+
+def calcular_janela_busca(data_inicio_str: str, horario_entrada: str, horario_saida: str,
+                          janela_horas: float = JANELA_BUSCA_HORAS) -> tuple[str, str]:
+    """
+    Janela de busca de acessos: `janela_horas` (2.5h) antes da entrada até o mesmo após a saída.
+    Para plantões noturnos a saída é no dia seguinte.
+
+    Os horários da escala estão em BRT (UTC-3).
+    Os acessos são armazenados em UTC real (confirmado pelos offsets +00:00).
+    Portanto, convertemos a janela para UTC somando +3h antes de enviar a query.
+
+    Retorna (window_start, window_end) em formato "YYYY-MM-DDTHH:MM:SS" (UTC).
+    """
+    data = datetime.strptime(data_inicio_str, "%Y-%m-%d")
+    h_e, m_e = parse_hhmm(horario_entrada)
+    h_s, m_s = parse_hhmm(horario_saida)
+
+    entrada_brt = data.replace(hour=h_e, minute=m_e, second=0, microsecond=0)
+
+    if is_overnight(horario_entrada, horario_saida):
+        dia_seguinte = data + timedelta(days=1)
+        saida_brt = dia_seguinte.replace(hour=h_s, minute=m_s, second=0, microsecond=0)
+    else:
+        saida_brt = data.replace(hour=h_s, minute=m_s, second=0, microsecond=0)
+
+    window_start = ((entrada_brt - timedelta(hours=janela_horas)) + BRT_TO_UTC).strftime("%Y-%m-%dT%H:%M:%S")
+    window_end   = ((saida_brt   + timedelta(hours=janela_horas)) + BRT_TO_UTC).strftime("%Y-%m-%dT%H:%M:%S")
+
+    return window_start, window_end
+
+
+def classificar_presenca(horas: float, duracao_escala: float,
+                         tolerancia_horas: float = TOLERANCIA_HORAS) -> str:
+    """
+    Classifica um médico com acessos na janela:
+      "presente_total"   → horas >= duração - tolerância
+      "presente_parcial" → abaixo disso
+    """
+    return "presente_total" if horas >= duracao_escala - tolerancia_horas else "presente_parcial"
+
+
+def resultado_produtividade(tem_produtividade: bool) -> str:
+    """
+    Classifica um médico de unidade sem gestão de acesso: produtividade
+    registrada no dia da escala → "presente_total"; senão → "ausente".
+    """
+    return "presente_total" if tem_produtividade else "ausente"
+
+
+def status_por_resultados(resultados: list[str]) -> str:
+    """
+    Status da escala a partir dos resultados dos médicos
+    ("ausente", "presente_parcial", "presente_total").
+    """
+    if "ausente" in resultados:
+        return "Atenção"
+    if "presente_parcial" in resultados:
+        return "Aprovação Parcial"
+    return "Pré-Aprovado"
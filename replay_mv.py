@@ -0,0 +1,295 @@
+"""
+Gravação e replay offline do relatório de produtividade do MV (report-viewer id=7076).
+
+Gravação:
+    Com a variável MV_GRAVAR_PAGINAS_DIR definida, o coletor por escalas salva
+    o HTML renderizado de cada relatório em
+    <dir>/<codigo_mv>_<data_inicial>_<data_final>.html
+
+Replay:
+    Servidor HTTP local que imita o formulário do report-viewer (mesmos XPaths)
+    e devolve as páginas gravadas, com latência configurável e injeção de falhas.
+    Quando não existe gravação para a combinação pedida, gera uma página
+    sintética com a mesma estrutura de divs usada na extração.
+
+Uso:
+    python replay_mv.py --dir paginas_mv --porta 8765 --latencia-min 1 --latencia-max 3 --taxa-erro 0.05
+
+    # e no coletor:
+    MV_REPORT_URL=http://127.0.0.1:8765/report-executor/report-viewer?id=7076
+"""
+import os
+import re
+import sys
+import time
+import random
+import hashlib
+import argparse
+import threading
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import urlparse, parse_qs, quote
+
+logger = logging.getLogger(__name__)
+
+CAMINHO_FORMULARIO = '/report-executor/report-viewer'
+CAMINHO_RELATORIO = '/report-executor/report'
+
+# Posição (div[N]) de cada campo no relatório renderizado — ver XPATH_CAMPOS nos coletores
+POSICOES_CAMPOS = {
+    35: 'codigo_mv',
+    36: 'nome',
+    37: 'especialidade',
+    38: 'cirurgia_realizada',
+    40: 'parecer_solicitado',
+    41: 'parecer_realizado',
+    42: 'prescricao',
+    43: 'evolucao',
+    44: 'procedimento',
+    45: 'urgencia',
+    46: 'ambulatorio',
+    47: 'encaminhamento',
+    48: 'auxiliar',
+    49: 'folha_objetivo_diario',
+    50: 'evolucao_diurna_cti',
+    51: 'evolucao_noturna_cti',
+}
+
+FORMULARIO_HTML = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>Report Viewer (replay)</title></head>
+<body>
+<div id="ReportViewer_ParametersPanelContainer">
+  <table>
+    <tr><td>Unidade</td><td><input id="unidade"></td><td>Data Inicial</td><td><input id="dataInicial"></td></tr>
+    <tr><td>Código Prestador</td><td><input id="codigo"></td><td>Data Final</td><td><input id="dataFinal"></td></tr>
+    <tr><td></td><td></td><td></td><td></td></tr>
+    <tr><td></td><td></td><td></td><td><table><tr><td id="submit" onclick="enviar()">Submit</td></tr></table></td></tr>
+  </table>
+</div>
+<iframe id="ReportViewerFrame" width="1800" height="900"></iframe>
+<script>
+function enviar() {
+  var q = 'codigo=' + encodeURIComponent(document.getElementById('codigo').value)
+        + '&inicio=' + encodeURIComponent(document.getElementById('dataInicial').value)
+        + '&fim=' + encodeURIComponent(document.getElementById('dataFinal').value);
+  document.getElementById('ReportViewerFrame').src = '""" + CAMINHO_RELATORIO + """?' + q;
+}
+</script>
+</body>
+</html>
+"""
+
+
+# ============================================================================
+# GRAVAÇÃO
+# ============================================================================
+
+def nome_arquivo_pagina(codigo_mv: str, data_inicial: str, data_final: str) -> str:
+    """Nome do arquivo de uma gravação (datas no formato do formulário, ex. 02.01.2026)."""
+    partes = [str(codigo_mv).strip(), data_inicial.strip(), data_final.strip()]
+    return '_'.join(re.sub(r'[^0-9A-Za-z.]', '-', p) for p in partes) + '.html'
+
+
+def salvar_pagina(diretorio: str, codigo_mv: str, data_inicial: str, data_final: str, html: str) -> str:
+    """Salva o HTML renderizado de um relatório e retorna o caminho."""
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = os.path.join(diretorio, nome_arquivo_pagina(codigo_mv, data_inicial, data_final))
+    with open(caminho, 'w', encoding='utf-8') as f:
+        f.write(html)
+    return caminho
+
+
+# ============================================================================
+# REPLAY
+# ============================================================================
+
+def gerar_pagina_sintetica(codigo_mv: str, data_inicial: str, data_final: str) -> str:
+    """Gera um relatório com a estrutura /html/body/div/div/div[11]/div/div/div[N]/div."""
+    semente = hashlib.md5(f"{codigo_mv}|{data_inicial}|{data_final}".encode()).hexdigest()
+    rng = random.Random(semente)
+
+    celulas = []
+    for posicao in range(1, max(POSICOES_CAMPOS) + 1):
+        campo = POSICOES_CAMPOS.get(posicao)
+        if campo == 'codigo_mv':
+            valor = codigo_mv
+        elif campo == 'nome':
+            valor = f"MEDICO SINTETICO {codigo_mv}"
+        elif campo == 'especialidade':
+            valor = "CLINICA MEDICA"
+        elif campo:
+            valor = str(rng.randint(0, 40))
+        else:
+            valor = ''
+        celulas.append(f"<div><div>{valor}</div></div>")
+
+    blocos = ''.join('<div></div>' for _ in range(10))
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\"></head><body>"
+        f"<div><div>{blocos}<div><div><div>{''.join(celulas)}</div></div></div></div></div>"
+        "</body></html>"
+    )
+
+
+class ConfigReplay:
+    """Parâmetros do servidor de replay."""
+
+    def __init__(self, diretorio: Optional[str] = None,
+                 latencia_min: float = 0.0, latencia_max: float = 0.0,
+                 taxa_erro: float = 0.0, taxa_lentidao: float = 0.0,
+                 lentidao: float = 60.0, sintetico: bool = True):
+        self.diretorio = diretorio
+        self.latencia_min = latencia_min
+        self.latencia_max = max(latencia_max, latencia_min)
+        self.taxa_erro = taxa_erro
+        self.taxa_lentidao = taxa_lentidao
+        self.lentidao = lentidao
+        self.sintetico = sintetico
+
+        self._lock = threading.Lock()
+        self.stats = {'formularios': 0, 'relatorios': 0, 'gravados': 0, 'sinteticos': 0,
+                      'erros_injetados': 0, 'lentidoes_injetadas': 0, 'nao_encontrados': 0}
+
+    def contar(self, chave: str):
+        with self._lock:
+            self.stats[chave] += 1
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    """Handler HTTP do replay (a ConfigReplay fica em self.server.config)."""
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+    def _responder(self, status: int, corpo: str):
+        dados = corpo.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_GET(self):
+        config: ConfigReplay = self.server.config
+        url = urlparse(self.path)
+
+        if config.latencia_max > 0:
+            time.sleep(random.uniform(config.latencia_min, config.latencia_max))
+
+        if url.path == CAMINHO_FORMULARIO:
+            config.contar('formularios')
+            self._responder(200, FORMULARIO_HTML)
+            return
+
+        if url.path != CAMINHO_RELATORIO:
+            self._responder(404, "<html><body>Not found</body></html>")
+            return
+
+        config.contar('relatorios')
+        sorteio = random.random()
+        if sorteio < config.taxa_erro:
+            config.contar('erros_injetados')
+            self._responder(503, "<html><body>Service Unavailable (replay)</body></html>")
+            return
+        if sorteio < config.taxa_erro + config.taxa_lentidao:
+            config.contar('lentidoes_injetadas')
+            time.sleep(config.lentidao)
+
+        params = parse_qs(url.query)
+        codigo = params.get('codigo', [''])[0]
+        inicio = params.get('inicio', [''])[0]
+        fim = params.get('fim', [''])[0]
+
+        if config.diretorio:
+            caminho = os.path.join(config.diretorio, nome_arquivo_pagina(codigo, inicio, fim))
+            if os.path.exists(caminho):
+                config.contar('gravados')
+                with open(caminho, encoding='utf-8') as f:
+                    self._responder(200, f.read())
+                return
+
+        if config.sintetico:
+            config.contar('sinteticos')
+            self._responder(200, gerar_pagina_sintetica(codigo, inicio, fim))
+            return
+
+        config.contar('nao_encontrados')
+        self._responder(404, "<html><body>Sem gravação para esta consulta</body></html>")
+
+
+class ServidorReplay:
+    """Servidor de replay em thread própria (para uso em benchmarks)."""
+
+    def __init__(self, config: ConfigReplay, host: str = '127.0.0.1', porta: int = 0):
+        self.config = config
+        self._httpd = ThreadingHTTPServer((host, porta), _ReplayHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.config = config
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url_relatorio(self) -> str:
+        """URL equivalente ao MV_REPORT_URL dos coletores."""
+        host, porta = self._httpd.server_address[:2]
+        return f"http://{host}:{porta}{CAMINHO_FORMULARIO}?id=7076"
+
+    def iniciar(self):
+        """Inicia o servidor em uma thread daemon."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='replay-mv', daemon=True)
+        self._thread.start()
+        logger.info(f"Replay MV em {self.url_relatorio}")
+
+    def servir(self):
+        """Atende requisições em primeiro plano até KeyboardInterrupt."""
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+
+    def parar(self):
+        """Encerra o servidor iniciado com iniciar()."""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def main():
+    """Executa o servidor de replay em primeiro plano."""
+    parser = argparse.ArgumentParser(description="Servidor de replay offline do relatório MV")
+    parser.add_argument('--dir', help="Diretório com páginas gravadas (MV_GRAVAR_PAGINAS_DIR)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--latencia-min', type=float, default=0.0, help="Latência mínima por requisição (s)")
+    parser.add_argument('--latencia-max', type=float, default=0.0, help="Latência máxima por requisição (s)")
+    parser.add_argument('--taxa-erro', type=float, default=0.0, help="Fração de relatórios com HTTP 503")
+    parser.add_argument('--taxa-lentidao', type=float, default=0.0, help="Fração de relatórios lentos")
+    parser.add_argument('--lentidao', type=float, default=60.0, help="Atraso extra dos relatórios lentos (s)")
+    parser.add_argument('--sem-sintetico', action='store_true',
+                        help="Responder 404 quando não houver gravação")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s',
+                        handlers=[logging.StreamHandler(sys.stdout)])
+
+    config = ConfigReplay(
+        diretorio=args.dir,
+        latencia_min=args.latencia_min,
+        latencia_max=args.latencia_max,
+        taxa_erro=args.taxa_erro,
+        taxa_lentidao=args.taxa_lentidao,
+        lentidao=args.lentidao,
+        sintetico=not args.sem_sintetico
+    )
+    servidor = ServidorReplay(config, args.host, args.porta)
+    logger.info(f"Replay MV em {servidor.url_relatorio}")
+    logger.info(f"Exemplo de relatório: {CAMINHO_RELATORIO}?codigo=1234&inicio={quote('02.01.2026')}&fim={quote('02.01.2026')}")
+
+    try:
+        servidor.servir()
+    except KeyboardInterrupt:
+        logger.info(f"Encerrando. Estatísticas: {config.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+sincronizar-escalas-medicos.py
+==============================
+Conferência (e recarga) da tabela escalas_medicos (migration 034), que
+guarda uma linha por (escala, cpf) a partir do array JSONB escalas_medicas.medicos.
+
+A carga inicial é feita pela própria migration; no dia a dia a tabela é
+mantida pelo trigger trg_sincronizar_escalas_medicos.
+Este script:
+  1. Percorre as escalas (todas ou só do intervalo informado) em páginas
+  2. Monta as linhas esperadas com a mesma regra do trigger (CPF sem espaços,
+     um por escala, ignorando itens sem CPF)
+  3. Compara com o que está em escalas_medicos e grava as diferenças
+     (upsert das faltantes/divergentes, remoção das que sobraram)
+
+Uso:
+    python sincronizar-escalas-medicos.py                                  # tudo
+    python sincronizar-escalas-medicos.py --inicio 2026-01-01 --fim 2026-03-31
+    python sincronizar-escalas-medicos.py --verificar                      # só relata divergências
+"""
+
+import os
+import argparse
+import logging
+from typing import Dict, List, Tuple
+
+from dotenv import load_dotenv
+from supabase import create_client, Client
+
+# ============================================================
+# CONFIGURAÇÕES
+# ============================================================
+
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env'))
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+SUPABASE_URL = os.getenv('SUPABASE_URL') or os.getenv('VITE_SUPABASE_URL')
+SUPABASE_KEY = os.getenv('SUPABASE_SERVICE_KEY') or os.getenv('VITE_SUPABASE_SERVICE_ROLE_KEY')
+
+PAGE_SIZE = 1000      # máximo por requisição no Supabase
+LOTE_IN = 100         # escalas por filtro in_ (mantém a URL curta)
+
+CAMPOS = ('nome', 'data_inicio', 'contrato_id', 'ativo')
+
+
+def separador(titulo: str = ""):
+    logger.info("=" * 60)
+    if titulo:
+        logger.info(f"  {titulo}")
+        logger.info("=" * 60)
+
+
+def buscar_paginado(montar_query) -> list:
+    """Executa uma consulta paginada; `montar_query` devolve uma query nova com ordenação estável."""
+    linhas = []
+    offset = 0
+
+    while True:
+        resp = montar_query().range(offset, offset + PAGE_SIZE - 1).execute()
+        lote = resp.data or []
+        linhas.extend(lote)
+
+        if len(lote) < PAGE_SIZE:
+            break
+        offset += PAGE_SIZE
+
+    return linhas
+
+
+def linhas_esperadas(escala: dict) -> Dict[str, dict]:
+    """cpf → linha de escalas_medicos para uma escala (mesma regra do trigger)."""
+    medicos = escala.get('medicos')
+    linhas: Dict[str, dict] = {}
+    for medico in (medicos if isinstance(medicos, list) else []):
+        if not isinstance(medico, dict):
+            continue
+        cpf = (medico.get('cpf') or '').strip()
+        if not cpf or cpf in linhas:
+            continue
+        linhas[cpf] = {
+            'escala_id': escala['id'],
+            'cpf': cpf,
+            'nome': medico.get('nome'),
+            'data_inicio': escala['data_inicio'],
+            'contrato_id': escala['contrato_id'],
+            'ativo': escala.get('ativo') if escala.get('ativo') is not None else True,
+        }
+    return linhas
+
+
+def sincronizar_lote(sb: Client, escalas: List[dict], verificar: bool) -> Tuple[int, int]:
+    """Confere um lote de escalas. Retorna (linhas gravadas/faltantes, linhas removidas/sobrando)."""
+    ids = [e['id'] for e in escalas]
+    existentes = buscar_paginado(
+        lambda: sb.table('escalas_medicos').select('escala_id, cpf, nome, data_inicio, contrato_id, ativo')
+        .in_('escala_id', ids).order('escala_id').order('cpf')
+    )
+
+    atuais: Dict[Tuple[str, str], dict] = {(r['escala_id'], r['cpf']): r for r in existentes}
+    gravar: List[dict] = []
+    remover: Dict[str, List[str]] = {}
+
+    for escala in escalas:
+        esperadas = linhas_esperadas(escala)
+        for cpf, linha in esperadas.items():
+            atual = atuais.get((escala['id'], cpf))
+            if atual is None or any(atual.get(c) != linha[c] for c in CAMPOS):
+                gravar.append(linha)
+        sobrando = [cpf for (escala_id, cpf) in atuais if escala_id == escala['id'] and cpf not in esperadas]
+        if sobrando:
+            remover[escala['id']] = sobrando
+
+    if not verificar:
+        if gravar:
+            sb.table('escalas_medicos').upsert(gravar, on_conflict='escala_id,cpf').execute()
+        for escala_id, cpfs in remover.items():
+            sb.table('escalas_medicos').delete().eq('escala_id', escala_id).in_('cpf', cpfs).execute()
+
+    return len(gravar), sum(len(cpfs) for cpfs in remover.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga inicial e conferência de escalas_medicos")
+    parser.add_argument("--inicio", help="Data inicial (YYYY-MM-DD)")
+    parser.add_argument("--fim", help="Data final (YYYY-MM-DD)")
+    parser.add_argument("--verificar", action="store_true", help="Só relata divergências, sem gravar")
+    args = parser.parse_args()
+
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise ValueError("VITE_SUPABASE_URL ou VITE_SUPABASE_SERVICE_ROLE_KEY não encontrados no .env")
+
+    separador("sincronizar-escalas-medicos.py")
+    logger.info(f"  Intervalo : {args.inicio or 'início'} → {args.fim or 'fim'}")
+    logger.info(f"  Modo      : {'verificação (sem gravar)' if args.verificar else 'sincronização'}")
+
+    sb: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+    def montar_query():
+        query = sb.table('escalas_medicas').select('id, data_inicio, contrato_id, ativo, medicos')
+        if args.inicio:
+            query = query.gte('data_inicio', args.inicio)
+        if args.fim:
+            query = query.lte('data_inicio', args.fim)
+        return query.order('id')
+
+    total_escalas = total_gravadas = total_removidas = 0
+    offset = 0
+
+    while True:
+        pagina = montar_query().range(offset, offset + PAGE_SIZE - 1).execute().data or []
+
+        for i in range(0, len(pagina), LOTE_IN):
+            gravadas, removidas = sincronizar_lote(sb, pagina[i:i + LOTE_IN], args.verificar)
+            total_gravadas += gravadas
+            total_removidas += removidas
+
+        total_escalas += len(pagina)
+        logger.info(f"  {total_escalas} escala(s) conferida(s)...")
+
+        if len(pagina) < PAGE_SIZE:
+            break
+        offset += PAGE_SIZE
+
+    verbo = ('faltando/divergente(s)', 'sobrando') if args.verificar else ('gravada(s)', 'removida(s)')
+    logger.info(f"  {total_gravadas} linha(s) {verbo[0]} | {total_removidas} linha(s) {verbo[1]}")
+
+    separador("CONCLUÍDO")
+
+
+if __name__ == "__main__":
+    main()
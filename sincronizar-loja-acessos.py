@@ -0,0 +1,117 @@
+"""
+sincronizar-loja-acessos.py
+===========================
+Mantém a loja local de acessos (loja_acessos.py): Parquet particionado por mês
+e planta, consultado com DuckDB.
+
+  1. Baixa do Supabase só os acessos novos (created_at após a marca d'água
+     gravada em <loja>/_watermark); na primeira execução, a tabela inteira
+  2. Com --refazer YYYY-MM (repetível), recarrega o mês inteiro do Supabase
+     e substitui a partição — necessário depois de UPDATEs/DELETEs em acessos
+     (ex.: scripts corrigir-timezone-*), que o delta por created_at não vê
+  3. Com --compactar, reescreve cada partição em um único arquivo sem duplicatas
+  4. Com --consulta, executa um SQL sobre a view `acessos` e imprime o resultado
+
+Os importadores também gravam na loja os acessos que inserem quando
+ACESSOS_LOJA_DIR está definido; a sincronização cobre o resto.
+
+Uso:
+    python sincronizar-loja-acessos.py
+    python sincronizar-loja-acessos.py --compactar
+    python sincronizar-loja-acessos.py --refazer 2026-01 --refazer 2026-02
+    python sincronizar-loja-acessos.py --sem-sincronizar --consulta \\
+        "SELECT planta, mes, COUNT(*) FROM acessos GROUP BY ALL ORDER BY ALL"
+
+Requer pyarrow e duckdb.
+"""
+
+import os
+import argparse
+import logging
+
+from dotenv import load_dotenv
+from supabase import create_client, Client
+
+import loja_acessos
+
+# ============================================================
+# CONFIGURAÇÕES
+# ============================================================
+
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env'))
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+SUPABASE_URL = os.getenv('SUPABASE_URL') or os.getenv('VITE_SUPABASE_URL')
+SUPABASE_KEY = os.getenv('SUPABASE_SERVICE_KEY') or os.getenv('VITE_SUPABASE_SERVICE_ROLE_KEY')
+
+LINHAS_CONSULTA = 50   # linhas impressas por --consulta
+
+
+def separador(titulo: str = ""):
+    logger.info("=" * 60)
+    if titulo:
+        logger.info(f"  {titulo}")
+        logger.info("=" * 60)
+
+
+def consultar(diretorio: str, sql: str):
+    con = loja_acessos.conectar(diretorio)
+    try:
+        cur = con.execute(sql)
+        colunas = [d[0] for d in cur.description]
+        linhas = cur.fetchmany(LINHAS_CONSULTA + 1)
+    finally:
+        con.close()
+
+    print(" | ".join(colunas))
+    for linha in linhas[:LINHAS_CONSULTA]:
+        print(" | ".join("" if v is None else str(v) for v in linha))
+    if len(linhas) > LINHAS_CONSULTA:
+        print(f"... (mostrando {LINHAS_CONSULTA} linhas)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sincroniza e consulta a loja local de acessos (Parquet/DuckDB)")
+    parser.add_argument("--loja", default=loja_acessos.DIRETORIO,
+                        help=f"Diretório da loja (padrão {loja_acessos.DIRETORIO}, ou ACESSOS_LOJA_DIR)")
+    parser.add_argument("--sem-sincronizar", action="store_true", help="Não baixa o delta do Supabase")
+    parser.add_argument("--refazer", action="append", default=[], metavar="YYYY-MM",
+                        help="Recarrega o mês inteiro do Supabase (repetível)")
+    parser.add_argument("--compactar", action="store_true", help="Junta as partes de cada partição")
+    parser.add_argument("--consulta", help="SQL DuckDB sobre a view acessos")
+    args = parser.parse_args()
+
+    separador("sincronizar-loja-acessos.py")
+    logger.info(f"  Loja: {os.path.abspath(args.loja)}")
+
+    if not args.sem_sincronizar or args.refazer:
+        if not SUPABASE_URL or not SUPABASE_KEY:
+            raise ValueError("VITE_SUPABASE_URL ou VITE_SUPABASE_SERVICE_ROLE_KEY não encontrados no .env")
+        sb: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+    if not args.sem_sincronizar:
+        watermark = loja_acessos.ler_watermark(args.loja)
+        logger.info(f"  Marca d'água: {watermark.isoformat() if watermark else 'nenhuma (carga completa)'}")
+        lidos = loja_acessos.sincronizar(sb, args.loja)
+        logger.info(f"  {lidos} acesso(s) novo(s) gravado(s) na loja")
+
+    for mes in args.refazer:
+        logger.info(f"  {mes}: {loja_acessos.refazer_mes(sb, mes, args.loja)} acesso(s) recarregado(s)")
+
+    if args.compactar:
+        logger.info(f"  {loja_acessos.compactar(args.loja)} partição(ões) compactada(s)")
+
+    if args.consulta:
+        consultar(args.loja, args.consulta)
+
+    separador("CONCLUÍDO")
+
+
+if __name__ == "__main__":
+    main()
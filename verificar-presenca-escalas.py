@@ -25,6 +25,14 @@ Lógica:
         * "Pré-Aprovado" → todos os médicos têm produtividade registrada no dia
         * "Atenção"       → algum médico sem produtividade no dia
 
+Modo incremental (--incremental):
+  - Em vez de todas as escalas "Programado", reavalia apenas:
+      * escalas "Programado" dos últimos ESCALAS_DIAS_NOVAS dias (padrão 3)
+      * escalas afetadas por dados novos, lidos da fila escalas_recalculo_pendente
+        (preenchida pelos importadores de acessos e pelo mv-produtividade-rds.py)
+  - O índice de dependências liga (cpf, dia, planta) e (codigo_mv, dia) às
+    escalas que os usam; escalas já aprovadas/reprovadas manualmente não mudam.
+
 Cron (servidor em UTC):
   0 16 * * * /usr/bin/python3 /caminho/para/verificar-presenca-escalas.py
 
@@ -34,12 +42,22 @@ Cron (servidor em BRT):
 
 import os
 import sys
+import argparse
 from datetime import datetime, timedelta, date
 from typing import Optional
-from supabase import create_client, Client
+from supabase import Client
 from dotenv import load_dotenv
 import logging
 
+import fila_recalculo
+from fatos_presenca import montar_fato, gravar_fatos
+from regras_presenca import (
+    STATUS_REAVALIAVEIS, TOLERANCIA_HORAS,
+    is_overnight, calcular_duracao_horas, calcular_janela_busca, classificar_presenca,
+    resultado_produtividade, status_por_resultados,
+)
+from execucao_paralela import criar_cliente_supabase, executar_em_ordem
+
 # ── Logging ─────────────────────────────────────────────────────────────────
 
 logging.basicConfig(
@@ -63,80 +81,104 @@ if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
     logger.error("❌ Variáveis VITE_SUPABASE_URL e VITE_SUPABASE_SERVICE_ROLE_KEY são obrigatórias!")
     sys.exit(1)
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-logger.info(f"✅ Conectado ao Supabase: {SUPABASE_URL}")
+# Escalas avaliadas em paralelo (1 = sequencial); também limita as conexões HTTP
+MAX_INFLIGHT = int(os.getenv('ESCALAS_MAX_INFLIGHT', '8'))
 
-# ── Helpers de horário ────────────────────────────────────────────────────────
+# Identifica este job na tabela escalas_presenca_fatos
+ORIGEM_FATOS = 'verificar-presenca-escalas'
 
-def parse_hhmm(horario: str) -> tuple[int, int]:
-    """Extrai (hora, minuto) de uma string 'HH:MM' ou 'HH:MM:SS'."""
-    partes = horario.split(':')
-    return int(partes[0]), int(partes[1])
+supabase: Client = criar_cliente_supabase(SUPABASE_URL, SUPABASE_SERVICE_KEY, max_conexoes=MAX_INFLIGHT)
+logger.info(f"✅ Conectado ao Supabase: {SUPABASE_URL}")
 
+# ── Caches (evita queries repetidas ao Supabase) ──────────────────────────────
 
-def is_overnight(horario_entrada: str, horario_saida: str) -> bool:
-    """
-    Retorna True se o turno atravessa a meia-noite.
-    Regra: horario_saida <= horario_entrada (em minutos).
-    """
-    h_e, m_e = parse_hhmm(horario_entrada)
-    h_s, m_s = parse_hhmm(horario_saida)
-    return (h_s * 60 + m_s) <= (h_e * 60 + m_e)
+_cache_contratos: dict[str, Optional[str]]  = {}   # contrato_id → unidade_id
+_cache_unidades:  dict[str, Optional[dict]] = {}   # unidade_id  → {codigo, possui_gestao_acesso}
+_cache_medicos:   dict[str, list[str]]      = {}   # cpf         → [codigomv, ...]
 
+PAGE_SIZE = 1000  # máximo por requisição no Supabase
 
-def calcular_duracao_horas(horario_entrada: str, horario_saida: str) -> float:
-    """Duração total da escala em horas (suporta plantão noturno)."""
-    h_e, m_e = parse_hhmm(horario_entrada)
-    h_s, m_s = parse_hhmm(horario_saida)
-    minutos_e = h_e * 60 + m_e
-    minutos_s = h_s * 60 + m_s
 
-    if minutos_s <= minutos_e:
-        # Noturno: saída no dia seguinte
-        duracao_min = (1440 - minutos_e) + minutos_s
-    else:
-        duracao_min = minutos_s - minutos_e
+def _buscar_paginado(montar_query) -> list:
+    """
+    Executa uma consulta paginada no Supabase e retorna todas as linhas.
+    `montar_query` deve devolver uma query nova (com ordenação estável) a cada chamada.
+    """
+    linhas = []
+    offset = 0
 
-    return duracao_min / 60.0
+    while True:
+        resp = montar_query().range(offset, offset + PAGE_SIZE - 1).execute()
+        lote = resp.data or []
+        linhas.extend(lote)
 
+        if len(lote) < PAGE_SIZE:
+            break
+        offset += PAGE_SIZE
 
-BRT_TO_UTC = timedelta(hours=3)  # acessos.data_acesso é armazenado em UTC real; escalas usam BRT
+    return linhas
 
 
-def calcular_janela_busca(data_inicio_str: str, horario_entrada: str, horario_saida: str) -> tuple[str, str]:
+def carregar_dimensoes(escalas: list) -> None:
     """
-    Janela de busca de acessos: 2.5h antes da entrada até 2.5h após a saída.
-    Para plantões noturnos a saída é no dia seguinte.
-
-    Os horários da escala estão em BRT (UTC-3).
-    Os acessos são armazenados em UTC real (confirmado pelos offsets +00:00).
-    Portanto, convertemos a janela para UTC somando +3h antes de enviar a query.
+    Pré-carrega os caches de contrato → unidade e CPF → codigomvs para todas as
+    escalas do lote, em poucas consultas paginadas, de modo que a análise de cada
+    escala não precise de nenhuma ida ao Supabase para dimensões.
 
-    Retorna (window_start, window_end) em formato "YYYY-MM-DDTHH:MM:SS" (UTC).
+    Contratos e CPFs que não existirem ficam no cache como ausentes (None / []).
+    Em caso de erro, os caches ficam vazios e cada escala volta a resolver sob demanda.
     """
-    data = datetime.strptime(data_inicio_str, "%Y-%m-%d")
-    h_e, m_e = parse_hhmm(horario_entrada)
-    h_s, m_s = parse_hhmm(horario_saida)
+    contrato_ids = {e['contrato_id'] for e in escalas if e.get('contrato_id')}
+    cpfs = {
+        (m.get('cpf') or '').strip()
+        for e in escalas for m in (e.get('medicos') or [])
+    } - {''}
 
-    entrada_brt = data.replace(hour=h_e, minute=m_e, second=0, microsecond=0)
+    try:
+        contratos = _buscar_paginado(
+            lambda: supabase.table("contratos").select("id, unidade_hospitalar_id").order("id")
+        )
+        unidades = _buscar_paginado(
+            lambda: supabase.table("unidades_hospitalares")
+                .select("id, codigo, possui_gestao_acesso").order("id")
+        )
+        usuarios = _buscar_paginado(
+            lambda: supabase.table("usuarios").select("id, cpf").not_.is_("cpf", "null").order("id")
+        )
+        codigomvs = _buscar_paginado(
+            lambda: supabase.table("usuario_codigomv").select("usuario_id, codigomv").order("id")
+        )
+    except Exception as e:
+        logger.warning(f"⚠️  Falha ao pré-carregar dimensões ({e}) — resolvendo sob demanda")
+        return
 
-    if is_overnight(horario_entrada, horario_saida):
-        dia_seguinte = data + timedelta(days=1)
-        saida_brt = dia_seguinte.replace(hour=h_s, minute=m_s, second=0, microsecond=0)
-    else:
-        saida_brt = data.replace(hour=h_s, minute=m_s, second=0, microsecond=0)
+    unidade_por_contrato = {c['id']: c.get('unidade_hospitalar_id') for c in contratos}
+    for contrato_id in contrato_ids:
+        _cache_contratos[contrato_id] = unidade_por_contrato.get(contrato_id)
 
-    window_start = ((entrada_brt - timedelta(hours=2.5)) + BRT_TO_UTC).strftime("%Y-%m-%dT%H:%M:%S")
-    window_end   = ((saida_brt   + timedelta(hours=2.5)) + BRT_TO_UTC).strftime("%Y-%m-%dT%H:%M:%S")
+    for u in unidades:
+        _cache_unidades[u['id']] = {
+            "codigo":                u["codigo"],
+            "possui_gestao_acesso":  bool(u.get("possui_gestao_acesso", True)),
+        } if u.get("codigo") else None
 
-    return window_start, window_end
+    # Primeiro usuário por CPF, como no .limit(1) da consulta individual
+    usuario_por_cpf: dict[str, str] = {}
+    for u in usuarios:
+        usuario_por_cpf.setdefault(u['cpf'], u['id'])
 
+    mvs_por_usuario: dict[str, list[str]] = {}
+    for r in codigomvs:
+        mvs_por_usuario.setdefault(r['usuario_id'], []).append(r['codigomv'])
 
-# ── Caches (evita queries repetidas ao Supabase) ──────────────────────────────
+    for cpf in cpfs:
+        usuario_id = usuario_por_cpf.get(cpf)
+        _cache_medicos[cpf] = mvs_por_usuario.get(usuario_id, []) if usuario_id else []
 
-_cache_contratos: dict[str, Optional[str]]  = {}   # contrato_id → unidade_id
-_cache_unidades:  dict[str, Optional[dict]] = {}   # unidade_id  → {codigo, possui_gestao_acesso}
-_cache_medicos:   dict[str, list[str]]      = {}   # cpf         → [codigomv, ...]
+    logger.info(
+        f"📚 Dimensões carregadas: {len(contrato_ids)} contrato(s), {len(unidades)} unidade(s), "
+        f"{len(cpfs)} médico(s) ({sum(1 for c in cpfs if c in usuario_por_cpf)} com cadastro)"
+    )
 
 
 def obter_info_unidade(contrato_id: str) -> Optional[dict]:
@@ -254,33 +296,42 @@ def calcular_tempo_presenca(acessos: list) -> float:
 
 
 def avaliar_medico(cpf: str, nome: str, planta: str,
-                   duracao_escala: float, window_start: str, window_end: str) -> str:
+                   duracao_escala: float, window_start: str, window_end: str) -> tuple[str, dict]:
     """
-    Avalia a presença de um médico via registros de acesso e retorna:
+    Avalia a presença de um médico via registros de acesso e retorna (resultado, medição):
       "presente_total"   → cumpriu com até 1h de tolerância
       "presente_parcial" → faltou mais de 1h
       "ausente"          → nenhum acesso encontrado
+    A medição traz horas, entrada (primeiro acesso), saída (último) e qtd_acessos.
     """
     acessos = buscar_acessos(cpf, planta, window_start, window_end)
 
     if not acessos:
         logger.info(f"      ❌ {nome} ({cpf}): nenhum acesso em '{planta}' na janela")
-        return "ausente"
+        return "ausente", {"horas": 0.0, "entrada": None, "saida": None, "qtd_acessos": 0}
 
     horas = calcular_tempo_presenca(acessos)
-    tolerancia = duracao_escala - 1.0
+    tolerancia = duracao_escala - TOLERANCIA_HORAS
 
     logger.info(
         f"      📊 {nome} ({cpf}): {len(acessos)} acesso(s) | "
         f"{horas:.2f}h registradas de {duracao_escala:.2f}h esperadas"
     )
 
-    if horas >= tolerancia:
+    # acessos vêm ordenados por data_acesso
+    medicao = {
+        "horas": horas,
+        "entrada": acessos[0]['data_acesso'],
+        "saida": acessos[-1]['data_acesso'],
+        "qtd_acessos": len(acessos),
+    }
+
+    if classificar_presenca(horas, duracao_escala) == "presente_total":
         logger.info(f"      ✅ Aprovado ({horas:.2f}h ≥ {tolerancia:.2f}h)")
-        return "presente_total"
+        return "presente_total", medicao
     else:
         logger.info(f"      ⚠️  Parcial ({horas:.2f}h < {tolerancia:.2f}h)")
-        return "presente_parcial"
+        return "presente_parcial", medicao
 
 
 # ── Análise de produtividade (hospitais SEM gestão de acesso) ────────────────
@@ -290,6 +341,68 @@ COLUNAS_PRODUTIVIDADE = [
     "avaliacao", "documento_eletronico", "evolucao", "alta_medica",
 ]
 
+LOTE_CODIGOS_MV = 200  # codigo_mv por consulta (mantém a URL do filtro in_ curta)
+
+_pares_produtividade_carregados: set[tuple[str, str]] = set()  # (codigo_mv, data) consultados
+_pares_com_produtividade:        set[tuple[str, str]] = set()  # (codigo_mv, data) com total > 0
+
+
+def carregar_produtividade(escalas: list) -> None:
+    """
+    Pré-carrega a produtividade de todos os (codigo_mv, data) necessários para as
+    escalas de unidades sem gestão de acesso, com consultas em lote agrupadas por data.
+
+    Depende de carregar_dimensoes() para resolver unidades e codigomvs sem idas
+    extras ao Supabase. Depois disso, verificar_produtividade_dia() vira um teste de
+    pertinência em _pares_com_produtividade.
+    """
+    codigos_por_data: dict[str, set[str]] = {}
+
+    for escala in escalas:
+        medicos = escala.get('medicos') or []
+        if not medicos:
+            continue
+
+        info_unidade = obter_info_unidade(escala['contrato_id'])
+        if not info_unidade or info_unidade["possui_gestao_acesso"]:
+            continue
+
+        data_iso = escala['data_inicio'][:10]
+        for medico in medicos:
+            cpf = (medico.get('cpf') or '').strip()
+            if cpf:
+                codigos_por_data.setdefault(data_iso, set()).update(obter_codigomvs_medico(cpf))
+
+    if not codigos_por_data:
+        return
+
+    total_pares = 0
+    for data_iso, codigos in sorted(codigos_por_data.items()):
+        codigos = sorted(codigos)
+        try:
+            for i in range(0, len(codigos), LOTE_CODIGOS_MV):
+                lote = codigos[i:i + LOTE_CODIGOS_MV]
+                linhas = _buscar_paginado(
+                    lambda: supabase.table("produtividade")
+                        .select("id, codigo_mv, " + ", ".join(COLUNAS_PRODUTIVIDADE))
+                        .in_("codigo_mv", lote)
+                        .eq("data", data_iso)
+                        .order("id")
+                )
+                for row in linhas:
+                    if sum(row.get(col) or 0 for col in COLUNAS_PRODUTIVIDADE) > 0:
+                        _pares_com_produtividade.add((str(row['codigo_mv']), data_iso))
+                _pares_produtividade_carregados.update((c, data_iso) for c in lote)
+        except Exception as e:
+            logger.warning(f"⚠️  Falha ao pré-carregar produtividade de {data_iso} ({e}) — consultando sob demanda")
+            continue
+        total_pares += len(codigos)
+
+    logger.info(
+        f"📈 Produtividade carregada: {total_pares} par(es) (codigo_mv, data) em "
+        f"{len(codigos_por_data)} data(s), {len(_pares_com_produtividade)} com registros"
+    )
+
 
 def verificar_produtividade_dia(codigomvs: list[str], data_iso: str) -> bool:
     """
@@ -300,6 +413,11 @@ def verificar_produtividade_dia(codigomvs: list[str], data_iso: str) -> bool:
     """
     if not codigomvs:
         return False
+
+    # Pares já pré-carregados por carregar_produtividade(): sem consulta
+    if all((str(c), data_iso) in _pares_produtividade_carregados for c in codigomvs):
+        return any((str(c), data_iso) in _pares_com_produtividade for c in codigomvs)
+
     try:
         resp = supabase.table("produtividade") \
             .select(", ".join(COLUNAS_PRODUTIVIDADE)) \
@@ -318,19 +436,18 @@ def verificar_produtividade_dia(codigomvs: list[str], data_iso: str) -> bool:
         return False
 
 
-def analisar_por_produtividade(medicos: list, data_inicio: str) -> str:
+def analisar_por_produtividade(medicos: list, data_inicio: str) -> tuple[str, dict]:
     """
-    Regra simplificada para hospitais sem gestão de acesso:
+    Regra simplificada para hospitais sem gestão de acesso
+    (regras_presenca.resultado_produtividade / status_por_resultados):
       - Médico com produtividade na data → presente
       - Médico sem produtividade (ou sem código MV) → ausente
-    Resultado da escala:
-      "Pré-Aprovado" → todos presentes
-      "Atenção"       → qualquer ausente
+    Retorna (status, {cpf: "presente_total" | "ausente"}).
     """
     logger.info(f"     📈 Modo: verificação por produtividade (sem gestão de acesso)")
 
     data_iso  = data_inicio[:10]  # "YYYY-MM-DD"
-    algum_ausente = False
+    por_medico: dict[str, str] = {}
 
     for medico in medicos:
         cpf  = (medico.get('cpf') or '').strip()
@@ -344,7 +461,7 @@ def analisar_por_produtividade(medicos: list, data_inicio: str) -> str:
 
         if not codigomvs:
             logger.info(f"      ❓ {nome} ({cpf}): sem código MV cadastrado — tratado como ausente")
-            algum_ausente = True
+            por_medico[cpf] = resultado_produtividade(False)
             continue
 
         tem_prod = verificar_produtividade_dia(codigomvs, data_iso)
@@ -353,25 +470,27 @@ def analisar_por_produtividade(medicos: list, data_inicio: str) -> str:
             logger.info(f"      ✅ {nome} ({cpf}): produtividade registrada em {data_iso}")
         else:
             logger.info(f"      ❌ {nome} ({cpf}): sem produtividade em {data_iso}")
-            algum_ausente = True
+        por_medico[cpf] = resultado_produtividade(tem_prod)
 
-    if algum_ausente:
+    novo_status = status_por_resultados(list(por_medico.values()))
+    if novo_status == "Atenção":
         logger.info(f"     🔴 Resultado: ATENÇÃO (médico(s) sem produtividade no dia)")
-        return "Atenção"
     else:
         logger.info(f"     🟢 Resultado: PRÉ-APROVADO (produtividade confirmada)")
-        return "Pré-Aprovado"
+    return novo_status, por_medico
 
 
 # ── Processamento de escala ───────────────────────────────────────────────────
 
-def analisar_escala(escala: dict) -> Optional[str]:
+def analisar_escala(escala: dict, fatos: Optional[list] = None) -> Optional[str]:
     """
     Analisa uma única escala e retorna o novo status ou None se não for possível analisar.
 
     Bifurca pelo campo possui_gestao_acesso da unidade hospitalar:
       TRUE  → verifica acessos físicos (lógica completa)
       FALSE → verifica produtividade no dia (lógica simplificada)
+
+    Se `fatos` for informado, recebe um fato de presença por médico (fatos_presenca.py).
     """
     escala_id    = escala['id']
     data_inicio  = escala['data_inicio']        # "YYYY-MM-DD"
@@ -405,7 +524,13 @@ def analisar_escala(escala: dict) -> Optional[str]:
 
     # ── Lógica simplificada: sem gestão de acesso ─────────────────────────────
     if not possui_gestao_acesso:
-        return analisar_por_produtividade(medicos, data_inicio)
+        novo_status, por_medico = analisar_por_produtividade(medicos, data_inicio)
+        if fatos is not None:
+            fatos.extend(
+                montar_fato(escala, cpf, resultado, 'produtividade', ORIGEM_FATOS)
+                for cpf, resultado in por_medico.items()
+            )
+        return novo_status
 
     # ── Lógica completa: com gestão de acesso ────────────────────────────────
     overnight      = is_overnight(hora_entrada, hora_saida)
@@ -418,8 +543,7 @@ def analisar_escala(escala: dict) -> Optional[str]:
     )
     logger.info(f"     🔍 Janela: {window_start} → {window_end}")
 
-    algum_ausente = False
-    algum_parcial = False
+    resultados = []
 
     for medico in medicos:
         cpf  = (medico.get('cpf') or '').strip()
@@ -429,30 +553,200 @@ def analisar_escala(escala: dict) -> Optional[str]:
             logger.info(f"     ⚠️  Médico '{nome}' sem CPF — ignorando")
             continue
 
-        resultado = avaliar_medico(cpf, nome, planta, duracao_escala, window_start, window_end)
+        resultado, medicao = avaliar_medico(cpf, nome, planta, duracao_escala, window_start, window_end)
+
+        if fatos is not None:
+            fatos.append(montar_fato(
+                escala, cpf, resultado, 'acessos', ORIGEM_FATOS,
+                horas_esperadas=duracao_escala, horas_medidas=medicao["horas"],
+                entrada=medicao["entrada"], saida=medicao["saida"], qtd_acessos=medicao["qtd_acessos"],
+            ))
 
-        if resultado == "ausente":
-            algum_ausente = True
-        elif resultado == "presente_parcial":
-            algum_parcial = True
+        resultados.append(resultado)
 
     # Status final
-    if algum_ausente:
-        novo_status = "Atenção"
+    novo_status = status_por_resultados(resultados)
+    if novo_status == "Atenção":
         logger.info(f"     🔴 Resultado: ATENÇÃO (médico(s) sem acesso)")
-    elif algum_parcial:
-        novo_status = "Aprovação Parcial"
+    elif novo_status == "Aprovação Parcial":
         logger.info(f"     🟡 Resultado: APROVAÇÃO PARCIAL (carga incompleta)")
     else:
-        novo_status = "Pré-Aprovado"
         logger.info(f"     🟢 Resultado: PRÉ-APROVADO")
 
     return novo_status
 
 
+def processar_escala(escala: dict) -> tuple[str, list]:
+    """
+    Analisa uma escala e grava o novo status se mudou.
+    Retorna ("atualizada" | "mantida" | "sem_dados" | "erro", fatos de presença).
+    """
+    fatos: list = []
+    try:
+        novo_status = analisar_escala(escala, fatos)
+
+        if novo_status is None:
+            return "sem_dados", []
+
+        if novo_status != escala['status']:
+            upd = supabase.table("escalas_medicas") \
+                .update({'status': novo_status}) \
+                .eq('id', escala['id']) \
+                .execute()
+
+            if upd.data:
+                logger.info(
+                    f"     ✅ Atualizada: "
+                    f"{escala['status']} → {novo_status}"
+                )
+                return "atualizada", fatos
+            else:
+                logger.error(f"     ❌ Falha ao gravar status para escala {escala['id']}")
+                return "erro", fatos
+        else:
+            logger.info(f"     ⏭️  Status mantido: {novo_status}")
+            return "mantida", fatos
+
+    except Exception as e:
+        logger.error(f"❌ Erro inesperado na escala {escala.get('id', '?')}: {e}")
+        return "erro", []
+
+
+# ── Recálculo incremental ─────────────────────────────────────────────────────
+
+COLUNAS_ESCALA = "id, contrato_id, data_inicio, horario_entrada, horario_saida, medicos, status"
+
+# No modo incremental, escalas "Programado" destes últimos dias são sempre avaliadas
+DIAS_NOVAS_ESCALAS = int(os.getenv('ESCALAS_DIAS_NOVAS', '3'))
+
+LOTE_DIAS = 100  # datas por consulta in_
+
+
+def _dia_iso(dia: str, delta: int) -> str:
+    return (date.fromisoformat(dia) + timedelta(days=delta)).isoformat()
+
+
+# A janela de uma escala do dia D termina no máximo em D+2 (UTC): plantão de 24h
+# com saída no fim da noite, mais JANELA_BUSCA_HORAS e o fuso (+3h)
+DIAS_MAX_JANELA = 2
+
+
+def _dias_janela(escala: dict) -> list[str]:
+    """Dias UTC ("YYYY-MM-DD") cobertos pela janela de busca de acessos da escala."""
+    inicio, fim = calcular_janela_busca(
+        escala['data_inicio'][:10], escala['horario_entrada'], escala['horario_saida']
+    )
+    dia, ultimo = date.fromisoformat(inicio[:10]), date.fromisoformat(fim[:10])
+    dias = []
+    while dia <= ultimo:
+        dias.append(dia.isoformat())
+        dia += timedelta(days=1)
+    return dias
+
+
+def indexar_dependencias(escalas: list) -> tuple[dict, dict, dict]:
+    """
+    Monta o índice de dependências das escalas (requer carregar_dimensoes):
+      por_acesso:        (cpf, dia UTC, planta) → {escala_id}   (unidades com gestão de acesso)
+      por_acesso_cpf:    (cpf, dia UTC)         → {escala_id}   (para acessos sem planta)
+      por_produtividade: (codigo_mv, dia)       → {escala_id}   (unidades sem gestão de acesso)
+
+    Cada escala de acesso é indexada em todos os dias UTC que a sua janela de
+    busca (calcular_janela_busca) cobre — até D+2 em plantões que terminam tarde.
+    """
+    por_acesso: dict[tuple, set] = {}
+    por_acesso_cpf: dict[tuple, set] = {}
+    por_produtividade: dict[tuple, set] = {}
+
+    for escala in escalas:
+        info_unidade = obter_info_unidade(escala['contrato_id'])
+        if not info_unidade:
+            continue
+
+        dia = escala['data_inicio'][:10]
+        dias_acesso = _dias_janela(escala) if info_unidade["possui_gestao_acesso"] else []
+        for medico in (escala.get('medicos') or []):
+            cpf = (medico.get('cpf') or '').strip()
+            if not cpf:
+                continue
+
+            if info_unidade["possui_gestao_acesso"]:
+                for d in dias_acesso:
+                    por_acesso.setdefault((cpf, d, info_unidade["codigo"]), set()).add(escala['id'])
+                    por_acesso_cpf.setdefault((cpf, d), set()).add(escala['id'])
+            else:
+                for codigo in obter_codigomvs_medico(cpf):
+                    por_produtividade.setdefault((str(codigo), dia), set()).add(escala['id'])
+
+    return por_acesso, por_acesso_cpf, por_produtividade
+
+
+def selecionar_escalas_incrementais(hoje: date) -> tuple[list, Optional[str]]:
+    """
+    Seleciona as escalas do modo incremental: "Programado" recentes + afetadas
+    pelas chaves da fila de recálculo. Retorna (escalas, linhas lidas da fila).
+    """
+    chaves_acesso, chaves_prod, marca = fila_recalculo.ler_pendentes(supabase)
+    logger.info(
+        f"🔁 Fila de recálculo: {len(chaves_acesso)} chave(s) de acesso, "
+        f"{len(chaves_prod)} de produtividade"
+    )
+
+    hoje_str = hoje.isoformat()
+    inicio_novas = (hoje - timedelta(days=DIAS_NOVAS_ESCALAS)).isoformat()
+
+    novas = _buscar_paginado(
+        lambda: supabase.table("escalas_medicas").select(COLUNAS_ESCALA)
+            .eq("status", "Programado")
+            .eq("ativo", True)
+            .gte("data_inicio", inicio_novas)
+            .lt("data_inicio", hoje_str)
+            .order("id")
+    )
+
+    # Dias das escalas que podem depender das chaves (acessos até D+2 afetam escalas de D)
+    dias = {_dia_iso(dia, -n) for _, dia, _ in chaves_acesso for n in range(DIAS_MAX_JANELA + 1)}
+    dias |= {dia for _, dia in chaves_prod}
+    dias = sorted(d for d in dias if d < hoje_str)
+
+    candidatas = []
+    for i in range(0, len(dias), LOTE_DIAS):
+        lote = dias[i:i + LOTE_DIAS]
+        candidatas.extend(_buscar_paginado(
+            lambda: supabase.table("escalas_medicas").select(COLUNAS_ESCALA)
+                .in_("status", STATUS_REAVALIAVEIS)
+                .eq("ativo", True)
+                .in_("data_inicio", lote)
+                .order("id")
+        ))
+
+    carregar_dimensoes(novas + candidatas)
+    por_acesso, por_acesso_cpf, por_produtividade = indexar_dependencias(candidatas)
+
+    afetadas: set = set()
+    for cpf, dia, planta in chaves_acesso:
+        if planta:
+            afetadas |= por_acesso.get((cpf, dia, planta), set())
+        else:
+            afetadas |= por_acesso_cpf.get((cpf, dia), set())
+    for codigo, dia in chaves_prod:
+        afetadas |= por_produtividade.get((codigo, dia), set())
+
+    escalas = {e['id']: e for e in novas}
+    for escala in candidatas:
+        if escala['id'] in afetadas:
+            escalas.setdefault(escala['id'], escala)
+
+    logger.info(
+        f"🔁 {len(novas)} escala(s) 'Programado' recente(s) + "
+        f"{len(afetadas)} afetada(s) por dados novos"
+    )
+    return sorted(escalas.values(), key=lambda e: (e['data_inicio'], e['id'])), marca
+
+
 # ── Entrada principal ─────────────────────────────────────────────────────────
 
-def executar():
+def executar(incremental: bool = False):
     hoje     = date.today()
     hoje_str = hoje.strftime("%Y-%m-%d")
 
@@ -462,71 +756,78 @@ def executar():
     logger.info(f"🕐  Execução:    {datetime.now().strftime('%d/%m/%Y às %H:%M:%S')}")
     logger.info("=" * 80)
 
-    # Buscar todas as escalas "Programado" de dias passados até hoje
-    try:
-        resp = supabase.table("escalas_medicas") \
-            .select("id, contrato_id, data_inicio, horario_entrada, horario_saida, medicos, status") \
-            .eq("status", "Programado") \
-            .eq("ativo", True) \
-            .lt("data_inicio", hoje_str) \
-            .execute()
-        escalas = resp.data or []
-    except Exception as e:
-        logger.error(f"❌ Erro ao buscar escalas: {e}")
-        sys.exit(1)
+    marca_fila = None
+
+    if incremental:
+        try:
+            escalas, marca_fila = selecionar_escalas_incrementais(hoje)
+        except Exception as e:
+            logger.error(f"❌ Erro ao selecionar escalas (modo incremental): {e}")
+            sys.exit(1)
+    else:
+        # Buscar todas as escalas "Programado" de dias passados até hoje
+        try:
+            resp = supabase.table("escalas_medicas") \
+                .select(COLUNAS_ESCALA) \
+                .eq("status", "Programado") \
+                .eq("ativo", True) \
+                .lt("data_inicio", hoje_str) \
+                .execute()
+            escalas = resp.data or []
+        except Exception as e:
+            logger.error(f"❌ Erro ao buscar escalas: {e}")
+            sys.exit(1)
 
     if not escalas:
-        logger.info(f"\n✅ Nenhuma escala 'Programado' pendente até {hoje.strftime('%d/%m/%Y')}.")
+        logger.info(f"\n✅ Nenhuma escala pendente até {hoje.strftime('%d/%m/%Y')}.")
+        fila_recalculo.confirmar(supabase, marca_fila)
         return
 
-    logger.info(f"\n📊 {len(escalas)} escala(s) para analisar\n")
+    logger.info(f"\n📊 {len(escalas)} escala(s) para analisar ({MAX_INFLIGHT} em paralelo)\n")
+
+    if not incremental:
+        carregar_dimensoes(escalas)
+    carregar_produtividade(escalas)
 
     atualizadas = 0
     sem_dados   = 0
     erros       = 0
-
-    for escala in escalas:
-        try:
-            novo_status = analisar_escala(escala)
-
-            if novo_status is None:
-                sem_dados += 1
-                continue
-
-            if novo_status != escala['status']:
-                upd = supabase.table("escalas_medicas") \
-                    .update({'status': novo_status}) \
-                    .eq('id', escala['id']) \
-                    .execute()
-
-                if upd.data:
-                    logger.info(
-                        f"     ✅ Atualizada: "
-                        f"{escala['status']} → {novo_status}"
-                    )
-                    atualizadas += 1
-                else:
-                    logger.error(f"     ❌ Falha ao gravar status para escala {escala['id']}")
-                    erros += 1
-            else:
-                logger.info(f"     ⏭️  Status mantido: {novo_status}")
-
-        except Exception as e:
-            logger.error(f"❌ Erro inesperado na escala {escala.get('id', '?')}: {e}")
+    fatos       = []
+
+    for escala, (resultado, fatos_escala) in executar_em_ordem(escalas, processar_escala, MAX_INFLIGHT):
+        fatos.extend(fatos_escala)
+        if resultado == "atualizada":
+            atualizadas += 1
+        elif resultado == "sem_dados":
+            sem_dados += 1
+        elif resultado == "erro":
             erros += 1
 
+    fatos_gravados = gravar_fatos(supabase, fatos)
+
     logger.info("\n" + "=" * 80)
     logger.info("🎯  RESULTADO FINAL")
     logger.info(f"    ✅  Escalas atualizadas : {atualizadas}")
     logger.info(f"    ⚠️   Sem dados suficientes: {sem_dados}")
     logger.info(f"    ❌  Erros               : {erros}")
     logger.info(f"    📊  Total analisado     : {len(escalas)}")
+    logger.info(f"    🧾  Fatos de presença   : {fatos_gravados}/{len(fatos)}")
     logger.info("=" * 80)
 
+    # Com erros, a fila é mantida para que as escalas afetadas sejam reavaliadas na próxima execução
+    if marca_fila and erros == 0:
+        fila_recalculo.confirmar(supabase, marca_fila)
+        logger.info("🔁 Fila de recálculo consumida")
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verificação de presença nas escalas")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Reavaliar só escalas recentes e as afetadas pela fila de recálculo")
+    args = parser.parse_args()
+
     try:
-        executar()
+        executar(incremental=args.incremental)
         sys.exit(0)
     except Exception as e:
         logger.error(f"\n💥 Erro fatal: {e}")